@@ -1,10 +1,10 @@
 import numpy as np
 from functools import cache
-import random
 
 from Memory import Memory
 from EpsilonGreedyPolicy import EpsilonGreedyPolicy
-from myFuncs import cached_power, matrix_like, hRange, wRange, evaluate, assign
+from RandomStream import RandomStream
+from myFuncs import cached_power
 
 
 class Agent:
@@ -37,6 +37,8 @@ class Agent:
     FINISHED_EPISODE = "Episode Finish"
     STARTED_EPISODE = "Episode Start"
     OPERATIONS = [UPDATED_BY_PLANNING, UPDATED_BY_EXPERIENCE, TOOK_ACTION, FINISHED_EPISODE, STARTED_EPISODE]  # for iteration purposes
+    MIN_VISIT_TIME_CAPACITY = 1024  # visited pairs the Dyna-Q+ visit times are allocated for at first
+    INITIAL_VALUE_BLOCK_SIZE = 4096  # states whose initial Q-values are drawn together, see _draw_initial_values
 
     @classmethod
     @cache
@@ -52,9 +54,11 @@ class Agent:
 
     def __init__(self, environment, use_straightActions, use_diagonalActions, use_idleActions, currentReturnVar, currentEpisodeVar, learningRateVar,
                  dynamicAlphaVar, discountVar, nStepVar, nPlanVar, onPolicyVar, updateByExpectationVar, behaviorEpsilonVar, behaviorEpsilonDecayRateVar,
-                 targetEpsilonVar, targetEpsilonDecayRateVar, decayEpsilonEpisodeWiseVar, initialActionvalueMean, initialActionvalueSigma, actionPlan=[]):
+                 targetEpsilonVar, targetEpsilonDecayRateVar, decayEpsilonEpisodeWiseVar, initialActionvalueMean, initialActionvalueSigma, rng=None, eventLog=None, convergenceMonitor=None, policyEvaluator=None, explorationBonusVar=None, tableStorage=None, actionPlan=[]):
         self.environment = environment
+        self.rng = RandomStream() if rng is None else rng  # must be set before the policies are created
         self.actionspace = self.create_actionspace(use_straightActions, use_diagonalActions, use_idleActions)
+        self.actionIndices = {action: i for i, action in enumerate(self.actionspace)}
         self.currentReturnVar = currentReturnVar
         self.currentEpisodeVar = currentEpisodeVar
         self.learningRateVar = learningRateVar
@@ -67,16 +71,56 @@ class Agent:
         self.updateByExpectationVar = updateByExpectationVar
         self.nStepVar = nStepVar
         self.nPlanVar = nPlanVar
+        self.explorationBonusVar = explorationBonusVar  # κ of Dyna-Q+, None behaves like 0
         self.initialActionvalueMean = initialActionvalueMean
         self.initialActionvalueSigma = initialActionvalueSigma
-        self.Qvalues = matrix_like(self.environment.get_grid())
-        self.greedyActions = matrix_like(self.environment.get_grid())
-        self.model = matrix_like(self.environment.get_grid())
-        self.visitedStateActionPairs = set()
-        self.stateActionPairCounts = matrix_like(self.environment.get_grid())
-        self.stateAbsenceCounts = np.zeros_like(self.environment.get_grid(), dtype=np.int32)  # using numpy since counting can be vectorized
-        # self.stateActionPairAbsenceCounts = np.empty_like(self.environment.get_grid(), dtype=dict)  # will be needed for Dyna-Q+
+        self.tableStorage = tableStorage
+        if self.tableStorage is not None:  # the tables of the state-action pairs are arrays instead of dicts, which only these functions access
+            if self.tableStorage.get_shape() != (*self.environment.get_shape(), len(self.actionspace)):
+                raise ValueError(f"The table storage has shape {self.tableStorage.get_shape()}, not {(*self.environment.get_shape(), len(self.actionspace))}")
+            self._get_Q = self._get_stored_Q
+            self._set_Q = self._set_stored_Q
+            self._get_tied_actions = self._get_stored_tied_actions
+            self._update_greedy_actions = self._update_stored_greedy_actions
+            self._initialize_state = self._initialize_stored_state
+            self._memorize_transition = self._memorize_stored_transition
+            self._recall_transition = self._recall_stored_transition
+            self._get_count_based_learningRate = self._get_stored_count_based_learningRate
+            self._record_visit_time = self._record_stored_visit_time
+            self._get_lastVisitTimes = self._get_stored_lastVisitTimes
+        # Specialization for the current algorithm, assigned by specialize:
+        self.nStep = None
+        self.decayEpsilonEpisodeWise = None
+        self.targetGeneratingPolicy = None
+        self.behaviorActionFunc = None
+        self.targetFunc = None
+        self.learningRateFunc = None
+        self.explorationBonus = None
+        self.specialize()
+        # The tables of a state are dicts keyed by state, which get an entry on its first visit, see _initialize_state. Most cells of large worlds are never visited.
+        self.Qvalues = {} if self.tableStorage is None else None
+        self.greedyActions = {}
+        self.maxQvalues = {}  # per-state aggregates, kept up to date incrementally by _set_Q
+        self.QvalueSums = {}
+        self.QvalueArray = None  # assigned by _initialize_tables, its initial values are drawn block by block, see _draw_initial_values
+        self.isBlockDrawn = None
+        self.nUndrawnBlocks = None
+        self.model = {} if self.tableStorage is None else None
+        self.visitedStateActionPairs = {}  # {pair: index in visitedStateActionPairList}
+        self.visitedStateActionPairList = []  # same content as the dict above, but allows O(1) random choice for Dyna-Q
+        self.stateActionPairCounts = {} if self.tableStorage is None else None
+        self.time = 0  # number of real actions taken
+        # Same for the trace of the agent, which is only visualized: the absence of a state is the time since its latest arrival or since the episode start, see get_absence
+        self.stateArrivalTimes = {}  # {state: time}, states never arrived at are missing
+        self.episodeStartTime = 0
+        # Dyna-Q+: Instead of incrementing the absence count of every pair at every step, the time of the latest real visit is stored. τ = time - lastVisitTimes
+        # Indexed like visitedStateActionPairList and only kept while κ > 0, see _record_visit_time. Pairs visited while κ was 0 count as last visited at time 0.
+        self.lastVisitTimes = None  # stays None with a table storage, which has its own array
+        self.plannedPairs = []  # pairs of the current planning phase drawn in advance together with their bonus, only used by Dyna-Q+
         self._initialize_tables()
+        self.eventLog = eventLog
+        if self.eventLog is not None:
+            self.eventLog.start(self.OPERATIONS, self.actionspace, self.get_QvalueArray())
         # Strictly speaking, the agent has no model at all and therefore in the beginning knows nothing about the environment, including its shape.
         # But to avoid technical details in implementation that would anyway not change the Agent behavior at all,
         # the agent will be given that the states can be structured in a matrix that has the same shape as the environment
@@ -92,17 +136,61 @@ class Agent:
         self.targetAction = None
         self.targetActionvalue = None
         self.iSuccessivePlannings = None
+        self.latestAction = None  # outcome of the latest operation, only needed for the event log
+        self.latestReward = 0
+        self.latestUpdate = None
+        self.convergenceMonitor = convergenceMonitor
+        self.policyEvaluator = policyEvaluator
+        self.hasChangedGreedyActions = False  # since the start of the current episode, only needed for the convergence monitor
+        self.maxQvalueChange = 0
+        self.stopReason = None
+        self.nOperations = 0
         # Debug variables:
         self.actionPlan = actionPlan
         self.actionHistory = []
 
+    def specialize(self):
+        """Picks the variants of the per-operation functions that match the current algorithm and caches the flags they depend on,
+        so the operations neither branch on them nor read their variables.
+        Must be called whenever n, On-Policy, Expectation Update, α = 1/count((S,A)), Decay ε Episode-wise or κ changes, which the sandbox does by a trace.
+        """
+        self.nStep = self.nStepVar.get()
+        self.decayEpsilonEpisodeWise = self.decayEpsilonEpisodeWiseVar.get()
+        if self.onPolicyVar.get():
+            self.targetGeneratingPolicy = self.behaviorPolicy
+            self.behaviorActionFunc = self._generate_on_policy_behavior_action
+        else:
+            self.targetGeneratingPolicy = self.targetPolicy
+            self.behaviorActionFunc = self._generate_off_policy_behavior_action
+        self.targetFunc = self._get_expected_target if self.updateByExpectationVar.get() else self._get_sampled_target
+        self.learningRateFunc = self._get_count_based_learningRate if self.dynamicAlphaVar.get() else self._get_constant_learningRate
+        self.explorationBonus = self.explorationBonusVar.get() if self.explorationBonusVar is not None else 0
+
     def operate(self):
-        if self.get_memory_size() >= self.nStepVar.get() >= 1 or (self.episodeFinished and self.get_memory_size()):
+        self.nOperations += 1
+        if self.eventLog is None:
+            return self._operate()
+        self.latestAction = None
+        self.latestReward = 0
+        self.latestUpdate = None
+        operation = self._operate()
+        self.eventLog.append(operation, self.state, self.latestAction, self.latestReward, self.latestUpdate, self.hasMadeExploratoryAction, self.targetAction,
+                             self.environment.get_teleportJustUsed(), self.environment.get_windJustUsed())
+        return operation
+
+    def _operate(self):
+        if self.get_memory_size() >= self.nStep >= 1 or (self.episodeFinished and self.get_memory_size()):
             # First condition is never True for MC
             self._process_earliest_memory()
             return self.UPDATED_BY_EXPERIENCE
         elif self.episodeFinished:
             self.episodeReturns.append(self.currentReturnVar.get())
+            if self.convergenceMonitor is not None:
+                self.stopReason = self.convergenceMonitor.check(self.hasChangedGreedyActions, self.maxQvalueChange, self.episodeReturns[-1])
+            if self.policyEvaluator is not None:
+                self.policyEvaluator.check(self, len(self.episodeReturns) - 1)
+            self.hasChangedGreedyActions = False
+            self.maxQvalueChange = 0
             self.hasMadeExploratoryAction = False  # So at the next start the agent isnt colored exploratory anymore
             self.state = self.environment.remove_agent()
             self.memory.yield_lastForgottenState()  # for correct trace visualization
@@ -121,85 +209,211 @@ class Agent:
             return self.TOOK_ACTION
 
     def _initialize_tables(self):
-        for h in hRange(self.Qvalues):
-            for w in wRange(self.Qvalues):
-                self.Qvalues[h][w] = {action: np.random.normal(self.initialActionvalueMean, self.initialActionvalueSigma)
-                                     for action in self.get_actionspace()}
-                self._update_greedy_actions((h, w))
-                self.stateActionPairCounts[h][w] = {action: 0 for action in self.get_actionspace()}
-                self.model[h][w] = {action: (None, None) for action in self.get_actionspace()}
+        # np.zeros only maps pages, memory is used once a block of initial values is written into them
+        H, W = self.environment.get_shape()
+        self.QvalueArray = np.zeros((H, W, len(self.get_actionspace()))) if self.tableStorage is None else self.tableStorage.get_Qvalues()
+        self.nUndrawnBlocks = -(-H * W // self.INITIAL_VALUE_BLOCK_SIZE)
+        self.isBlockDrawn = bytearray(self.nUndrawnBlocks)
+        if self.tableStorage is not None and self.tableStorage.get_mode() != "w+":  # the tables of an earlier run, which must not be drawn over
+            self.isBlockDrawn = bytearray(b"\x01" * self.nUndrawnBlocks)
+            self.nUndrawnBlocks = 0
+            self._restore_stored_tables()
+
+    def _restore_stored_tables(self):
+        """Continues from the tables of an earlier run: the pairs with a model entry are the visited ones, their states and
+        successors get their aggregates, and the time continues after the latest visit Dyna-Q+ stored, so no τ is negative.
+        """
+        modelSuccessors = self.tableStorage.get_modelSuccessors()
+        W = self.environment.get_shape()[1]
+        states = set()
+        for h, w, iAction in np.argwhere(modelSuccessors != self.tableStorage.UNKNOWN).tolist():
+            pair = ((h, w), self.actionspace[iAction])
+            self.visitedStateActionPairs[pair] = len(self.visitedStateActionPairList)
+            self.visitedStateActionPairList.append(pair)
+            states.update([(h, w), divmod(int(modelSuccessors[h, w, iAction]), W)])
+        for state in states:
+            self._update_stored_greedy_actions(state)
+        self.time = int(self.tableStorage.get_lastVisitTimes().max(initial=0))
+
+    def _draw_initial_values(self, state: tuple):
+        """Draws the initial Q-values of the block of INITIAL_VALUE_BLOCK_SIZE consecutive states that contains the state, if not done yet.
+        Each block has its own substream of the agent's stream, so the initial values do not depend on the order in which the states are visited.
+        """
+        iBlock = (state[0] * self.environment.get_shape()[1] + state[1]) // self.INITIAL_VALUE_BLOCK_SIZE
+        if not self.isBlockDrawn[iBlock]:
+            self._draw_block(iBlock)
+
+    def _draw_block(self, iBlock):
+        flatQvalues = self.QvalueArray.reshape(-1, len(self.get_actionspace()))  # a view, also of a memmap
+        block = flatQvalues[iBlock * self.INITIAL_VALUE_BLOCK_SIZE:(iBlock + 1) * self.INITIAL_VALUE_BLOCK_SIZE]
+        if self.initialActionvalueMean or self.initialActionvalueSigma:  # the table is zero already
+            block[...] = self.rng.normal_block(iBlock, self.initialActionvalueMean, self.initialActionvalueSigma, block.shape)
+        self.isBlockDrawn[iBlock] = True
+        self.nUndrawnBlocks -= 1
+
+    def _initialize_state(self, state: tuple):
+        # Creates the tables of a state from its initial values on its first visit. Every state the agent reads or updates has been visited before.
+        self._draw_initial_values(state)
+        self.Qvalues[state] = dict(zip(self.get_actionspace(), self.QvalueArray[state[0], state[1]].tolist()))
+        self._update_greedy_actions(state)
+        self.stateActionPairCounts[state] = {action: 0 for action in self.get_actionspace()}
+        self.model[state] = {action: (None, None) for action in self.get_actionspace()}
+
+    def _initialize_stored_state(self, state: tuple):
+        # The arrays exist already, only the initial values and the aggregates may be missing
+        self._draw_initial_values(state)
+        self._update_stored_greedy_actions(state)
 
     def _update_greedy_actions(self, state: tuple):
-        maxActionValue = max(evaluate(self.Qvalues, state).values())
-        actionList = [action for action, value in evaluate(self.Qvalues, state).items() if value == maxActionValue]
-        assign(self.greedyActions, state, actionList)
+        # Full rescan of a state. Only needed at initialization and if the current maximum decreased, see _set_Q.
+        QvaluesForS = self.Qvalues[state]
+        maxActionValue = max(QvaluesForS.values())
+        self.greedyActions[state] = [action for action, value in QvaluesForS.items() if value == maxActionValue]
+        self.maxQvalues[state] = maxActionValue
+        self.QvalueSums[state] = sum(QvaluesForS.values())  # also removes rounding errors accumulated by the incremental updates
+
+    def _update_stored_greedy_actions(self, state: tuple):
+        QvaluesForS = self.QvalueArray[state[0], state[1]].tolist()
+        maxActionValue = max(QvaluesForS)
+        self.greedyActions[state] = [action for action, value in zip(self.get_actionspace(), QvaluesForS) if value == maxActionValue]
+        self.maxQvalues[state] = maxActionValue
+        self.QvalueSums[state] = sum(QvaluesForS)
 
     def _set_Q(self, S: tuple, A: tuple, value: float):
-        QvaluesForS = evaluate(self.Qvalues, S)
+        QvaluesForS = self.Qvalues[S]
+        oldValue = QvaluesForS[A]
         QvaluesForS[A] = value
-        self._update_greedy_actions(state=S)
+        self.QvalueArray[S[0], S[1], self.actionIndices[A]] = value  # mirror for vectorized visualization
+        self._update_aggregates(S, A, value, oldValue)
+
+    def _set_stored_Q(self, S: tuple, A: tuple, value: float):
+        QvaluesForS = self.QvalueArray[S[0], S[1]]
+        iAction = self.actionIndices[A]
+        oldValue = float(QvaluesForS[iAction])
+        QvaluesForS[iAction] = value
+        self._update_aggregates(S, A, float(QvaluesForS[iAction]), oldValue)  # the aggregates must match the value rounded to float32
+
+    def _update_aggregates(self, S: tuple, A: tuple, value: float, oldValue: float):
+        self.QvalueSums[S] += value - oldValue
+        self.maxQvalueChange = max(self.maxQvalueChange, abs(value - oldValue))
+        maxActionValue = self.maxQvalues[S]
+        greedyActions = self.greedyActions[S]
+        if value > maxActionValue:
+            self.maxQvalues[S] = value
+            if greedyActions != [A]:
+                self.greedyActions[S] = [A]
+                self.hasChangedGreedyActions = True
+        elif value == maxActionValue:
+            if A not in greedyActions:  # new tie, rare. Rebuilding keeps the actionspace order of the list.
+                self.greedyActions[S] = self._get_tied_actions(S, value)
+                self.hasChangedGreedyActions = True
+        elif A in greedyActions:
+            if len(greedyActions) > 1:  # the maximum itself stays the same
+                self.greedyActions[S] = [action for action in greedyActions if action != A]
+                self.hasChangedGreedyActions = True
+            else:  # the current maximum decreased, so the new one is unknown
+                self._update_greedy_actions(state=S)
+                self.hasChangedGreedyActions |= self.greedyActions[S] != greedyActions
+
+    def _get_tied_actions(self, S, value):
+        QvaluesForS = self.Qvalues[S]
+        return [action for action in self.get_actionspace() if QvaluesForS[action] == value]
+
+    def _get_stored_tied_actions(self, S, value):
+        return [action for action, Q in zip(self.get_actionspace(), self.QvalueArray[S[0], S[1]].tolist()) if Q == value]
 
     def _get_Q(self, S, A):
-        return evaluate(self.Qvalues, S)[A]
+        return self.Qvalues[S][A]
+
+    def _get_stored_Q(self, S, A):
+        return float(self.QvalueArray[S[0], S[1], self.actionIndices[A]])
+
+    def _memorize_transition(self, S, A, successorState, reward):
+        self.model[S][A] = (successorState, reward)
+
+    def _memorize_stored_transition(self, S, A, successorState, reward):
+        index = (*S, self.actionIndices[A])
+        self.tableStorage.get_modelSuccessors()[index] = successorState[0] * self.environment.get_shape()[1] + successorState[1]
+        self.tableStorage.get_modelRewards()[index] = reward
+
+    def _recall_transition(self, S, A):
+        return self.model[S][A]
+
+    def _recall_stored_transition(self, S, A):
+        index = (*S, self.actionIndices[A])
+        return divmod(int(self.tableStorage.get_modelSuccessors()[index]), self.environment.get_shape()[1]), float(self.tableStorage.get_modelRewards()[index])
 
     def _start_episode(self):
         self.targetAction = None
         self.currentReturnVar.set(0)
         self.currentEpisodeVar.set(self.currentEpisodeVar.get() + 1)
         self.iSuccessivePlannings = 0
-        self.stateAbsenceCounts.fill(0)  # this is only used for visualizing the trace of the agent! Never reset at this point a count that is used for MC or Dyna-Q!
+        self.episodeStartTime = self.time  # resets the absences of all states at once
         self.state = self.environment.give_initial_position()
         if self.state is None:
             raise RuntimeError("No Starting Point found")
+        if self.state not in self.greedyActions:
+            self._initialize_state(self.state)
 
     def _take_action(self):
         self.iSuccessivePlannings = 0
-        self.stateAbsenceCounts += 1
-        behaviorAction = self._generate_behavior_action()
+        self.plannedPairs = []  # their bonuses are outdated after this step
+        behaviorAction = self.behaviorActionFunc()
         reward, successorState, self.episodeFinished = self.environment.apply_action(behaviorAction)  # This is the only place where the agent exchanges information with the environment
         self.currentReturnVar.set(self.currentReturnVar.get() + reward)
-        evaluate(self.model, self.state)[behaviorAction] = (successorState, reward)
+        self.latestAction, self.latestReward = behaviorAction, reward
+        self._memorize_transition(self.state, behaviorAction, successorState, reward)
         self.memory.memorize(self.state, behaviorAction, reward)
-        self.visitedStateActionPairs.add((self.state, behaviorAction))  # enables efficient random choice of already visited state-action-pairs for Dyna-Q
-        self.stateAbsenceCounts[successorState] = 0
+        pair = (self.state, behaviorAction)
+        iPair = self.visitedStateActionPairs.get(pair)
+        if iPair is None:  # enables efficient random choice of already visited state-action-pairs for Dyna-Q
+            iPair = self.visitedStateActionPairs[pair] = len(self.visitedStateActionPairList)
+            self.visitedStateActionPairList.append(pair)
+        self.time += 1
+        if self.explorationBonus:
+            self._record_visit_time(iPair)
+        self.stateArrivalTimes[successorState] = self.time
         self.hasMadeExploratoryAction = self.hasChosenExploratoryAction  # if hasChosenExploratoryAction would be the only indicator for changing the agent color in the next visualization, then in the on-policy case, if the target was chosen to be an exploratory move in the last step-call, the coloring would happen BEFORE the move was taken, since in this line, the behavior action would already be determined and just copied from that target action with no chance to track if it was exploratory or not.
         self.state = successorState  # must happen after memorize and before generate_target!
+        if self.state not in self.greedyActions:
+            self._initialize_state(self.state)
         self._generate_target()
-        if not self.decayEpsilonEpisodeWiseVar.get() or self.episodeFinished:
+        if not self.decayEpsilonEpisodeWise or self.episodeFinished:
             self.behaviorPolicy.decay_epsilon()
             self.targetPolicy.decay_epsilon()
         # self.actionHistory.append(behaviorAction)  TODO: Dont forget debug stuff here
         # print(self.actionHistory)
 
-    def _generate_behavior_action(self):
-        if self.onPolicyVar.get() and self.targetAction:
+    def _generate_on_policy_behavior_action(self):
+        if self.targetAction:
             # In this case, the target action was chosen by the behavior policy (which is the only policy in on-policy) beforehand.
             return self.targetAction
-        else:  # This will be executed if one of the following applies:
-            # ...the updates are off policy, so the behavior action will NOT be copied from a previously chosen target action.
-            # ...there is no recent target action because: the _value used for the latest update was an expectation OR no update happened in this episode so far.
-            return self.behaviorPolicy.generate_action(self.state)
+        # there is no recent target action because: the _value used for the latest update was an expectation OR no update happened in this episode so far.
+        return self.behaviorPolicy.generate_action(self.state)
+
+    def _generate_off_policy_behavior_action(self):
+        # the updates are off policy, so the behavior action will NOT be copied from a previously chosen target action.
+        return self.behaviorPolicy.generate_action(self.state)
 
     def _generate_target(self):
         if self.episodeFinished:
             self.targetAction = None
             self.targetActionvalue = 0  # per definition
             return
-        if self.onPolicyVar.get():
-            policy = self.behaviorPolicy
-        else:
-            policy = self.targetPolicy
-        if self.updateByExpectationVar.get():
-            self.targetAction = None  # Without this line, if switched dynamically to expectation during an episode, in the On-Policy case, the action selected in the else-block below would be copied and used as the behavior action in every following turn, resulting in an agent that cannot change its direction anymore
-            self.targetActionvalue = policy.get_expected_actionvalue(self.state)
-        else:
-            self.targetAction = policy.generate_action(self.state)
-            self.targetActionvalue = self._get_Q(S=self.state, A=self.targetAction)
+        self.targetAction, self.targetActionvalue = self.targetFunc(self.targetGeneratingPolicy, self.state)
+
+    def _get_expected_target(self, policy, state):
+        # No target action. Otherwise, if switched dynamically to expectation during an episode, in the On-Policy case, a previously sampled action would be copied and used as the behavior action in every following turn, resulting in an agent that cannot change its direction anymore
+        return None, policy.get_expected_actionvalue(state)
+
+    def _get_sampled_target(self, policy, state):
+        targetAction = policy.generate_action(state)
+        return targetAction, self._get_Q(S=state, A=targetAction)
 
     def _process_earliest_memory(self):
         correspondingState, actionToUpdate, _ = self.memory.get_oldest_memory()
         discountedRewardSum = self.memory.get_discountedRewardSum()
-        self._update_actionvalue(actionToUpdate, correspondingState, discountedRewardSum, self.targetActionvalue, self.nStepVar.get())
+        self._update_actionvalue(actionToUpdate, correspondingState, discountedRewardSum, self.targetActionvalue, self.nStep)
         self.memory.forget_oldest_memory()
 
     def _update_actionvalue(self, actionToUpdate, correspondingState, discountedRewardSum, targetActionvalue, nStep):
@@ -208,28 +422,83 @@ class Agent:
         discountedTargetActionValue = cached_power(self.discountVar.get(), nStep) * targetActionvalue  # in the MC case (n is 0 here) the targetActionvalue is zero anyway, so it doesnt matter what n is.
         returnEstimate = discountedRewardSum + discountedTargetActionValue
         TD_error = returnEstimate - Qbefore
-        if self.dynamicAlphaVar.get():
-            actionCountDict = evaluate(self.stateActionPairCounts, correspondingState)
-            actionCountDict[actionToUpdate] += 1  # works because dicts are mutable so the evaluation above yields a "pointer" to the dict
-            self.learningRateVar.set(1/actionCountDict[actionToUpdate])
-        update = self.learningRateVar.get() * TD_error
+        update = self.learningRateFunc(correspondingState, actionToUpdate) * TD_error
         Qafter = Qbefore + update
         self._set_Q(S=correspondingState, A=actionToUpdate, value=Qafter)
+        self.latestUpdate = (correspondingState, actionToUpdate, Qbefore, Qafter)
+
+    def _get_constant_learningRate(self, state, action):
+        return self.learningRateVar.get()
+
+    def _get_count_based_learningRate(self, state, action):
+        actionCountDict = self.stateActionPairCounts[state]
+        actionCountDict[action] += 1  # works because dicts are mutable so the evaluation above yields a "pointer" to the dict
+        self.learningRateVar.set(1/actionCountDict[action])
+        return self.learningRateVar.get()
+
+    def _get_stored_count_based_learningRate(self, state, action):
+        index = (*state, self.actionIndices[action])
+        count = min(int(self.tableStorage.get_counts()[index]) + 1, self.tableStorage.get_maxCount())  # saturates, so α stays at its smallest value
+        self.tableStorage.get_counts()[index] = count
+        self.learningRateVar.set(1/count)
+        return self.learningRateVar.get()
 
     def _plan(self):
-        # TODO: Use efficient data structure as long as unvisited state-actions are not choosable. Alternative: all are choosable, but initialized with model(S,A)=S,0
-        correspondingState, actionToUpdate = random.choice(tuple(self.visitedStateActionPairs))
-        successorState, reward = evaluate(self.model, correspondingState)[actionToUpdate]
-        if self.updateByExpectationVar.get():
-            targetActionvalue = self.targetPolicy.get_expected_actionvalue(successorState)
+        if self.explorationBonus:
+            if not self.plannedPairs:
+                self._draw_planned_pairs()
+            correspondingState, actionToUpdate, bonus = self.plannedPairs.pop()
         else:
-            targetAction = self.targetPolicy.generate_action(successorState)
-            targetActionvalue = self._get_Q(S=successorState, A=targetAction)
+            correspondingState, actionToUpdate = self.rng.choice(self.visitedStateActionPairList)
+            bonus = 0
+        successorState, reward = self._recall_transition(correspondingState, actionToUpdate)
+        reward += bonus
+        _, targetActionvalue = self.targetFunc(self.targetPolicy, successorState)
         self._update_actionvalue(actionToUpdate, correspondingState, reward, targetActionvalue, nStep=1)
 
+    def _draw_planned_pairs(self):
+        """Draws the pairs of all remaining updates of the planning phase at once. Since no real step happens
+        until the phase ends, their bonuses κ·√τ can be computed in advance with a few array operations.
+        """
+        iPairs = self.rng.integer_array(len(self.visitedStateActionPairList), max(1, self.nPlanVar.get() - self.iSuccessivePlannings))
+        bonuses = (self.explorationBonus * np.sqrt(self.time - self._get_lastVisitTimes(iPairs))).tolist()
+        self.plannedPairs = [(*self.visitedStateActionPairList[iPair], bonus) for iPair, bonus in zip(reversed(iPairs.tolist()), reversed(bonuses))]  # popped from the end
+
+    def _record_visit_time(self, iPair):
+        if self.lastVisitTimes is None or iPair >= len(self.lastVisitTimes):
+            self._grow_lastVisitTimes()
+        self.lastVisitTimes[iPair] = self.time
+
+    def _record_stored_visit_time(self, iPair):
+        S, A = self.visitedStateActionPairList[iPair]
+        self.tableStorage.get_lastVisitTimes()[S[0], S[1], self.actionIndices[A]] = self.time
+
+    def _get_lastVisitTimes(self, iPairs):
+        if self.lastVisitTimes is None or len(self.lastVisitTimes) < len(self.visitedStateActionPairList):  # κ was just set
+            self._grow_lastVisitTimes()
+        return self.lastVisitTimes[iPairs]
+
+    def _get_stored_lastVisitTimes(self, iPairs):
+        pairs = [self.visitedStateActionPairList[iPair] for iPair in iPairs.tolist()]
+        hs, ws, iActions = zip(*[(S[0], S[1], self.actionIndices[A]) for S, A in pairs])
+        return self.tableStorage.get_lastVisitTimes()[hs, ws, iActions].astype(np.int64)
+
+    def _grow_lastVisitTimes(self):
+        """Allocates the visit times on first use and doubles their capacity whenever the visited pairs outgrow it."""
+        lastVisitTimes = np.zeros(max(self.MIN_VISIT_TIME_CAPACITY, 2 * len(self.visitedStateActionPairList)), dtype=np.int64)
+        if self.lastVisitTimes is not None:
+            lastVisitTimes[:len(self.lastVisitTimes)] = self.lastVisitTimes
+        self.lastVisitTimes = lastVisitTimes
+
     def get_discount(self):
         return self.discountVar.get()
 
+    def get_environment(self):
+        return self.environment
+
+    def get_policyEvaluator(self):
+        return self.policyEvaluator
+
     def get_episodeReturns(self):
         return self.episodeReturns
 
@@ -242,11 +511,36 @@ class Agent:
     def get_Qvalues(self):
         return self.Qvalues
 
+    def get_tableStorage(self):
+        return self.tableStorage
+
+    def get_QvalueArray(self):
+        """Returns the Q-values as a numpy array of shape (H, W, number of actions), ordered like the actionspace. Do not modify it.
+        Draws the initial values of all states that were not visited yet, so it should not be called by runs that never need the whole table.
+        """
+        if self.nUndrawnBlocks:
+            for iBlock in range(len(self.isBlockDrawn)):
+                if not self.isBlockDrawn[iBlock]:
+                    self._draw_block(iBlock)
+        return self.QvalueArray
+
     def get_greedyActions(self):
         return self.greedyActions
 
+    def get_greedyMask(self):
+        """Returns a boolean array of the shape of the Q-values, True for the greedy actions of each state."""
+        Qvalues = self.get_QvalueArray()
+        return Qvalues == Qvalues.max(axis=2, keepdims=True)
+
+    def get_maxQvalue(self, state):
+        return self.maxQvalues[state]
+
+    def get_QvalueSum(self, state):
+        return self.QvalueSums[state]
+
     def get_absence(self, state):
-        return self.stateAbsenceCounts[state]
+        """:return int: Number of actions taken since the agent was last in the state, at most since the start of the episode"""
+        return self.time - max(self.stateArrivalTimes.get(state, 0), self.episodeStartTime)
 
     def get_targetAction(self):
         return self.targetAction
@@ -259,3 +553,23 @@ class Agent:
 
     def get_actionspace(self):
         return self.actionspace
+
+    def get_rng(self):
+        return self.rng
+
+    def get_eventLog(self):
+        return self.eventLog
+
+    def get_stopReason(self):
+        """Returns why the convergence monitor asked to stop, or None."""
+        return self.stopReason
+
+    def get_run_summary(self):
+        """Returns the key figures of the run so far, f.e. for plot titles.
+
+        :return dict: Operations, actions, episodes and the stop reason, if any
+        """
+        return {"Operations": self.nOperations,
+                "Actions": len(self.stepReturns) - 1,
+                "Episodes": len(self.episodeReturns) - 1,
+                "Stop Reason": self.stopReason}
@@ -0,0 +1,193 @@
+import numpy as np
+
+from Agent import Agent
+from RandomStream import RandomStream
+
+
+class BatchAgent:
+    """Runs many independent tabular learners in lockstep on the same ``Environment``.\n
+    All Q-tables live in a single array of shape (R, H, W, A), one lane per learner, and every
+    ``step`` moves all lanes at once with a handful of numpy operations instead of R calls of
+    ``Agent.operate``. Learning rate, discount, exploration rate and its decay may differ per lane,
+    which makes it cheap to average learning curves over many seeds or to sweep a small grid of
+    hyperparameters.\n
+    To allow that, the dynamics of the environment are tabulated once at construction
+    (destinations, rewards, terminal cells and teleporter destinations), so later changes of the
+    environment do not affect the lanes. Only one-step ε-greedy TD control is covered:
+    SARSA, Q-learning and Expected SARSA, without n-step returns, planning or dynamic α.
+    """
+    SARSA = "SARSA"
+    Q_LEARNING = "Q-Learning"
+    EXPECTED_SARSA = "Expected SARSA"
+    TARGETS = [SARSA, Q_LEARNING, EXPECTED_SARSA]
+    MIN_EPSILON = 1e-04  # same floor as in EpsilonGreedyPolicy.decay_epsilon
+
+    def __init__(self, environment, nLanes, target=Q_LEARNING, learningRate=0.1, discount=1., epsilon=0.1, epsilonDecayRate=1., decayEpsilonEpisodeWise=False,
+                 use_straightActions=True, use_diagonalActions=False, use_idleActions=False, initialActionvalueMean=0., initialActionvalueSigma=0., rng=None):
+        """Creates a ``BatchAgent`` object.
+
+        :param Environment environment: Already updated environment, its dynamics are tabulated right away
+        :param int nLanes: Number of independent learners R
+        :param str target: One of ``BatchAgent.TARGETS``
+        :param float | list[float] learningRate: α, scalar or one per lane
+        :param float | list[float] discount: γ, scalar or one per lane
+        :param float | list[float] epsilon: Initial ε of the behavior policy, scalar or one per lane. Expected SARSA also uses it for its target.
+        :param float | list[float] epsilonDecayRate: Factor applied to ε after each step, scalar or one per lane
+        :param bool decayEpsilonEpisodeWise: If True, ε of a lane only decays when one of its episodes finishes
+        :param bool use_straightActions: See ``Agent.create_actionspace``
+        :param bool use_diagonalActions: See ``Agent.create_actionspace``
+        :param bool use_idleActions: See ``Agent.create_actionspace``
+        :param float initialActionvalueMean: Mean of the normal distribution the initial Q-values are drawn from
+        :param float initialActionvalueSigma: Standard deviation of that distribution
+        :param RandomStream | None rng: Source of all random numbers of the lanes
+        """
+        if target not in self.TARGETS:
+            raise ValueError(f"target must be one of {self.TARGETS}, not {target}")
+        self.environment = environment
+        self.R = nLanes
+        self.target = target
+        self.rng = RandomStream() if rng is None else rng
+        self.generator = self.rng.get_generator()  # lanes draw whole arrays at once, so the buffered scalar draws are not used here
+        self.actionspace = Agent.create_actionspace(straight=use_straightActions, diagonal=use_diagonalActions, idle=use_idleActions)
+        self.H, self.W = environment.get_shape()
+        self.learningRates = self._per_lane(learningRate)
+        self.discounts = self._per_lane(discount)
+        self.epsilons = self._per_lane(epsilon)
+        self.epsilonDecayRates = self._per_lane(epsilonDecayRate)
+        self.decayEpsilonEpisodeWise = decayEpsilonEpisodeWise
+        self._tabulate_environment()
+        self.QvalueArray = self.rng.normal(initialActionvalueMean, initialActionvalueSigma, size=(self.R, self.H, self.W, len(self.actionspace)))
+        self.flatQvalues = self.QvalueArray.reshape(self.R, self.H * self.W, len(self.actionspace))  # view, states as flat indices
+        self.lanes = np.arange(self.R)
+        self.states = self._draw_initial_states(self.R)
+        self.actions = self._choose_actions(self.lanes, self.states)
+        self.currentReturns = np.zeros(self.R)
+        self.episodeReturns = [[] for _ in range(self.R)]
+        self.nSteps = 0
+
+    def _per_lane(self, value):
+        return np.broadcast_to(np.asarray(value, dtype=float), (self.R,)).copy()
+
+    def _tabulate_environment(self):
+        """Evaluates every state-action pair of the environment once. States are flat indices h*W + w from here on."""
+        nStates = self.H * self.W
+        positions = [(h, w) for h in range(self.H) for w in range(self.W)]
+        flat = lambda position: position[0] * self.W + position[1]
+        self.destinations = np.stack([np.ravel_multi_index(np.moveaxis(self.environment.get_move_destinations(action), 2, 0), (self.H, self.W)).ravel()
+                                      for action in self.actionspace], axis=1)
+        self.arrivalRewards = self.environment.get_arrivalRewards().ravel().astype(float)
+        self.isTerminal = self.environment.isGoal.ravel().copy()
+        teleportCandidates = [[flat(candidate) for candidate in self.environment.get_teleport_destination_candidates(position)] if self.environment.teleportSinks[position] else []
+                              for position in positions]
+        self.nTeleportCandidates = np.array([len(candidates) for candidates in teleportCandidates])
+        self.teleportCandidates = np.zeros((nStates, max(1, self.nTeleportCandidates.max())), dtype=int)
+        for state, candidates in enumerate(teleportCandidates):
+            self.teleportCandidates[state, :len(candidates)] = candidates
+        initialPositions = self.environment.get_initial_position_candidates()
+        if initialPositions == [None]:
+            raise ValueError("The environment has no cell to start from")
+        self.initialStates = np.array([flat(position) for position in initialPositions])
+
+    def _draw_initial_states(self, n):
+        return self.initialStates[self.generator.integers(len(self.initialStates), size=n)]
+
+    def _choose_actions(self, lanes, states):
+        """ε-greedy action indices for the given lanes in the given states, ties are broken uniformly."""
+        Qvalues = self.flatQvalues[lanes, states]
+        isGreedy = Qvalues == Qvalues.max(axis=1, keepdims=True)
+        greedyActions = np.argmax(isGreedy + 0.5 * self.generator.random(Qvalues.shape), axis=1)  # greedy ones score at least 1, all others less
+        isExploratory = self.generator.random(len(lanes)) < self.epsilons[lanes]
+        return np.where(isExploratory, self.generator.integers(len(self.actionspace), size=len(lanes)), greedyActions)
+
+    def step(self):
+        """Takes one action and performs one update in every lane."""
+        states, actions = self.states, self.actions
+        nextStates = self.destinations[states, actions]
+        rewards = self.arrivalRewards[nextStates]
+        nCandidates = self.nTeleportCandidates[nextStates]
+        isTeleported = np.flatnonzero(nCandidates)
+        if isTeleported.size:
+            iCandidates = (self.generator.random(isTeleported.size) * nCandidates[isTeleported]).astype(int)
+            nextStates[isTeleported] = self.teleportCandidates[nextStates[isTeleported], iCandidates]
+            rewards[isTeleported] += self.arrivalRewards[nextStates[isTeleported]]
+        isFinished = self.isTerminal[nextStates]
+
+        nextActions = self._choose_actions(self.lanes, nextStates)
+        nextQvalues = self.flatQvalues[self.lanes, nextStates]
+        if self.target == self.SARSA:
+            targetValues = nextQvalues[self.lanes, nextActions]
+        elif self.target == self.Q_LEARNING:
+            targetValues = nextQvalues.max(axis=1)
+        else:  # same expectation as EpsilonGreedyPolicy.get_expected_actionvalue
+            targetValues = self.epsilons * nextQvalues.mean(axis=1) + (1 - self.epsilons) * nextQvalues.max(axis=1)
+        targetValues[isFinished] = 0
+        oldQvalues = self.flatQvalues[self.lanes, states, actions]
+        self.flatQvalues[self.lanes, states, actions] = oldQvalues + self.learningRates * (rewards + self.discounts * targetValues - oldQvalues)
+        self.currentReturns += rewards
+
+        if not self.decayEpsilonEpisodeWise:
+            self._decay_epsilons(self.lanes)
+        finishedLanes = np.flatnonzero(isFinished)
+        if finishedLanes.size:
+            for lane in finishedLanes:
+                self.episodeReturns[lane].append(float(self.currentReturns[lane]))
+            self.currentReturns[finishedLanes] = 0
+            if self.decayEpsilonEpisodeWise:
+                self._decay_epsilons(finishedLanes)
+            nextStates[finishedLanes] = self._draw_initial_states(finishedLanes.size)
+            nextActions[finishedLanes] = self._choose_actions(finishedLanes, nextStates[finishedLanes])
+        self.states = nextStates
+        self.actions = nextActions
+        self.nSteps += 1
+
+    def _decay_epsilons(self, lanes):
+        epsilons = self.epsilons[lanes] * self.epsilonDecayRates[lanes]
+        epsilons[epsilons < self.MIN_EPSILON] = 0.
+        self.epsilons[lanes] = epsilons
+
+    def run(self, nSteps):
+        for _ in range(nSteps):
+            self.step()
+
+    def get_QvalueArray(self, lane=None):
+        """:return np.ndarray: Q-values of shape (R, H, W, A), or (H, W, A) of a single lane"""
+        return self.QvalueArray if lane is None else self.QvalueArray[lane]
+
+    def get_episodeReturns(self, lane=None):
+        """:return list: Returns of all finished episodes of a lane, or lists of those of every lane"""
+        return self.episodeReturns if lane is None else self.episodeReturns[lane]
+
+    def get_mean_episodeReturns(self, lanes=None):
+        """Learning curve averaged over lanes, cut to the number of episodes all of them have finished.
+
+        :param list[int] | np.ndarray | None lanes: Lanes to average, f.e. those sharing a hyperparameter setting. All if None.
+        :return np.ndarray: Mean return of the i-th episode
+        """
+        curves = [self.episodeReturns[lane] for lane in (self.lanes if lanes is None else lanes)]
+        nEpisodes = min(len(curve) for curve in curves)
+        return np.array([curve[:nEpisodes] for curve in curves]).mean(axis=0)
+
+    def get_actionspace(self):
+        return self.actionspace
+
+    def get_epsilons(self):
+        return self.epsilons
+
+    def get_nSteps(self):
+        return self.nSteps
+
+
+if __name__ == "__main__":
+    import time
+    from HeadlessSandbox import HeadlessSandbox
+
+    environment = HeadlessSandbox("06_22_cliff_walking_4x12").get_environment()
+    learningRates = np.repeat([0.1, 0.3, 0.5], 100)  # 3 settings x 100 seeds
+    for target in BatchAgent.TARGETS:
+        batchAgent = BatchAgent(environment, len(learningRates), target=target, learningRate=learningRates, epsilon=0.1, rng=RandomStream(0))
+        start = time.perf_counter()
+        batchAgent.run(10000)
+        duration = time.perf_counter() - start
+        curves = {alpha: batchAgent.get_mean_episodeReturns(np.flatnonzero(learningRates == alpha)) for alpha in np.unique(learningRates)}
+        print(f"{target:<15} {batchAgent.R * batchAgent.get_nSteps() / duration:>10.0f} steps/s, mean return of the last 20 episodes: "
+              + ", ".join(f"α={alpha}: {curve[-20:].mean():.1f}" for alpha, curve in curves.items()))
@@ -1,15 +1,37 @@
 class Cell:
-    """Used by ``Environment`` class to represent a cell in the gridworld and store information about it.
+    """View of a single cell of an ``Environment``, for callers that prefer objects over the arrays
+    the environment stores its cells in. Holds no data itself, so it always reflects the latest update.
     No graphical representation here, just data!
     """
-    def __init__(self, position, isWall, isStart, isGoal, arrivalRewardVar, teleportSource, teleportSink):
+    __slots__ = ("environment", "position")
+
+    def __init__(self, environment, position):
+        self.environment = environment
         self.position = position
-        self.isWall = isWall
-        self.isStart = isStart
-        self.isGoal = isGoal
-        self.arrivalRewardVar = arrivalRewardVar
-        self.teleportSource = teleportSource
-        self.teleportSink = teleportSink
+
+    @property
+    def isWall(self):
+        return bool(self.environment.isWall[self.position])
+
+    @property
+    def isStart(self):
+        return bool(self.environment.isStart[self.position])
+
+    @property
+    def isGoal(self):
+        return bool(self.environment.isGoal[self.position])
+
+    @property
+    def teleportSource(self):
+        return self.environment.teleporterNames[self.environment.teleportSources[self.position]]
+
+    @property
+    def teleportSink(self):
+        return self.environment.teleporterNames[self.environment.teleportSinks[self.position]]
+
+    @property
+    def arrivalRewardVar(self):
+        return self.environment.rewardVars[self.environment.rewardClasses[self.position]]
 
     def is_suitable_spawn(self):
         return not any([self.isWall, self.isGoal, self.is_teleport_entry()])
@@ -27,4 +49,4 @@ class Cell:
         return self.position
 
     def get_arrivalReward(self):
-        return self.arrivalRewardVar.get()
+        return self.environment.arrivalRewards[self.position].item()
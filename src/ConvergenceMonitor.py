@@ -0,0 +1,74 @@
+from collections import deque
+
+
+class ConvergenceMonitor:
+    """Decides at the end of every episode whether a run may stop early, so a large
+    "Operations Left" budget is not burned after learning has settled.\n
+    Three independent criteria are available, each disabled by a value of 0:
+    the greedy policy did not change for a number of episodes, the largest change of
+    a single Q-value during the last episode stayed below a tolerance, and the mean
+    return of the latest episodes differs from that of the episodes before by at most
+    a tolerance. Only summaries of each episode are passed in, which the ``Agent``
+    keeps track of anyway, so checking costs next to nothing. For the plateau, only the returns of the two
+    windows are kept, along with their running sums.
+    """
+    STABLE_POLICY = "Greedy policy unchanged for {} episodes"
+    SMALL_QVALUE_CHANGE = "Max |ΔQ| of an episode below {}"
+    RETURN_PLATEAU = "Mean return of {} episodes changed by at most {}"
+
+    def __init__(self, stablePolicyEpisodesVar, QvalueChangeToleranceVar, plateauEpisodesVar, plateauToleranceVar):
+        """Creates a ``ConvergenceMonitor`` object.
+
+        :param stablePolicyEpisodesVar: Number of successive episodes without change of the greedy policy needed to stop
+        :param QvalueChangeToleranceVar: Stops if no Q-value changed by this much or more during an episode
+        :param plateauEpisodesVar: Size of the two adjacent windows of episode returns whose means are compared
+        :param plateauToleranceVar: Stops if these means differ by this much or less
+        """
+        self.stablePolicyEpisodesVar = stablePolicyEpisodesVar
+        self.QvalueChangeToleranceVar = QvalueChangeToleranceVar
+        self.plateauEpisodesVar = plateauEpisodesVar
+        self.plateauToleranceVar = plateauToleranceVar
+        self.nStablePolicyEpisodes = 0
+        self.plateauReturns = deque(maxlen=0)  # returns of the latest 2 * plateauEpisodes episodes, the older half is the previous window
+        self.previousSum = 0.
+        self.latestSum = 0.
+
+    def check(self, hasChangedGreedyActions, maxQvalueChange, episodeReturn):
+        """Called by the ``Agent`` whenever an episode finished.
+
+        :param bool hasChangedGreedyActions: If the greedy actions of any state changed during the episode
+        :param float maxQvalueChange: Largest absolute change of a single Q-value during the episode
+        :param float episodeReturn: Return of the episode
+        :return str | None: Reason to stop, or None to go on
+        """
+        self.nStablePolicyEpisodes = 0 if hasChangedGreedyActions else self.nStablePolicyEpisodes + 1
+        stablePolicyEpisodes = self.stablePolicyEpisodesVar.get()
+        if stablePolicyEpisodes and self.nStablePolicyEpisodes >= stablePolicyEpisodes:
+            return self.STABLE_POLICY.format(self.nStablePolicyEpisodes)
+        tolerance = self.QvalueChangeToleranceVar.get()
+        if tolerance and maxQvalueChange < tolerance:
+            return self.SMALL_QVALUE_CHANGE.format(tolerance)
+        plateauEpisodes = self.plateauEpisodesVar.get()
+        if plateauEpisodes:
+            self._add_plateau_return(episodeReturn, plateauEpisodes)
+            if len(self.plateauReturns) == 2 * plateauEpisodes and abs(self.latestSum / plateauEpisodes - self.previousSum / plateauEpisodes) <= self.plateauToleranceVar.get():
+                return self.RETURN_PLATEAU.format(plateauEpisodes, self.plateauToleranceVar.get())
+        return None
+
+    def _add_plateau_return(self, episodeReturn, plateauEpisodes):
+        """Shifts the two windows by one episode and updates their sums, without summing them up again.
+
+        :param float episodeReturn: Return of the episode
+        :param int plateauEpisodes: Current window size. If it was changed, the windows keep the latest returns that still fit.
+        """
+        if self.plateauReturns.maxlen != 2 * plateauEpisodes:
+            self.plateauReturns = deque(self.plateauReturns, maxlen=2 * plateauEpisodes)
+            self.latestSum = sum(list(self.plateauReturns)[-plateauEpisodes:])
+            self.previousSum = sum(self.plateauReturns) - self.latestSum
+        if len(self.plateauReturns) == self.plateauReturns.maxlen:
+            self.previousSum -= self.plateauReturns[0]  # dropped by the append below
+        if len(self.plateauReturns) >= plateauEpisodes:
+            self.previousSum += self.plateauReturns[-plateauEpisodes]  # moves from the latest to the previous window
+            self.latestSum -= self.plateauReturns[-plateauEpisodes]
+        self.plateauReturns.append(episodeReturn)
+        self.latestSum += episodeReturn
@@ -1,8 +1,7 @@
 import numpy as np
-import random
 
-from myFuncs import matrix, hRange, wRange, evaluate, shape
 from Cell import Cell
+from RandomStream import RandomStream
 
 
 class Environment:
@@ -15,80 +14,206 @@ class Environment:
     rebuilding most of the gridworlds introduced in the book
     "Reinforcement Learning - An Introduction" by Sutton & Barto.
     """
-    def __init__(self, H, W, hasIceFloorVar, isHtorusVar, isWtorusVar, hWindVars, wWindVars):
-        self.grid = matrix(H, W)
+    def __init__(self, H, W, hasIceFloorVar, isHtorusVar, isWtorusVar, hWindVars, wWindVars, rng=None):
+        self.shape = (H, W)
+        self.rng = RandomStream() if rng is None else rng
         self.hasIceFloorVar = hasIceFloorVar
         self.isTorusVars = (isHtorusVar, isWtorusVar)
         self.windVars = (hWindVars, wWindVars)
         self.agentPosition = None  # In a gridworld, position and agent state can be treated equivalent, but not in general! i.e. snake
         self.teleportJustUsed = None  # needed as a flag for coloring this tile yellow
         self.windJustUsed = None
+        # The cells are stored as a structure of arrays, a few bytes per cell. Cell objects are only created as views on demand.
+        self.isWall = np.zeros(self.shape, dtype=bool)
+        self.isStart = np.zeros(self.shape, dtype=bool)
+        self.isGoal = np.zeros(self.shape, dtype=bool)
+        self.teleportSources = np.zeros(self.shape, dtype=np.int8)  # index in self.teleporterNames, 0 means none
+        self.teleportSinks = np.zeros(self.shape, dtype=np.int8)
+        self.teleporterNames = [None]
+        self.rewardClasses = np.zeros(self.shape, dtype=np.int8)  # index in self.rewardVars
+        self.rewardVars = []
+        self.arrivalRewards = np.zeros(self.shape)  # reward of each cell, refreshed from self.rewardVars by refresh_rewards
+        self.cells = None  # Cell views, created by get_grid
+        self.positionLists = {}  # cache of bulk queries, in row-major order, the order random choices are made from
 
     def update(self, tileData):
-        for h in hRange(self.grid):
-            for w in wRange(self.grid):
-                self.grid[h][w] = Cell(**tileData[h][w])
+        """Replaces all cells.
+
+        :param list[list[dict]] tileData: Matrix of keyword arguments like those of a ``Cell``
+        """
+        self.update_cells(cellKwargs for row in tileData for cellKwargs in row)
+
+    def update_cells(self, cellData):
+        """Replaces only the given cells, f.e. those changed in an editor since the last update.
+
+        :param Iterable[dict] cellData: Keyword arguments like those of a ``Cell`` (position, isWall, isStart, isGoal, arrivalRewardVar, teleportSource, teleportSink)
+        """
+        for cellKwargs in cellData:
+            position = cellKwargs["position"]
+            self.isWall[position] = cellKwargs["isWall"]
+            self.isStart[position] = cellKwargs["isStart"]
+            self.isGoal[position] = cellKwargs["isGoal"]
+            self.teleportSources[position] = self._get_teleporter_id(cellKwargs["teleportSource"])
+            self.teleportSinks[position] = self._get_teleporter_id(cellKwargs["teleportSink"])
+            self.rewardClasses[position] = self._get_rewardClass(cellKwargs["arrivalRewardVar"])
+        self.positionLists = {}
+        self.refresh_rewards()
+
+    def refresh_rewards(self):
+        """Reads the current value of every reward variable once and assigns it to all cells of its class.
+        Must be called whenever a reward variable changes, which the sandbox does by a trace.
+        """
+        rewardValues = np.array([rewardVar.get() for rewardVar in self.rewardVars] or [0])  # keeps int rewards int
+        self.arrivalRewards = rewardValues[self.rewardClasses]
+
+    def _get_teleporter_id(self, name):
+        if name not in self.teleporterNames:
+            self.teleporterNames.append(name)
+        return self.teleporterNames.index(name)
+
+    def _get_rewardClass(self, rewardVar):
+        for rewardClass, knownVar in enumerate(self.rewardVars):
+            if knownVar is rewardVar:
+                return rewardClass
+        self.rewardVars.append(rewardVar)
+        return len(self.rewardVars) - 1
+
+    def _get_positions(self, key, get_mask):
+        """Positions where a boolean mask is True, as a list of tuples in row-major order. Cached until the next update.
+
+        :param key: Cache key of the query
+        :param function get_mask: Returns the boolean mask of shape (H, W). Only called on a cache miss, since building it is a pass over all cells.
+        """
+        if key not in self.positionLists:
+            self.positionLists[key] = [tuple(position) for position in np.argwhere(get_mask()).tolist()]
+        return self.positionLists[key]
+
+    def get_spawn_mask(self):
+        """Vectorized ``Cell.is_suitable_spawn`` of all cells."""
+        return ~(self.isWall | self.isGoal | (self.teleportSinks != 0))
 
     def apply_action(self, action):
         # Step, Wind & Ice:
-        self.windJustUsed = None
-        oldEstimate = self.agentPosition
-        while True:
-            stepDestinationEstimate = self._get_step_destination(oldEstimate, action)  # processes world edge / torus / wall
-            windDestinationEstimate = self._get_wind_destination(stepDestinationEstimate)
-            if windDestinationEstimate != stepDestinationEstimate:
-                self.windJustUsed = stepDestinationEstimate
-            if not self.hasIceFloorVar.get() or windDestinationEstimate == oldEstimate:
-                break
-            oldEstimate = windDestinationEstimate
-        self.agentPosition = windDestinationEstimate
+        self.agentPosition, self.windJustUsed = self.get_move_destination(self.agentPosition, action)
         reward = self._gather_reward()
         # Teleporter:
         self.teleportJustUsed = None
-        if evaluate(self.grid, self.agentPosition).is_teleport_entry():
+        if self.teleportSinks[self.agentPosition]:
             self.teleportJustUsed = self.agentPosition  # needed for coloring
             self.agentPosition = self._get_teleport_destination(self.agentPosition)
             reward += self._gather_reward()
         # Goal:
-        episodeFinished = evaluate(self.grid, self.agentPosition).terminates_episode()
+        episodeFinished = bool(self.isGoal[self.agentPosition])
         return reward, self.agentPosition, episodeFinished
 
     def give_initial_position(self):
-        cellArray = np.array(self.grid).flatten()
-        candidates = [cell.get_position() for cell in cellArray if cell.isStart]
+        self.agentPosition = self.rng.choice(self.get_initial_position_candidates())
+        return self.agentPosition
+
+    def get_initial_position_candidates(self):
+        candidates = self._get_positions("start", lambda: self.isStart)
         if not candidates:  # random start if none is defined
-            candidates = [cell.get_position() for cell in cellArray if cell.is_suitable_spawn()]
+            candidates = self._get_positions("spawn", self.get_spawn_mask)
         if not candidates:
             candidates = [None]
-        self.agentPosition = random.choice(candidates)
-        return self.agentPosition
+        return candidates
+
+    def get_move_destination(self, position, action):
+        """Deterministic part of a transition: step, wind and ice, but no teleporters.
+
+        :param tuple position: Position before the move
+        :param tuple action: Action taken
+        :return tuple: (destination, position where the wind acted or None)
+        """
+        windJustUsed = None
+        oldEstimate = position
+        while True:
+            stepDestinationEstimate = self._get_step_destination(oldEstimate, action)  # processes world edge / torus / wall
+            windDestinationEstimate = self._get_wind_destination(stepDestinationEstimate)
+            if windDestinationEstimate != stepDestinationEstimate:
+                windJustUsed = stepDestinationEstimate
+            if not self.hasIceFloorVar.get() or windDestinationEstimate == oldEstimate:
+                break
+            oldEstimate = windDestinationEstimate
+        return windDestinationEstimate, windJustUsed
+
+    def get_move_destinations(self, action):
+        """Vectorized ``get_move_destination`` of all cells at once, f.e. to tabulate the dynamics or to search paths in large worlds.
+
+        :param tuple action: Action taken
+        :return np.ndarray: Destinations of shape (H, W, 2)
+        """
+        H, W = self.shape
+        hWind = np.array([windVar.get() for windVar in self.windVars[0]], dtype=int)  # one per column
+        wWind = np.array([windVar.get() for windVar in self.windVars[1]], dtype=int)  # one per row
+        hasIceFloor = self.hasIceFloorVar.get()
+        destinations = np.empty((H * W, 2), dtype=int)
+        iCells = np.arange(H * W)  # cells whose destination is not known yet
+        h, w = np.divmod(iCells, W)
+        for _ in range(H * W + 1):  # sliding on ice may cycle forever, f.e. on a torus without walls. The scalar version would never stop in that case.
+            stepH, stepW = self._get_step_destinations(h, w, *action)
+            windH, windW = self._get_wind_destinations(stepH, stepW, hWind, wWind)
+            isDone = (windH == h) & (windW == w) if hasIceFloor else np.ones(len(iCells), dtype=bool)
+            destinations[iCells[isDone]] = np.column_stack((windH[isDone], windW[isDone]))
+            iCells, h, w = iCells[~isDone], windH[~isDone], windW[~isDone]
+            if not len(iCells):
+                break
+        destinations[iCells] = np.column_stack((h, w))
+        return destinations.reshape(H, W, 2)
+
+    def _get_step_destinations(self, h, w, dh, dw):
+        """Vectorized ``_get_step_destination``. Steps may differ per cell."""
+        newPosition = []
+        for position, step, dimSize, isTorusVar in zip((h, w), (dh, dw), self.shape, self.isTorusVars):
+            rawEstimate = position + step
+            newPosition.append(rawEstimate % dimSize if isTorusVar.get() else np.clip(rawEstimate, 0, dimSize - 1))
+        isBlocked = self.isWall[newPosition[0], newPosition[1]]
+        return np.where(isBlocked, h, newPosition[0]), np.where(isBlocked, w, newPosition[1])
+
+    def _get_wind_destinations(self, h, w, hWind, wWind):
+        """Vectorized ``_get_wind_destination``. The wind of each cell is applied step by step until it is used up or blocked."""
+        windH, windW = hWind[w], wWind[h]
+        isApplied = ((windH != 0) | (windW != 0)) & ((windH == 0) | (windW == 0) | (np.abs(windH) == np.abs(windW)))
+        strengths = np.where(isApplied, np.maximum(np.abs(windH), np.abs(windW)), 0)
+        h, w = h.copy(), w.copy()
+        iMoving = np.flatnonzero(strengths)
+        for i in range(strengths.max(initial=0)):
+            iMoving = iMoving[strengths[iMoving] > i]
+            newH, newW = self._get_step_destinations(h[iMoving], w[iMoving], np.sign(windH[iMoving]), np.sign(windW[iMoving]))
+            hasMoved = (newH != h[iMoving]) | (newW != w[iMoving])
+            h[iMoving], w[iMoving] = newH, newW
+            iMoving = iMoving[hasMoved]
+        return h, w
+
+    def get_teleport_destination_candidates(self, position):
+        """Returns the positions a teleporter entry at the given position may lead to, each equally likely."""
+        teleporterId = int(self.teleportSinks[position])
+        sources = self._get_positions(("source", teleporterId), lambda: self.teleportSources == teleporterId)
+        candidates = [source for source in sources if source != position]
+        if not candidates:  # random destination if no free source of this teleporter is available
+            candidates = self._get_positions("spawn", self.get_spawn_mask)
+        if not candidates:
+            candidates = [position]
+        return candidates
 
     def remove_agent(self):
         self.agentPosition = None
         return self.agentPosition
 
     def _get_teleport_destination(self, position):
-        entryCell = evaluate(self.grid, position)
-        teleportName = entryCell.teleportSink
-        cellArray = np.array(self.grid).flatten()
-        candidates = [cell.get_position() for cell in cellArray if (cell.is_teleportName_destination(teleportName) and cell is not entryCell)]
-        if not candidates:  # random destination if no free source of this teleporter is available
-            candidates = [cell.get_position() for cell in cellArray if (cell.is_suitable_spawn())]
-        if not candidates:
-            candidates = [position]
-        return random.choice(candidates)
+        return self.rng.choice(self.get_teleport_destination_candidates(position))
 
     def _get_step_destination(self, position, step):
         estimate = [-1, -1]
         for iDim in [0,1]:
             rawEstimate = position[iDim] + step[iDim]
-            dimSize = shape(self.grid)[iDim]
+            dimSize = self.shape[iDim]
             if self.isTorusVars[iDim].get():
                 estimate[iDim] = rawEstimate % dimSize
             else:
                 estimate[iDim] = min(max(rawEstimate, 0), dimSize-1)
         estimate = tuple(estimate)
-        if evaluate(self.grid, estimate).isWall:
+        if self.isWall[estimate]:
             return position
         return estimate
 
@@ -107,10 +232,27 @@ class Environment:
         return position
 
     def _gather_reward(self):
-        return evaluate(self.grid, self.agentPosition).get_arrivalReward()
+        return self.arrivalRewards[self.agentPosition].item()
 
     def get_grid(self):
-        return self.grid
+        """Returns a matrix of ``Cell`` views. They stay valid across updates, since they read the arrays of this environment."""
+        if self.cells is None:
+            self.cells = [[Cell(self, (h, w)) for w in range(self.shape[1])] for h in range(self.shape[0])]
+        return self.cells
+
+    def get_rng(self):
+        return self.rng
+
+    def get_shape(self):
+        return self.shape
+
+    def get_wallMask(self):
+        """Returns a boolean array of shape (H, W), True for walls. Do not modify it."""
+        return self.isWall
+
+    def get_arrivalRewards(self):
+        """Returns the reward for arriving at each cell as array of shape (H, W). Do not modify it."""
+        return self.arrivalRewards
 
     def get_teleportJustUsed(self):
         return self.teleportJustUsed
@@ -1,7 +1,4 @@
-import random
-
 from Policy import Policy
-from myFuncs import evaluate
 
 
 class EpsilonGreedyPolicy(Policy):
@@ -19,7 +16,7 @@ class EpsilonGreedyPolicy(Policy):
         # debug:
         #if self.agent.actionPlan:
         #    return self.agent.actionPlan.pop(0)
-        if self.epsilonVar.get() and random.random() < self.epsilonVar.get():  # only use rng if necessary
+        if self.epsilonVar.get() and self.rng.random() < self.epsilonVar.get():  # only use rng if necessary
             self.agent.hasChosenExploratoryAction = True
             return self.sample_random_action()
         else:
@@ -28,14 +25,12 @@ class EpsilonGreedyPolicy(Policy):
         
     def get_expected_actionvalue(self, state):
         # step by step:
-        currentStateQvalueDict = evaluate(self.agent.get_Qvalues(), state)
-        currentStateGreedyAction = evaluate(self.agent.get_greedyActions(), state)[0]
-        greedyMean = currentStateQvalueDict[currentStateGreedyAction]
+        greedyMean = self.agent.get_maxQvalue(state)
         # technically, for calculating the mean Qvalue of the greedy action choice, we have to average over all values of current greedy actions.
         # But since all greedy actions have by definition the same _value (namely the maximum Qvalue of all currently available actions),
-        # we can just set the Qvalue of our first listed greedy action as the mean.
+        # the maximum maintained by the agent already is that mean.
         if self.epsilonVar.get():
-            exploratoryMean = sum(currentStateQvalueDict.values()) / len(currentStateQvalueDict)
+            exploratoryMean = self.agent.get_QvalueSum(state) / len(self.agent.get_actionspace())  # sum is maintained incrementally by the agent, no need to iterate over all actions
             return self.epsilonVar.get() * exploratoryMean + (1 - self.epsilonVar.get()) * greedyMean
         else:  # save computation time if policy is greedy (epsilon == 0)
             return greedyMean
@@ -0,0 +1,126 @@
+import numpy as np
+import json
+from pathlib import Path
+
+
+class EventLog:
+    """Compact binary log of every ``Agent.operate`` outcome, written while training.\n
+    Each operation becomes one fixed-size record (operation, state, action, reward,
+    updated state-action pair with old and new Q-value, exploratory flag and the
+    highlights of the environment). Every ``keyframeInterval`` records, the complete
+    Q-value array is stored as keyframe, so a ``Replay`` can seek to any step by
+    loading the nearest keyframe and applying the Q-value deltas in between.
+    But only once the records since the previous keyframe are at least as large as a keyframe,
+    so on large worlds keyframes never take more than about half of the file.\n
+    File layout: ``MAGIC``, the json header length (uint32) and the json header,
+    followed by blocks. Event blocks consist of ``EVENT_TAG``, the number of records
+    (uint32) and the records, keyframe blocks of ``KEYFRAME_TAG``, the step (uint64)
+    and the float64 Q-value array.
+    """
+    SUFFIX = ".gwlog"
+    MAGIC = b"GWEVLOG1"
+    EVENT_TAG = b"E"
+    KEYFRAME_TAG = b"K"
+    NONE = -1  # stored instead of None for positions and action indices
+    RECORD_DTYPE = np.dtype([("operation", "u1"),        # index in Agent.OPERATIONS
+                             ("exploratory", "?"),
+                             ("state", "i2", (2,)),
+                             ("action", "i1"),           # index in the actionspace
+                             ("targetAction", "i1"),
+                             ("reward", "f4"),
+                             ("updatedState", "i2", (2,)),
+                             ("updatedAction", "i1"),
+                             ("oldQ", "f8"),             # float64, so replayed Q-values are exact
+                             ("newQ", "f8"),
+                             ("teleportJustUsed", "i2", (2,)),
+                             ("windJustUsed", "i2", (2,))])
+
+    def __init__(self, filepath, keyframeInterval=10000, **header):
+        """Creates an ``EventLog`` object. The file is written once an ``Agent`` calls ``start``.
+
+        :param Path | str | None filepath: Path of the log file, None for subclasses that keep the records in memory
+        :param int keyframeInterval: Minimum number of records between two Q-value keyframes. Also the number of records buffered in memory.
+        :param header: Additional json-conform data stored in the header, f.e. the world, so a replay can restore it
+        """
+        self.filepath = None if filepath is None else Path(filepath)
+        self.keyframeInterval = keyframeInterval
+        self.header = header
+        self.file = None
+        self.operationIndices = None
+        self.actionIndices = None
+        self.Qvalues = None
+        self.pendingRecords = []
+        self.nRecords = 0
+        self.nRecordsAtKeyframe = 0
+
+    def start(self, operations, actionspace, Qvalues):
+        """Writes the header and the initial keyframe. Called by the ``Agent`` after its tables are initialized.
+
+        :param list[str] operations: ``Agent.OPERATIONS``
+        :param list[tuple] actionspace: Actions of the agent, in the order of the last axis of ``Qvalues``
+        :param np.ndarray Qvalues: Q-value array of the agent. Only a reference is kept, keyframes are copied from it.
+        """
+        self.operationIndices = {operation: i for i, operation in enumerate(operations)}
+        self.actionIndices = {action: i for i, action in enumerate(actionspace)} | {None: self.NONE}
+        self.Qvalues = Qvalues
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.filepath, "wb")
+        headerBytes = json.dumps(self.header | {"shape": Qvalues.shape, "operations": operations, "actionspace": actionspace,
+                                                "keyframeInterval": self.keyframeInterval}).encode()
+        self.file.write(self.MAGIC + np.uint32(len(headerBytes)).tobytes() + headerBytes)
+        self._write_keyframe()
+
+    def append(self, operation, state, action, reward, update, exploratory, targetAction, teleportJustUsed, windJustUsed):
+        """Logs the outcome of a single ``Agent.operate`` call.
+
+        :param str operation: One of ``Agent.OPERATIONS``
+        :param tuple | None state: Agent position after the operation
+        :param tuple | None action: Action taken, if any
+        :param float reward: Reward received by that action
+        :param tuple | None update: (state, action, old Q-value, new Q-value) of the updated pair, if any
+        :param bool exploratory: ``Agent.hasMadeExploratoryAction``
+        :param tuple | None targetAction: ``Agent.targetAction``
+        :param tuple | None teleportJustUsed: Position of the teleporter just used, if any
+        :param tuple | None windJustUsed: Position where the wind just acted, if any
+        """
+        updatedState, updatedAction, oldQ, newQ = update if update else (None, None, 0, 0)
+        self.pendingRecords.append((self.operationIndices[operation], bool(exploratory), self._position(state), self.actionIndices[action], self.actionIndices[targetAction],
+                                    reward, self._position(updatedState), self.actionIndices[updatedAction], oldQ, newQ,
+                                    self._position(teleportJustUsed), self._position(windJustUsed)))
+        self.nRecords += 1
+        if self.nRecords % self.keyframeInterval == 0:
+            self._flush()
+            self._write_keyframe_if_due()
+
+    def close(self):
+        """Writes all buffered records along with a final keyframe and closes the file.
+        """
+        if self.file is None:
+            return
+        if self.pendingRecords:
+            self._flush()
+            self._write_keyframe_if_due()
+        self.file.close()
+        self.file = None
+
+    def get_filepath(self):
+        return self.filepath
+
+    def _flush(self):
+        records = np.array(self.pendingRecords, dtype=self.RECORD_DTYPE)  # single conversion per block instead of one per operation
+        self.file.write(self.EVENT_TAG + np.uint32(len(records)).tobytes() + records.tobytes())
+        self.pendingRecords = []
+
+    def _write_keyframe_if_due(self):
+        """Writes a keyframe if the records since the last one take at least as many bytes, so a 1000x1000 world with 9 actions,
+        whose keyframes have 72 MB, does not get one every ``keyframeInterval`` records.
+        """
+        if (self.nRecords - self.nRecordsAtKeyframe) * self.RECORD_DTYPE.itemsize >= self.Qvalues.size * 8:
+            self._write_keyframe()
+
+    def _write_keyframe(self):
+        self.nRecordsAtKeyframe = self.nRecords
+        self.file.write(self.KEYFRAME_TAG + np.uint64(self.nRecords).tobytes() + np.ascontiguousarray(self.Qvalues, dtype=np.float64).tobytes())
+
+    def _position(self, position):
+        return (self.NONE, self.NONE) if position is None else position
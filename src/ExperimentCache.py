@@ -0,0 +1,214 @@
+import os
+import json
+import hashlib
+import itertools
+import numpy as np
+from pathlib import Path
+
+from HeadlessSandbox import HeadlessSandbox
+
+
+class ExperimentCache:
+    """On-disk cache of headless runs, so sweeps that are repeated after changing a single parameter only compute
+    the combinations that actually changed, and interrupted sweeps continue where they stopped.\n
+    Entries are content-addressed: the key of a completed run is a hash of the resolved parameters, which contain the
+    world itself, the algorithm settings and the seed, plus the actionspace, the number of operations and the engine version.
+    The engine version is a hash of the source files of the engine, so any change of the learning code invalidates all runs.
+    Resolved worlds are cached as well, keyed by the raw content of the yaml files they are merged from, so repeated
+    runs on a world skip parsing it.\n
+    Every entry is written to a temporary file first and then renamed, so an interrupted run never leaves a broken entry.
+    The total size is bounded by evicting the least recently used entries, a hit refreshes the modification time of its file.
+    Runs with seed -1 are not reproducible and therefore never cached.
+    """
+    CACHE_PATH = HeadlessSandbox.ROOT_PATH / "cache"
+    ENGINE_MODULES = ["Agent", "Memory", "Policy", "EpsilonGreedyPolicy", "Environment", "Cell", "Tile", "RandomStream",
+                      "ConvergenceMonitor", "PolicyEvaluator", "HeadlessSandbox", "myFuncs"]
+    MAX_BYTES = 2**30
+    RUN_SUFFIX = ".npz"
+    WORLD_SUFFIX = ".json"
+
+    def __init__(self, directory=CACHE_PATH, maxBytes=MAX_BYTES):
+        """Creates an ``ExperimentCache`` object.
+
+        :param Path | str directory: Directory of the cache, created if necessary
+        :param int maxBytes: Size the cache is reduced to after each new entry
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.maxBytes = maxBytes
+        self.engineVersion = self.get_engine_version()
+        self.nBytes = sum(filepath.stat().st_size for filepath in self._get_entries())
+        self.nHits = 0
+        self.nMisses = 0
+
+    @classmethod
+    def get_engine_version(cls):
+        """:return str: Hash of the source files of all modules that take part in a headless run"""
+        sourcePath = Path(__file__).resolve().parent
+        digest = hashlib.sha256()
+        for module in cls.ENGINE_MODULES:
+            digest.update((sourcePath / f"{module}.py").read_bytes())
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def get_key(content):
+        """:param content: json-conform content the key is derived from
+        :return str: Hash of the content
+        """
+        return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+
+    def get_world(self, world, parameters=None):
+        """Same as ``HeadlessSandbox.get_parameters`` for a world file, served from the cache if none of the merged files changed.
+
+        :param str | Path | list world: See ``HeadlessSandbox``
+        :param dict | None parameters: {GUI label: value}
+        :return dict: {GUI label: value}, plus "world", "hWind" and "wWind"
+        """
+        if isinstance(world, list):
+            parameters = {"world": world} | (parameters or {})
+            filepath = HeadlessSandbox.SAFEFILE_PATH / "default.yaml"
+        else:
+            filepath = Path(world)
+            if not filepath.is_file():
+                filepath = (HeadlessSandbox.SAFEFILE_PATH / filepath).with_suffix(".yaml")
+        sourceFilepaths = [HeadlessSandbox.SAFEFILE_PATH / "default.yaml", filepath] + sorted(HeadlessSandbox.ALGORITHMS_PATH.glob("*.yaml"))  # any preset may be chosen by the world file
+        key = self.get_key({"files": [hashlib.sha256(sourceFilepath.read_bytes()).hexdigest() for sourceFilepath in sourceFilepaths],
+                            "parameters": parameters or {}})
+        entry = (self.directory / f"world_{key}").with_suffix(self.WORLD_SUFFIX)
+        if entry.exists():
+            os.utime(entry)
+            with entry.open(encoding="utf-8") as file:
+                return json.load(file)
+        resolved = HeadlessSandbox.get_parameters(filepath, parameters)
+        self._store(entry, lambda file: file.write(json.dumps(resolved, ensure_ascii=False).encode()))
+        return resolved
+
+    def run(self, world, parameters=None, nOperations=None, straight=True, diagonal=False, idle=False):
+        """Returns the results of a headless run, computed only if the cache does not contain it yet.
+
+        :param str | Path | list world: See ``HeadlessSandbox``
+        :param dict | None parameters: {GUI label: value}, should contain a seed other than -1
+        :param int | None nOperations: See ``HeadlessSandbox.run``
+        :param bool straight: Use straight actions
+        :param bool diagonal: Use diagonal actions
+        :param bool idle: Use the idle action
+        :return dict: "summary" (see ``Agent.get_run_summary``), "episodeReturns", "greedyReturns" and "Qvalues" of shape (H, W, number of actions)
+        """
+        resolved = self.get_world(world, parameters)
+        nOperations = resolved["Operations Left"] if nOperations is None else nOperations
+        key = self.get_key({"parameters": resolved, "actionspace": [straight, diagonal, idle], "nOperations": nOperations, "engine": self.engineVersion})
+        entry = (self.directory / f"run_{key}").with_suffix(self.RUN_SUFFIX)
+        if entry.exists():
+            os.utime(entry)
+            self.nHits += 1
+            return self.load_results(entry)
+        self.nMisses += 1
+        sandbox = HeadlessSandbox(resolved["world"], {name: value for name, value in resolved.items() if name != "world"}, straight, diagonal, idle)
+        sandbox.run(nOperations)
+        agent = sandbox.get_agent()
+        results = {"summary": agent.get_run_summary(),
+                   "episodeReturns": agent.get_episodeReturns()[1:],
+                   "greedyReturns": agent.get_policyEvaluator().get_greedyReturns(),
+                   "Qvalues": agent.get_QvalueArray().copy()}
+        if resolved["Seed"] != -1:
+            header = {name: results[name] for name in ["summary", "episodeReturns", "greedyReturns"]}
+            self._store(entry, lambda file: np.savez_compressed(file, Qvalues=results["Qvalues"], header=np.array(json.dumps(header))))
+        return results
+
+    @staticmethod
+    def load_results(filepath):
+        """:return dict: Results of a cached run, see ``run``"""
+        with np.load(filepath) as data:
+            results = json.loads(str(data["header"]))
+            results["Qvalues"] = data["Qvalues"]
+        results["greedyReturns"] = [tuple(pair) for pair in results["greedyReturns"]]
+        return results
+
+    def sweep(self, worlds, parameterGrid, seeds, nOperations=None, straight=True, diagonal=False, idle=False):
+        """Runs every combination of world, parameter values and seed, serving those already computed from the cache.
+        Each run is stored as soon as it is finished, so calling this again after an interruption only computes the missing ones.
+
+        :param list[str | Path] worlds: See ``HeadlessSandbox``
+        :param dict parameterGrid: {GUI label: list of values}, f.e. {"Algorithm": ["Q-Learning", "SARSA"], "Learning Rate α": [0.1, 0.5]}
+        :param list[int] seeds: Seeds of each combination
+        :param int | None nOperations: See ``HeadlessSandbox.run``
+        :param bool straight: Use straight actions
+        :param bool diagonal: Use diagonal actions
+        :param bool idle: Use the idle action
+        :return Generator[tuple[str | Path, dict, dict]]: (world, parameters including the seed, results) of each run in turn
+        """
+        names = list(parameterGrid)
+        for world in worlds:
+            for values in itertools.product(*parameterGrid.values()):
+                for seed in seeds:
+                    parameters = dict(zip(names, values)) | {"Seed": seed}
+                    yield world, parameters, self.run(world, parameters, nOperations, straight, diagonal, idle)
+
+    def _get_entries(self):
+        return [filepath for filepath in self.directory.iterdir() if filepath.suffix in [self.RUN_SUFFIX, self.WORLD_SUFFIX]]
+
+    def _store(self, entry, write):
+        """Writes an entry under a temporary name and renames it, then evicts the least recently used entries beyond the size limit.
+
+        :param Path entry: Final path of the entry
+        :param function write: Writes the content to the binary file object passed to it
+        """
+        temporary = entry.with_name(entry.name + ".tmp")
+        with temporary.open(mode="wb") as file:
+            write(file)
+        os.replace(temporary, entry)
+        self.nBytes += entry.stat().st_size
+        if self.nBytes > self.maxBytes:
+            self.evict(self.maxBytes)
+
+    def evict(self, maxBytes=0):
+        """Deletes the least recently used entries until the cache is not larger than maxBytes.
+
+        :param int maxBytes: Remaining size, 0 clears the cache
+        :return int: Number of deleted entries
+        """
+        entries = sorted(((filepath.stat(), filepath) for filepath in self._get_entries()), key=lambda item: item[0].st_mtime)
+        self.nBytes = sum(stat.st_size for stat, _ in entries)
+        nDeleted = 0
+        for stat, filepath in entries:
+            if self.nBytes <= maxBytes:
+                break
+            filepath.unlink(missing_ok=True)
+            self.nBytes -= stat.st_size
+            nDeleted += 1
+        return nDeleted
+
+    def get_size(self):
+        return self.nBytes
+
+    def get_hits(self):
+        return self.nHits
+
+    def get_misses(self):
+        return self.nMisses
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+    import yaml
+
+    parser = argparse.ArgumentParser(description="Runs a sweep of headless runs through the experiment cache and prints the mean return of the last episodes of each combination.")
+    parser.add_argument("--worlds", nargs="+", default=["06_22_cliff_walking_4x12"])
+    parser.add_argument("--algorithms", nargs="+", default=["Q-Learning", "SARSA"])
+    parser.add_argument("--parameter", nargs="+", action="append", default=[], metavar=("LABEL", "VALUE"), help='GUI label followed by its values, f.e. --parameter "Learning Rate α" 0.1 0.5. May be repeated.')
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--operations", type=int, default=20000)
+    parser.add_argument("--last", type=int, default=100, help="Number of final episodes the returns are averaged over")
+    parser.add_argument("--max-megabytes", type=float, default=ExperimentCache.MAX_BYTES / 2**20)
+    parser.add_argument("--clear", action="store_true", help="Empty the cache before the sweep")
+    arguments = parser.parse_args()
+    cache = ExperimentCache(maxBytes=int(arguments.max_megabytes * 2**20))
+    if arguments.clear:
+        cache.evict()
+    parameterGrid = {"Algorithm": arguments.algorithms} | {label: [yaml.safe_load(value) for value in values] for label, *values in arguments.parameter}
+    startTime = time.time()
+    for world, parameters, results in cache.sweep(arguments.worlds, parameterGrid, arguments.seeds, arguments.operations):
+        lastReturns = results["episodeReturns"][-arguments.last:]
+        print(f"{world}  {parameters}  {results['summary']['Episodes']} episodes, mean return {np.mean(lastReturns) if lastReturns else float('nan'):.2f}")
+    print(f"{cache.get_hits()} runs from the cache, {cache.get_misses()} computed in {time.time() - startTime:.1f} s, cache size {cache.get_size() / 2**20:.1f} MiB")
@@ -0,0 +1,182 @@
+import numpy as np
+import math
+from PIL import Image, ImageDraw, ImageFont
+from matplotlib import font_manager
+
+import myFuncs
+from Tile import Tile
+from Heatmap import Heatmap
+
+
+class FrameRenderer:
+    """Draws snapshots of a run into ``PIL`` images without any ``tkinter`` widget,
+    so frames can be rendered in a process without display.\n
+    The layout resembles the sandbox: the world on the left and the value maps,
+    arranged by their action directions, on the right. All colors are taken from
+    ``Tile`` and follow the rules of ``GridworldSandbox._visualize``.
+    """
+    VALUE_TEXT_LENGTH = 5  # signs, like the qvalue Tiles
+    PANEL_GAP = 2  # in cells
+    TARGET_ACTION_OUTLINE_COLOR = "black"  # replaces the sunken relief of the target action Tilemap
+
+    def __init__(self, H, W, actionspace, cellSize=32, useHeatmaps=False, lightness="9"):
+        """Creates a ``FrameRenderer`` object.
+
+        :param int H: Height of the environment in Cells.
+        :param int W: Width  of the environment in Cells.
+        :param list[tuple] actionspace: Actions of the agent, in the order of the last axis of the Q-value arrays
+        :param int cellSize: Width and height of a cell in pixels.
+        :param bool useHeatmaps: If True, value maps are drawn as colour-mapped heatmaps instead of numbers.
+        :param str lightness: Hex digit used by ``myFuncs.get_light_color`` for highlights in the value maps
+        """
+        self.H = H
+        self.W = W
+        self.actionspace = [tuple(action) for action in actionspace]
+        self.cellSize = cellSize
+        self.useHeatmaps = useHeatmaps
+        self.lightness = lightness
+        self.borderWidth = max(1, cellSize // 10)
+        self.margin = max(2, cellSize // 4)  # colored frame around each value map
+        fontPath = font_manager.findfont(font_manager.FontProperties(family="DejaVu Sans", weight="bold"))  # ships with matplotlib and contains all greedy chars
+        self.worldFont = ImageFont.truetype(fontPath, max(6, int(cellSize * 0.6)))
+        self.valueFont = ImageFont.truetype(fontPath, max(6, int(cellSize / 3.2)))
+        self.greedyFont = ImageFont.truetype(fontPath, max(6, int(cellSize * 0.7)))
+        mapH, mapW = H * cellSize + 2 * self.margin, W * cellSize + 2 * self.margin
+        self.worldOrigin = (max(0, (3 * mapH - H * cellSize) // 2), 0)  # (y, x) in pixels, world is vertically centered
+        get_origin = lambda direction: ((direction[0] + 1) * mapH + self.margin, (W + self.PANEL_GAP) * cellSize + (direction[1] + 1) * mapW + self.margin)
+        self.valueOrigins = {action: get_origin(action) for action in self.actionspace if any(action)}  # (y, x) of the upper left cell of each map
+        self.greedyOrigin = get_origin((0, 0))  # the center always shows the greedy map, like the GUI before the idle toggle
+        self.size = ((W + self.PANEL_GAP) * cellSize + 3 * mapW, max(H * cellSize, 3 * mapH))  # (width, height)
+        self.worldCells = None
+        self.wallMask = np.zeros((H, W), dtype=bool)
+        self.protectedTexts = {}
+        self.textMasks = {}  # (text, font) -> cell sized mask. Font rendering would take most of the frame time otherwise.
+        self.background = None
+        self.previousValueTexts = {}
+
+    def set_world(self, world):
+        """Sets the static appearance of all cells and prerenders everything that only changes with the world.
+
+        :param list[list[dict]] world: Matrix of yaml-conform ``Tile`` representations, like ``Tilemap.get_yaml_list`` returns
+        """
+        self.worldCells = world
+        self.wallMask = np.array([[cell["bg"] == Tile.WALL_COLOR for cell in row] for row in world])
+        self.protectedTexts = {(h, w): world[h][w]["text"] for h in range(self.H) for w in range(self.W)  # value Tilemaps show these chars instead of values
+                               if world[h][w]["text"] and world[h][w]["text"][-1] in [Tile.GOAL_CHAR, Tile.TELEPORTER_SINK_ONLY_SUFFIX]}
+        self.background = Image.new("RGB", self.size, Tile.BLANK_COLOR)
+        draw = ImageDraw.Draw(self.background)
+        for action, origin in self.valueOrigins.items():
+            draw.rectangle(self._get_map_frame(origin), fill=myFuncs.direction_to_hsvHexString(action, hsvValue=Tile.DEFAULT_HSV_VALUE))
+        for h in range(self.H):
+            for w in range(self.W):
+                self._draw_cell(draw, self.worldOrigin, h, w, world[h][w]["bg"], text=world[h][w]["text"], font=self.worldFont)
+                for origin in [*self.valueOrigins.values(), self.greedyOrigin]:
+                    self._draw_cell(draw, origin, h, w, world[h][w]["bg"])
+        self.previousValueTexts = {}
+
+    def render(self, snapshot):
+        """Draws a single frame.
+
+        :param dict snapshot: Data of one visualization, as captured by ``Recorder.capture``
+        :return PIL.Image.Image: The frame
+        """
+        image = self.background.copy()
+        draw = ImageDraw.Draw(image)
+        state = snapshot["state"]
+        worldAgentColor, valueAgentColor = snapshot["agentColors"]
+        highlights = {}  # (h, w) -> (world color, value color), same order of priority as in GridworldSandbox._visualize
+        for position, color in [(snapshot["windJustUsed"], Tile.WIND_JUST_USED_COLOR), (snapshot["teleportJustUsed"], Tile.TELEPORT_JUST_USED_COLOR)]:
+            if position is not None:
+                highlights[tuple(position)] = (color, myFuncs.get_light_color(color, self.lightness))
+        if state is not None:
+            highlights[tuple(state)] = (worldAgentColor, valueAgentColor)
+        for (h, w), (color, _) in highlights.items():
+            if not self.wallMask[h, w]:
+                self._draw_cell(draw, self.worldOrigin, h, w, color, text=self.worldCells[h][w]["text"], font=self.worldFont)
+
+        Qvalues = snapshot["Qvalues"]
+        maxQvalues = Qvalues.max(axis=2)
+        greedyMask = Qvalues == maxQvalues[:, :, np.newaxis]
+        if self.useHeatmaps:
+            self._render_heatmaps(image, draw, Qvalues, maxQvalues, greedyMask, state, valueAgentColor)
+        else:
+            self._render_value_tiles(draw, Qvalues, greedyMask, snapshot["traceColors"], highlights)
+        if snapshot["targetAction"] in self.valueOrigins:
+            draw.rectangle(self._get_map_frame(self.valueOrigins[snapshot["targetAction"]]), outline=self.TARGET_ACTION_OUTLINE_COLOR, width=max(1, self.margin // 2))
+        return image
+
+    def _render_value_tiles(self, draw, Qvalues, greedyMask, traceColors, highlights):
+        for h in range(self.H):
+            for w in range(self.W):
+                if self.wallMask[h, w]:
+                    continue
+                bg = traceColors.get((h, w), Tile.BLANK_COLOR)
+                if (h, w) in highlights:
+                    bg = highlights[(h, w)][1]
+                if (h, w) in self.protectedTexts:
+                    for origin in [*self.valueOrigins.values(), self.greedyOrigin]:
+                        self._draw_cell(draw, origin, h, w, bg, text=self.protectedTexts[(h, w)], font=self.valueFont)
+                    continue
+                for iAction, action in enumerate(self.actionspace):
+                    if action not in self.valueOrigins:
+                        continue
+                    text = f"{Qvalues[h, w, iAction]:< 3.2f}"[:self.VALUE_TEXT_LENGTH]
+                    self._draw_cell(draw, self.valueOrigins[action], h, w, bg, text=text, font=self.valueFont, fg=self._get_value_change_color((h, w, action), text))
+                greedyActions = tuple(action for action, isGreedy in zip(self.actionspace, greedyMask[h, w]) if isGreedy)
+                greedyRepr = Tile.get_greedy_actions_representation(greedyActions)
+                self._draw_cell(draw, self.greedyOrigin, h, w, bg, text=greedyRepr["text"], font=self.greedyFont, fg=greedyRepr["fg"])
+
+    def _render_heatmaps(self, image, draw, Qvalues, maxQvalues, greedyMask, state, agentColor):
+        shownQvalues = Qvalues[~self.wallMask]
+        vmin, vmax = (shownQvalues.min(), shownQvalues.max()) if shownQvalues.size else (0, 0)  # shared scale, like in the GUI
+        tables = [(self.valueOrigins[action], Qvalues[:, :, iAction]) for iAction, action in enumerate(self.actionspace) if action in self.valueOrigins]
+        tables.append((self.greedyOrigin, maxQvalues))
+        wallRgb = np.array(myFuncs.color_to_rgbTriple(Tile.WALL_COLOR), dtype=np.uint8)
+        for (y, x), values in tables:
+            rgb = myFuncs.values_to_rgb(values, vmin, vmax, Heatmap.COLORMAP)
+            rgb[self.wallMask] = wallRgb
+            rgb = rgb.repeat(self.cellSize, axis=0).repeat(self.cellSize, axis=1)
+            image.paste(Image.fromarray(rgb), (x, y))
+        if self.cellSize >= Heatmap.MIN_ARROW_CELL_SIZE:
+            directions = greedyMask.astype(int) @ np.array(self.actionspace)  # sum of the greedy actions, like in Tile.get_greedy_actions_representation
+            directions[self.wallMask] = 0
+            y0, x0 = self.greedyOrigin
+            for h, w in np.argwhere(directions.any(axis=2)):
+                direction = (int(directions[h, w, 0]), int(directions[h, w, 1]))
+                yCenter, xCenter = y0 + self.cellSize * (h + 0.5), x0 + self.cellSize * (w + 0.5)
+                length = 0.4 * self.cellSize / math.hypot(*direction)
+                tip = (xCenter + length * direction[1], yCenter + length * direction[0])
+                color = myFuncs.direction_to_hsvHexString(direction, hsvValue=Tile.DEFAULT_HSV_VALUE)
+                draw.line([(xCenter - length * direction[1], yCenter - length * direction[0]), tip], fill=color, width=max(1, self.cellSize // 8))
+                draw.regular_polygon((*tip, max(2, self.cellSize // 6)), 3, rotation=math.degrees(math.atan2(direction[0], direction[1])) - 90, fill=color)
+        if state is not None:
+            for y0, x0 in [*self.valueOrigins.values(), self.greedyOrigin]:
+                h, w = state
+                draw.rectangle([x0 + w * self.cellSize, y0 + h * self.cellSize, x0 + (w + 1) * self.cellSize - 1, y0 + (h + 1) * self.cellSize - 1], outline=agentColor, width=2)
+
+    def _get_map_frame(self, origin):
+        y, x = origin
+        return [x - self.margin, y - self.margin, x + self.W * self.cellSize + self.margin - 1, y + self.H * self.cellSize + self.margin - 1]
+
+    def _draw_cell(self, draw, origin, h, w, bg, text="", font=None, fg=Tile.LETTER_COLOR):
+        y, x = origin[0] + h * self.cellSize, origin[1] + w * self.cellSize
+        borderColor = self.worldCells[h][w]["borderColor"]
+        draw.rectangle([x, y, x + self.cellSize - 1, y + self.cellSize - 1], fill=bg, outline=borderColor, width=self.borderWidth)
+        if text:
+            draw.bitmap((x, y), self._get_text_mask(text, font), fill=fg)
+
+    def _get_text_mask(self, text, font):
+        if (text, font) not in self.textMasks:
+            mask = Image.new("L", (self.cellSize, self.cellSize))
+            ImageDraw.Draw(mask).text((self.cellSize / 2, self.cellSize / 2), text, fill=255, font=font, anchor="mm")
+            self.textMasks[(text, font)] = mask
+        return self.textMasks[(text, font)]
+
+    def _get_value_change_color(self, key, text):
+        """Same rule as ``Tile.update_appearance`` with ``indicateNumericalValueChange``: compares against the text of the previous frame."""
+        oldText = self.previousValueTexts.get(key)
+        self.previousValueTexts[key] = text
+        if oldText is None or float(text) == float(oldText):
+            return Tile.LETTER_COLOR
+        return Tile.VALUE_INCREASE_COLOR if float(text) > float(oldText) else Tile.VALUE_DECREASE_COLOR
+
@@ -0,0 +1,144 @@
+import json
+import numpy as np
+from pathlib import Path
+
+
+class FrozenPolicy:
+    """Greedy policy of a trained ``Agent``, frozen into an integer array so it can be reused elsewhere,
+    f.e. as baseline or scripted agent, without keeping the agent and its variables alive.\n
+    The policy is an (H, W) array of indices into an actionspace table of (dh, dw) rows, as created by
+    ``Agent.create_actionspace``, optionally along with the Q-values. Ties between greedy actions are broken once
+    while freezing, either by the actionspace order, like a single greedy action of the agent would be, or randomly
+    with a given seed, so every query of the same state gets the same answer.\n
+    This module only depends on numpy, saved policies can be loaded and queried on machines without tkinter.
+    """
+    SUFFIX = ".npz"
+
+    def __init__(self, actions, actionspace, Qvalues=None, **header):
+        """Creates a ``FrozenPolicy`` object. Use ``from_agent`` or ``load`` instead of calling this directly.
+
+        :param np.ndarray actions: Greedy action index of each state, shape (H, W)
+        :param np.ndarray actionspace: (dh, dw) of each action index, shape (number of actions, 2)
+        :param np.ndarray | None Qvalues: Q-values of shape (H, W, number of actions)
+        :param header: Additional json-conform data stored with the policy, f.e. the world it was trained on
+        """
+        self.actions = np.ascontiguousarray(actions, dtype=np.int8)
+        self.actionspace = np.ascontiguousarray(actionspace, dtype=np.int8)
+        self.Qvalues = None if Qvalues is None else np.asarray(Qvalues)
+        self.header = header
+        self.H, self.W = self.actions.shape
+        self.flatActions = self.actions.ravel()
+
+    @classmethod
+    def from_agent(cls, agent, includeQvalues=False, tieBreakingSeed=None, **header):
+        """Freezes the current greedy policy of an agent.
+
+        :param Agent agent: Trained agent, only its Q-values and actionspace are read
+        :param bool includeQvalues: Also store the Q-values, as float32
+        :param int | None tieBreakingSeed: If None, ties go to the first greedy action in actionspace order. Otherwise, to a random one drawn with this seed.
+        :param header: See ``__init__``
+        :return FrozenPolicy: The frozen policy
+        """
+        Qvalues = agent.get_QvalueArray()
+        if tieBreakingSeed is None:
+            actions = np.argmax(Qvalues, axis=2)  # first maximum, same order as the greedy actions of the agent
+        else:
+            isGreedy = Qvalues == Qvalues.max(axis=2, keepdims=True)
+            actions = np.argmax(isGreedy + np.random.default_rng(tieBreakingSeed).random(Qvalues.shape), axis=2)  # greedy ones score at least 1, all others less
+        return cls(actions, agent.get_actionspace(), Qvalues.astype(np.float32) if includeQvalues else None,
+                   tieBreakingSeed=tieBreakingSeed, **header)
+
+    def save(self, filepath):
+        """:param Path | str filepath: Path of the file, ".npz" suffix optional
+        :return Path: Path of the written file
+        """
+        filepath = Path(filepath).with_suffix(self.SUFFIX)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {"actions": self.actions, "actionspace": self.actionspace}
+        if self.Qvalues is not None:
+            arrays["Qvalues"] = self.Qvalues
+        np.savez_compressed(filepath, header=np.array(json.dumps(self.header)), **arrays)
+        return filepath
+
+    @classmethod
+    def load(cls, filepath):
+        with np.load(Path(filepath).with_suffix(cls.SUFFIX)) as data:
+            return cls(data["actions"], data["actionspace"], data["Qvalues"] if "Qvalues" in data else None, **json.loads(str(data["header"])))
+
+    def act(self, states):
+        """Answers a batch of queries with a single indexing operation.
+
+        :param np.ndarray states: (h, w) rows of shape (N, 2) or flat indices h*W + w of shape (N,)
+        :return np.ndarray: (dh, dw) rows of the greedy actions, shape (N, 2)
+        """
+        return self.actionspace[self.get_action_indices(states)]
+
+    def get_action_indices(self, states):
+        """Same as ``act``, but returns indices into the actionspace table.
+
+        :return np.ndarray: Shape (N,)
+        """
+        states = np.asarray(states)
+        if states.ndim == 1:
+            return self.flatActions[states]
+        return self.actions[states[:, 0], states[:, 1]]
+
+    def act_single(self, state):
+        """:param tuple state: (h, w)
+        :return tuple: (dh, dw), like the actions of an ``Agent``
+        """
+        return tuple(self.actionspace[self.actions[state]].tolist())
+
+    def get_Qvalues(self, states=None):
+        """:param np.ndarray | None states: See ``act``. If None, the whole table is returned.
+        :return np.ndarray | None: Q-values of the states, None if they were not stored
+        """
+        if self.Qvalues is None or states is None:
+            return self.Qvalues
+        states = np.asarray(states)
+        if states.ndim == 1:
+            return self.Qvalues.reshape(self.H * self.W, -1)[states]
+        return self.Qvalues[states[:, 0], states[:, 1]]
+
+    def get_actions(self):
+        return self.actions
+
+    def get_actionspace(self):
+        """:return list[tuple]: The actionspace in the format of ``Agent.create_actionspace``"""
+        return [tuple(action) for action in self.actionspace.tolist()]
+
+    def get_header(self):
+        return self.header
+
+    def get_shape(self):
+        return self.H, self.W
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+    from HeadlessSandbox import HeadlessSandbox
+
+    parser = argparse.ArgumentParser(description="Trains a headless agent, exports its greedy policy and measures the query rate of the loaded policy.")
+    parser.add_argument("world", nargs="?", default="06_22_cliff_walking_4x12")
+    parser.add_argument("--algorithm", default="Q-Learning")
+    parser.add_argument("--operations", type=int, default=50000)
+    parser.add_argument("--q-values", action="store_true", help="Also export the Q-values")
+    parser.add_argument("--output", type=Path, default=HeadlessSandbox.ROOT_PATH / "policies" / "policy")
+    parser.add_argument("--queries", type=int, default=10**7)
+    arguments = parser.parse_args()
+    sandbox = HeadlessSandbox(arguments.world, {"Algorithm": arguments.algorithm, "Seed": 0})
+    sandbox.run(arguments.operations)
+    filepath = FrozenPolicy.from_agent(sandbox.get_agent(), arguments.q_values, world=str(arguments.world), algorithm=arguments.algorithm).save(arguments.output)
+    policy = FrozenPolicy.load(filepath)
+    print(f"Saved {filepath}, {filepath.stat().st_size} bytes")
+    agent = sandbox.get_agent()
+    for h in range(policy.H):
+        for w in range(policy.W):
+            greedyActions = agent.get_greedyActions().get((h, w))
+            assert greedyActions is None or policy.act_single((h, w)) == greedyActions[0]  # None for states the agent never visited
+    states = np.random.default_rng(0).integers(policy.H * policy.W, size=arguments.queries)
+    startTime = time.perf_counter()
+    policy.act(states)
+    duration = time.perf_counter() - startTime
+    print(f"{arguments.queries} queries in {duration:.3f} s, {arguments.queries / duration / 1e6:.0f} million per second")
@@ -0,0 +1,123 @@
+import importlib
+from pathlib import Path
+
+from HeadlessSandbox import HeadlessSandbox
+from Trace import Trace
+
+
+class GoldenTraces:
+    """Equivalence harness for optimized engines. Every speed-up of ``Agent`` or ``Environment`` risks changing
+    the learning behaviour silently, which this harness is meant to catch.\n
+    ``record`` runs the reference engine with a fixed seed on every world with every algorithm preset and
+    stores a ``Trace`` of each run in ``golden/``. ``verify`` runs the same combinations through any other engine
+    and reports the first divergence of each. An engine is a callable ``engine(world, parameters, eventLog, nOperations)``
+    that performs the run and feeds ``eventLog`` exactly like the ``Agent`` does.\n
+    The traces in ``golden/`` are only as old as this harness. They were recorded after the engine and its random
+    streams had already been reworked (seeded ``RandomStream`` per agent and environment, vectorized environment,
+    incremental aggregates, Dyna-Q+ bookkeeping) and re-recorded once the initial Q-values were drawn lazily per block,
+    which no longer consumes the stream of the agent. So they pin down the behaviour from that point on and say nothing
+    about equivalence with the engine before those changes. Re-recording them accepts the current behaviour as the new reference.
+    """
+    GOLDEN_PATH = HeadlessSandbox.ROOT_PATH / "golden"
+    SEED = 0
+    N_OPERATIONS = 2000
+
+    def __init__(self, worlds=None, algorithms=None, nOperations=N_OPERATIONS):
+        """Creates a ``GoldenTraces`` object.
+
+        :param list[str] | None worlds: Names of files in ``worlds/``. If None, all handmade worlds.
+        :param list[str] | None algorithms: Names of the presets in ``algorithms/``, "Custom" runs with the settings of the world file. If None, all of them.
+        :param int nOperations: Number of operations of each run
+        """
+        if worlds is None:
+            worlds = sorted(filepath.stem for filepath in HeadlessSandbox.SAFEFILE_PATH.glob("*.yaml") if filepath.stem != "default")
+        if algorithms is None:
+            algorithms = ["Custom"] + sorted(filepath.stem for filepath in HeadlessSandbox.ALGORITHMS_PATH.glob("*.yaml"))
+        self.worlds = worlds
+        self.algorithms = algorithms
+        self.nOperations = nOperations
+
+    @staticmethod
+    def run_reference(world, parameters, eventLog, nOperations):
+        """The reference engine: ``Agent`` and ``Environment`` as built by the ``HeadlessSandbox``."""
+        HeadlessSandbox(world, parameters, eventLog=eventLog).run(nOperations)
+
+    @staticmethod
+    def load_engine(specification):
+        """:param str specification: "module:callable", f.e. "GoldenTraces:GoldenTraces.run_reference"
+        :return: The engine callable
+        """
+        moduleName, _, name = specification.partition(":")
+        engine = importlib.import_module(moduleName)
+        for attribute in name.split("."):
+            engine = getattr(engine, attribute)
+        return engine
+
+    def get_filepath(self, world, algorithm):
+        return (self.GOLDEN_PATH / f"{world}__{algorithm}").with_suffix(Trace.SUFFIX)
+
+    def trace(self, world, algorithm, engine=None):
+        """Runs a single combination and returns its trace."""
+        parameters = {"Seed": self.SEED, "Algorithm": algorithm}
+        trace = Trace(world=world, algorithm=algorithm, seed=self.SEED, nOperations=self.nOperations)
+        (engine or self.run_reference)(world, parameters, trace, self.nOperations)
+        trace.close()
+        return trace
+
+    def record(self):
+        """Stores the traces of the reference engine as the new golden traces.
+
+        :return list[Path]: Written files
+        """
+        filepaths = []
+        for world in self.worlds:
+            for algorithm in self.algorithms:
+                filepath = self.get_filepath(world, algorithm)
+                self.trace(world, algorithm).save(filepath)
+                filepaths.append(filepath)
+        return filepaths
+
+    def verify(self, engine=None, tolerance=0.):
+        """Runs every combination with a golden trace through the engine and compares it against that trace.
+
+        :param engine: Engine callable, the reference engine if None
+        :param float tolerance: See ``Trace.find_first_divergence``
+        :return dict: {(world, algorithm): divergence report or None if equivalent}
+        """
+        results = {}
+        for world in self.worlds:
+            for algorithm in self.algorithms:
+                filepath = self.get_filepath(world, algorithm)
+                if not filepath.exists():
+                    continue
+                golden = Trace.load(filepath)
+                if golden.header["nOperations"] != self.nOperations:
+                    raise ValueError(f"{filepath.name} was recorded with {golden.header['nOperations']} operations, not {self.nOperations}")
+                results[(world, algorithm)] = golden.find_first_divergence(self.trace(world, algorithm, engine), tolerance)
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from pprint import pprint
+
+    parser = argparse.ArgumentParser(description="Records golden traces of the reference engine or verifies another engine against them.")
+    parser.add_argument("command", choices=["record", "verify"])
+    parser.add_argument("--engine", default="GoldenTraces:GoldenTraces.run_reference", help='Engine to verify as "module:callable"')
+    parser.add_argument("--worlds", nargs="*")
+    parser.add_argument("--algorithms", nargs="*")
+    parser.add_argument("--tolerance", type=float, default=0.)
+    arguments = parser.parse_args()
+    goldenTraces = GoldenTraces(arguments.worlds, arguments.algorithms)
+    if arguments.command == "record":
+        filepaths = goldenTraces.record()
+        print(f"Recorded {len(filepaths)} traces, {sum(filepath.stat().st_size for filepath in filepaths) / 2**10:.0f} KiB in total")
+    else:
+        results = goldenTraces.verify(GoldenTraces.load_engine(arguments.engine), arguments.tolerance)
+        for (world, algorithm), divergence in results.items():
+            if divergence is None:
+                print(f"ok        {world} / {algorithm}")
+            else:
+                print(f"DIVERGED  {world} / {algorithm} at step {divergence['step']} in {divergence['field']}: expected {divergence['expected']}, got {divergence['actual']}")
+                pprint(divergence["context"], width=200)
+        print(f"{sum(divergence is None for divergence in results.values())} of {len(results)} runs match the golden traces")
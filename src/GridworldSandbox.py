@@ -1,18 +1,31 @@
 ﻿import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
 from collections import OrderedDict
 from pathlib import Path
 import matplotlib.pyplot as plt
+import numpy as np
 import sys
+import time
 import cProfile  # used for benchmarking, but doesnt give useful information because just one iteration of iterate_flow() can be measured at a time
 import pstats    # used for benchmarking, but doesnt give useful information because just one iteration of iterate_flow() can be measured at a time
 
 import myFuncs
-from myFuncs import matrix, shape
+from myFuncs import shape
 from Environment import Environment
 from Agent import Agent
+from ConvergenceMonitor import ConvergenceMonitor
+from PolicyEvaluator import PolicyEvaluator
+from RandomStream import RandomStream
 from Tile import Tile
 from Tilemap import Tilemap
+from Viewport import Viewport
+from Minimap import Minimap
+from Heatmap import Heatmap
+from Recorder import Recorder
+from EventLog import EventLog
+from Replay import Replay
+from TrainingProcess import TrainingProcess
+from MemoryReport import MemoryReport
 from ParameterFrame import ParameterFrame
 from EntryFrame import EntryFrame
 from CheckbuttonFrame import CheckbuttonFrame
@@ -41,12 +54,16 @@ class GridworldSandbox:
     VALUE_TILEMAPS_RELIEF_DEFAULT = tk.FLAT
     VALUE_TILEMAPS_RELIEF_TARGET_ACTION = tk.GROOVE
     GUI_FRAMES_RELIEF_DEFAULT = tk.GROOVE
+    RECORDING_CHUNK_SIZE = 1000  # operations per flow iteration while recording, since nothing needs to be drawn in between
 
     ROOT_PATH = Path("..")
     SAFEFILE_PATH = ROOT_PATH / "worlds"
     ALGORITHMS_PATH = ROOT_PATH / "algorithms"
     PLOTS_PATH = ROOT_PATH / "plots"
+    RECORDINGS_PATH = ROOT_PATH / "recordings"
+    LOGS_PATH = ROOT_PATH / "logs"
     SETTINGS_PATH = ROOT_PATH / "settings"
+    REPORTS_PATH = ROOT_PATH / "reports"
 
     def __init__(self, guiProcess):
         """Declares RL- and flow control variables ans builds the GUI.
@@ -56,6 +73,10 @@ class GridworldSandbox:
         # RL objects:
         self.environment = None
         self.agent = None
+        self.recorder = None
+        self.replay = None
+        self.trainingProcess = None
+        self.sentParameters = None  # values the training process got last, to send only the changes
         self.predefinedAlgorithms = {filepath.stem: myFuncs.get_dict_from_yaml_file(self.ALGORITHMS_PATH / filepath)
                                      for filepath in self.ALGORITHMS_PATH.iterdir()}
         self.predefinedAlgorithms["Custom"] = dict()  # No restrictions
@@ -77,9 +98,12 @@ class GridworldSandbox:
         fontSmall = myFuncs.create_font(sizesDict["fontsize small"])
         fontMiddle = myFuncs.create_font(sizesDict["fontsize middle"])
         fontBig = myFuncs.create_font(sizesDict["fontsize big"])
+        self.fontMiddle, self.fontBig = fontMiddle, fontBig  # also needed by windows opened later
         self.agentLightnessQvalueFrames = str(sizesDict["agent qValueTilemaps lightness"])
         self.minLightnessAgentTrace = sizesDict["agent trace min saturation rate"]
         self.maxLightnessAgentTrace = sizesDict["agent trace max saturation rate"]
+        self.recordingCellSize = sizesDict["recording cell size"]
+        self.recordingFrameDuration = sizesDict["recording frame duration"]
 
         guiScale = initialWindowDict["GUI Scale"]
         dim1 = initialWindowDict["Dim 1 Size"]
@@ -87,6 +111,9 @@ class GridworldSandbox:
         self.allow_straightActions = initialWindowDict["Straight-Actions"]
         self.allow_diagonalActions = initialWindowDict["Diagonal-Actions"]
         self.allow_idleActions = initialWindowDict["Idle-Actions"]
+        viewportDim1 = initialWindowDict["Viewport Dim 1 Size"]
+        viewportDim2 = initialWindowDict["Viewport Dim 2 Size"]
+        self.useHeatmaps = initialWindowDict["Heatmap Values"]
 
         if not initialWindowDict["skip config window"]:
             configWindow = tk.Toplevel(self.guiProcess, pady=5, padx=5)
@@ -102,6 +129,8 @@ class GridworldSandbox:
             straightActionsFrame = CheckbuttonFrame(configWindow, nameLabel="Straight-Actions", font=fontMiddle, value=self.allow_straightActions, labelWidth=labelWidth)
             diagonalActionsFrame = CheckbuttonFrame(configWindow, nameLabel="Diagonal-Actions", font=fontMiddle, value=self.allow_diagonalActions, labelWidth=labelWidth)
             idleActionsFrame = CheckbuttonFrame(configWindow, nameLabel="Idle-Actions", font=fontMiddle, value=self.allow_idleActions, labelWidth=labelWidth)
+            heatmapValuesFrame = CheckbuttonFrame(configWindow, nameLabel="Heatmap Values", font=fontMiddle, value=self.useHeatmaps, labelWidth=labelWidth,
+                                                  explanation="Show the Q-values as colour-mapped images instead of numbers.\nRecommended for large worlds.")
             tk.Button(configWindow, text="Proceed", height=1, font=fontBig, bd=5, command=lambda: quitFlag.set(False))
 
             myFuncs.arrange_children(configWindow, order="row")
@@ -119,9 +148,14 @@ class GridworldSandbox:
             self.allow_straightActions = straightActionsFrame.get_value()
             self.allow_diagonalActions = diagonalActionsFrame.get_value()
             self.allow_idleActions = idleActionsFrame.get_value()
+            self.useHeatmaps = heatmapValuesFrame.get_value()
         self.guiProcess.call('tk', 'scaling', guiScale)
         self.H = min(dim1, dim2)
         self.W = max(dim1, dim2)
+        self.viewport = None  # Large worlds are shown through a viewport, so only the visible cells get Tiles
+        if self.H > min(viewportDim1, viewportDim2) or self.W > max(viewportDim1, viewportDim2):
+            self.viewport = Viewport(self.H, self.W, viewH=min(self.H, viewportDim1, viewportDim2), viewW=min(self.W, max(viewportDim1, viewportDim2)))
+        self.minimap = None
 
         # The following scheme is an attempt to visually align the structure of the GUI source code with the GUI itself,
         # with the goal of making it as intuitively understandable and extensible as possible.
@@ -152,8 +186,11 @@ class GridworldSandbox:
 
             if True:  # tilemapsFrame:
                 self.gridworldTilemap = Tilemap(self.tilemapsFrame, H=self.H, W=self.W, interactionAllowed=True, font=fontWorldtiles, relief=self.GUI_FRAMES_RELIEF_DEFAULT, displayWind=True,
-                                                bd=5, tileHeight=sizesDict["worldtiles height"], tileWidth=sizesDict["worldtiles width"], tileBd=sizesDict["worldtiles borderwidth"])
+                                                bd=5, tileHeight=sizesDict["worldtiles height"], tileWidth=sizesDict["worldtiles width"], tileBd=sizesDict["worldtiles borderwidth"],
+                                                viewport=self.viewport, storeOffscreenCells=True, scrollbars=True)
                 self.valueVisualizationFrame = tk.Frame(self.tilemapsFrame, bd=5, relief=self.GUI_FRAMES_RELIEF_DEFAULT)
+                if self.viewport is not None and initialWindowDict["Minimap"]:
+                    self.minimap = Minimap(self.tilemapsFrame, self.viewport, maxSize=sizesDict["minimap size"], bd=5, relief=self.GUI_FRAMES_RELIEF_DEFAULT)
 
                 myFuncs.arrange_children(self.tilemapsFrame, order="column", useSticky=False)
 
@@ -165,17 +202,30 @@ class GridworldSandbox:
                     # no arrange_children call here since a more complex alignment is needed
 
                 if True:  # valueVisualizationFrame:
+                    # qValueMaps and greedyPolicyMap are Tilemaps, or Heatmaps if the heatmap value view was chosen. In that case the greedyPolicyMap shows the maximum Q-values with greedy arrows on top.
                     self.QVALUES_WIDTH = sizesDict["qvalues width"]
-                    self.qValueTilemaps = {}
+                    self.qValueMaps = {}
                     for action in Agent.create_actionspace(straight=self.allow_straightActions, diagonal=self.allow_diagonalActions, idle=self.allow_idleActions):
-                        self.qValueTilemaps[action] = Tilemap(self.valueVisualizationFrame, H=self.H, W=self.W, interactionAllowed=False,
+                        if self.useHeatmaps:
+                            self.qValueMaps[action] = Heatmap(self.valueVisualizationFrame, H=self.H, W=self.W, maxSize=sizesDict["heatmap size"],
+                                                              bd=sizesDict["targetmarker width"], relief=self.VALUE_TILEMAPS_RELIEF_DEFAULT,
+                                                              bg=myFuncs.direction_to_hsvHexString(action, hsvValue=Tile.DEFAULT_HSV_VALUE))
+                        else:
+                            self.qValueMaps[action] = Tilemap(self.valueVisualizationFrame, H=self.H, W=self.W, interactionAllowed=False,
                                                               indicateNumericalValueChange=True, font=fontQvalues, tileWidth=self.QVALUES_WIDTH,
                                                               bd=sizesDict["targetmarker width"], relief=self.VALUE_TILEMAPS_RELIEF_DEFAULT,
-                                                              bg=myFuncs.direction_to_hsvHexString(action, hsvValue=Tile.DEFAULT_HSV_VALUE), tileHeight=sizesDict["qvalues height"], tileBd=sizesDict["qvalues borderwidth"])
-                        self.qValueTilemaps[action].grid(row=action[0] + 1, column=action[1] + 1)  # maps the Tilemaps corresponding to the actions (which are actually 2D "vectors")  to coordinates inside the valueVisualizationFrame
-                    self.greedyPolicyTilemap = Tilemap(self.valueVisualizationFrame, H=self.H, W=self.W, interactionAllowed=False, font=fontQvalues,
-                                                       tileWidth=self.QVALUES_WIDTH, bd=sizesDict["targetmarker width"], tileHeight=sizesDict["qvalues height"], tileBd=sizesDict["qvalues borderwidth"], relief=self.VALUE_TILEMAPS_RELIEF_TARGET_ACTION)
-                    self.greedyPolicyTilemap.grid(row=1, column=1)
+                                                              bg=myFuncs.direction_to_hsvHexString(action, hsvValue=Tile.DEFAULT_HSV_VALUE), tileHeight=sizesDict["qvalues height"], tileBd=sizesDict["qvalues borderwidth"],
+                                                              viewport=self.viewport)
+                        self.qValueMaps[action].grid(row=action[0] + 1, column=action[1] + 1)  # maps the Tilemaps corresponding to the actions (which are actually 2D "vectors")  to coordinates inside the valueVisualizationFrame
+                    if self.useHeatmaps:
+                        self.greedyPolicyMap = Heatmap(self.valueVisualizationFrame, H=self.H, W=self.W, maxSize=sizesDict["heatmap size"], drawGreedyArrows=True,
+                                                       bd=sizesDict["targetmarker width"], relief=self.VALUE_TILEMAPS_RELIEF_TARGET_ACTION)
+                    else:
+                        self.greedyPolicyMap = Tilemap(self.valueVisualizationFrame, H=self.H, W=self.W, interactionAllowed=False, font=fontQvalues,
+                                                       tileWidth=self.QVALUES_WIDTH, bd=sizesDict["targetmarker width"], tileHeight=sizesDict["qvalues height"], tileBd=sizesDict["qvalues borderwidth"], relief=self.VALUE_TILEMAPS_RELIEF_TARGET_ACTION,
+                                                       viewport=self.viewport)
+                    self.greedyPolicyMap.grid(row=1, column=1)
+                    self.wallMask = np.zeros((self.H, self.W), dtype=bool)  # only needed by Heatmaps, updated at each environment update
                     self.guiProcess.bind_all("<space>", lambda _: self._toggle_idleActionValues())
                     self.idleActionValues_visible = False
 
@@ -207,6 +257,8 @@ class GridworldSandbox:
                     self.discountFrame = EntryFrame(self.algorithmSettingsFrame, nameLabel="Discount γ", font=fontMiddle, varTargetType=float)
                     self.nStepFrame = EntryFrame(self.algorithmSettingsFrame, nameLabel="n-Step n", font=fontMiddle, varTargetType=int, check_func=lambda x: x >= 0)
                     self.nPlanFrame = EntryFrame(self.algorithmSettingsFrame, nameLabel="Dyna-Q n", font=fontMiddle, varTargetType=int, labelWidth=8)
+                    self.explorationBonusFrame = EntryFrame(self.algorithmSettingsFrame, nameLabel="Dyna-Q+ κ", font=fontMiddle, varTargetType=float, check_func=lambda x: x >= 0, labelWidth=8,
+                                                            explanation="Planning updates add the bonus κ·√τ to the modeled reward, where τ is the number of actions\nsince the pair was last tried for real. Helps to notice changes of the world. 0 is plain Dyna-Q.")
                     self.expectationUpdateFrame = CheckbuttonFrame(self.algorithmSettingsFrame, nameLabel="Expectation Update", font=fontMiddle)
                     self.predefinedAlgorithmFrame = RadiomenuButtonFrame(self.algorithmSettingsFrame, nameLabel="Algorithm", font=fontMiddle, choices=list(self.predefinedAlgorithms.keys()), promptFg="blue")
 
@@ -235,6 +287,9 @@ class GridworldSandbox:
                 if True:  # flowControlFrame
                     self.showEveryNoperationsFrame = EntryFrame(self.flowControlFrame, nameLabel="Show Every...", font=fontMiddle, varTargetType=int, check_func=lambda x: x >= 1, value=1)
                     self.operationFrames = OrderedDict([(operation, CheckbuttonFrame(self.flowControlFrame, nameLabel=f"...{operation}", font=fontMiddle)) for operation in Agent.OPERATIONS])
+                    self.stoppingCriteriaFrame = tk.LabelFrame(self.flowControlFrame, text="Stop Early", bd=3, font=fontBig, fg=self.LABELFRAME_ENABLED_COLOR)
+                    self.evaluationIntervalFrame = EntryFrame(self.flowControlFrame, nameLabel="Evaluate Greedy Every", font=fontMiddle, varTargetType=int, check_func=lambda x: x >= 0, value=0,
+                                                              explanation="Computes the exact expected return of the greedy policy every this many episodes, without affecting the agent.\nIt is plotted next to the training returns. 0 disables the evaluation.")
                     self.flowButtonsFrame = tk.Frame(self.flowControlFrame)
 
                     myFuncs.arrange_children(self.flowControlFrame, order="row")
@@ -252,14 +307,35 @@ class GridworldSandbox:
 
                         # no arrange_children call here since a more complex alignment is needed
 
+                    if True:  # stoppingCriteriaFrame
+                        self.stablePolicyEpisodesFrame = EntryFrame(self.stoppingCriteriaFrame, nameLabel="Stable Policy Episodes", font=fontMiddle, varTargetType=int, check_func=lambda x: x >= 0, value=0,
+                                                                    explanation="Ends the run once the greedy actions of all states stayed the same for this many episodes in a row.\n0 disables this criterion.")
+                        self.QvalueChangeToleranceFrame = EntryFrame(self.stoppingCriteriaFrame, nameLabel="ΔQ Tolerance", font=fontMiddle, varTargetType=float, check_func=lambda x: x >= 0, value=0,
+                                                                     explanation="Ends the run once no Q-value changed by this much or more during an episode.\n0 disables this criterion.")
+                        self.plateauEpisodesFrame = EntryFrame(self.stoppingCriteriaFrame, nameLabel="Plateau Episodes", font=fontMiddle, varTargetType=int, check_func=lambda x: x >= 0, value=0,
+                                                               explanation="Ends the run once the mean return of the latest this many episodes differs by at most\nPlateau Tolerance from the mean of the same number of episodes before.\n0 disables this criterion.")
+                        self.plateauToleranceFrame = EntryFrame(self.stoppingCriteriaFrame, nameLabel="Plateau Tolerance", font=fontMiddle, varTargetType=float, check_func=lambda x: x >= 0, value=0)
+
+                        myFuncs.arrange_children(self.stoppingCriteriaFrame, order="row")
+
                 if True:  # miscSettingsFrame:
                     self.initialActionvalueMeanFrame = EntryFrame(self.miscSettingsFrame, nameLabel="Initial Q-Value Mean", font=fontMiddle, varTargetType=float)
                     self.initialActionvalueSigmaFrame = EntryFrame(self.miscSettingsFrame, nameLabel="Initial Q-Value Sigma", font=fontMiddle, varTargetType=float, check_func=lambda x: x >= 0)
+                    self.seedFrame = EntryFrame(self.miscSettingsFrame, nameLabel="Seed", font=fontMiddle, varTargetType=int, check_func=lambda x: x >= -1, value=-1,
+                                                explanation="Seed of the next run. Agent and environment derive their own random streams from it.\n-1 draws a fresh seed for every run.")
                     self.currentReturnFrame = InfoFrame(self.miscSettingsFrame, nameLabel="Current Return", font=fontMiddle, varTargetType=int, trustSet=False)
                     self.currentEpisodeFrame = InfoFrame(self.miscSettingsFrame, nameLabel="Current Episode", font=fontMiddle, varTargetType=int, trustSet=False)
                     self.operationsLeftFrame = EntryFrame(self.miscSettingsFrame, nameLabel="Operations Left", font=fontMiddle, varTargetType=int, trustSet=False)
                     self.minDelayFrame = EntryFrame(self.miscSettingsFrame, nameLabel="Min Delay [ms]", font=fontMiddle, varTargetType=int, check_func=lambda x: 0 <= x <= 9999)
                     self.visualizeMemoryFrame = CheckbuttonFrame(self.miscSettingsFrame, nameLabel="Visualize Memory", font=fontMiddle)
+                    self.recordFrame = CheckbuttonFrame(self.miscSettingsFrame, nameLabel="Record", font=fontMiddle,
+                                                        explanation=f"Renders every visualization offscreen into {self.RECORDINGS_PATH.name}/ instead of showing it.\nThe GUI is only refreshed at pauses, so the agent runs at headless speed.")
+                    self.recordFormatFrame = RadiomenuButtonFrame(self.miscSettingsFrame, nameLabel="Record As", font=fontMiddle, choices=Recorder.FORMATS, promptFg="blue")
+                    self.logEventsFrame = CheckbuttonFrame(self.miscSettingsFrame, nameLabel="Log Events", font=fontMiddle,
+                                                           explanation=f"Logs every operation of the next run to {self.LOGS_PATH.name}/.\nThe run can be inspected step by step with Replay afterwards.")
+                    self.trainInBackgroundFrame = CheckbuttonFrame(self.miscSettingsFrame, nameLabel="Train In Background", font=fontMiddle,
+                                                                   explanation="Runs agent and environment of the next run in a separate process, so learning doesnt wait for the GUI.\n"
+                                                                               "The GUI shows the latest state every Min Delay [ms] instead of every relevant operation.\nWorld edits take effect at the next episode start.")
                     self.dataButtonsFrame = tk.Frame(self.miscSettingsFrame)
 
                     myFuncs.arrange_children(self.miscSettingsFrame, order="row")
@@ -268,6 +344,8 @@ class GridworldSandbox:
                     if True:  # dataButtonsFrame:
                         self.loadButton = tk.Button(self.dataButtonsFrame, text="Load", font=fontBig, bd=5, width=5, command=self._load)
                         self.saveButton = tk.Button(self.dataButtonsFrame, text="Save", font=fontBig, bd=5, width=5, command=self._save)
+                        self.replayButton = tk.Button(self.dataButtonsFrame, text="Replay", font=fontBig, bd=5, width=6, command=self._open_replay)
+                        self.memoryButton = tk.Button(self.dataButtonsFrame, text="Memory", font=fontBig, bd=5, width=7, command=self._report_memory)
 
                         myFuncs.arrange_children(self.dataButtonsFrame, order="column")
 
@@ -276,7 +354,14 @@ class GridworldSandbox:
         self.lifetimeParameterFrames = [self.predefinedAlgorithmFrame,
                                         self.dynamicAlphaFrame,
                                         self.initialActionvalueMeanFrame,
-                                        self.initialActionvalueSigmaFrame]
+                                        self.initialActionvalueSigmaFrame,
+                                        self.seedFrame,
+                                        self.recordFrame,
+                                        self.recordFormatFrame,
+                                        self.logEventsFrame,
+                                        self.trainInBackgroundFrame]
+        if self.viewport is not None:
+            self.viewport.add_listener(self._refresh_viewport)  # must be added after all Tilemaps registered their own listeners
         self._load(self.SAFEFILE_PATH / initialWindowDict['default configfile'])
 
         # assign traces
@@ -291,6 +376,10 @@ class GridworldSandbox:
         for frame in self.hWindFrames + self.wWindFrames:
             frame.set_and_call_trace(self._toggle_ice_and_crosswind_warning)
         self.iceFloorFrame.set_and_call_trace(self._toggle_ice_and_crosswind_warning)
+        for frame in self.rewardFrames.values():
+            frame.set_and_call_trace(self._refresh_rewards)
+        for frame in [self.nStepFrame, self.onPolicyFrame, self.expectationUpdateFrame, self.dynamicAlphaFrame, self.decayEpsilonEpisodeWiseFrame, self.explorationBonusFrame]:
+            frame.set_and_call_trace(self._specialize_agent)
         self.predefinedAlgorithmFrame.set_and_call_trace(self._toggle_algorithm)
 
         myFuncs.center(self.mainWindow)
@@ -306,6 +395,7 @@ class GridworldSandbox:
         self.wTorusFrame.set_value(False)
         for frame in self.hWindFrames + self.wWindFrames:
             frame.set_value(0)
+        self._draw_minimap()
 
     def _toggle_idleActionValues(self):
         """Triggered by user input. If idle actions are part of the chosen actionspace,
@@ -314,12 +404,12 @@ class GridworldSandbox:
         """
         if self.allow_idleActions:
             if self.idleActionValues_visible:
-                self.greedyPolicyTilemap.grid()
-                self.qValueTilemaps[Agent.IDLE].grid_remove()
+                self.greedyPolicyMap.grid()
+                self.qValueMaps[Agent.IDLE].grid_remove()
                 self.idleActionValues_visible = False
             else:
-                self.greedyPolicyTilemap.grid_remove()
-                self.qValueTilemaps[Agent.IDLE].grid()
+                self.greedyPolicyMap.grid_remove()
+                self.qValueMaps[Agent.IDLE].grid()
                 self.idleActionValues_visible = True
 
     def _recursiveGather_namedInteractiveParameterFrames(self, frame):
@@ -346,34 +436,45 @@ class GridworldSandbox:
         """
         yamlDict = myFuncs.get_dict_from_yaml_file(filename, initialdir=self.SAFEFILE_PATH)
         if yamlDict:  # get_dict_from_yaml_file could have returned an empty Dict if dialog was canceled
-            throwWorldShapeError = False
-            tileDictMatrix = yamlDict.pop("world")
-            if tileDictMatrix is not None:
-                if shape(tileDictMatrix) == (self.H, self.W):
-                    for h in range(self.H):
-                        for w in range(self.W):
-                            self.gridworldTilemap.update_tile_appearance(h, w, **tileDictMatrix[h][w])
-                else:
-                    throwWorldShapeError = True
-            hWindValues = yamlDict.pop("hWind")
-            if hWindValues is not None:
-                if len(hWindValues) == self.W:
-                    for frame, value in zip(self.hWindFrames, hWindValues):
-                        frame.set_value(value)
-                else:
-                    throwWorldShapeError = True
-            wWindValues = yamlDict.pop("wWind")
-            if wWindValues is not None:
-                if len(wWindValues) == self.H:
-                    for frame, value in zip(self.wWindFrames, wWindValues):
-                        frame.set_value(value)
-                else:
-                    throwWorldShapeError = True
+            throwWorldShapeError = self._apply_world(yamlDict.pop("world"), yamlDict.pop("hWind"), yamlDict.pop("wWind"))
             if throwWorldShapeError:
                 messagebox.showerror("Error", "World shape does not match.")
+            self._draw_minimap()
 
             for name, frame in self.parameterFramesDict.items():  # must be executed only after world and wind was popped
-                frame.set_value(yamlDict[name])
+                if name in yamlDict:  # files saved before a parameter was introduced just keep its current value
+                    frame.set_value(yamlDict[name])
+
+    def _apply_world(self, tileDictMatrix, hWindValues, wWindValues):
+        """Shows a world and its wind in the world ``Tilemap``. None keeps the current appearance.
+
+        :param list[list[dict]] | None tileDictMatrix: Matrix of yaml-conform ``Tile`` representations
+        :param list[int] | None hWindValues: Wind of each column
+        :param list[int] | None wWindValues: Wind of each row
+        :return bool: True if a shape didnt match, in which case that part was skipped
+        """
+        throwWorldShapeError = False
+        if tileDictMatrix is not None:
+            if shape(tileDictMatrix) == (self.H, self.W):
+                for h in range(self.H):
+                    for w in range(self.W):
+                        self.gridworldTilemap.update_tile_appearance(h, w, **tileDictMatrix[h][w])
+                self.gridworldTilemap.mark_dirty()
+            else:
+                throwWorldShapeError = True
+        if hWindValues is not None:
+            if len(hWindValues) == self.W:
+                for frame, value in zip(self.hWindFrames, hWindValues):
+                    frame.set_value(value)
+            else:
+                throwWorldShapeError = True
+        if wWindValues is not None:
+            if len(wWindValues) == self.H:
+                for frame, value in zip(self.wWindFrames, wWindValues):
+                    frame.set_value(value)
+            else:
+                throwWorldShapeError = True
+        return throwWorldShapeError
 
     def _save(self, filepath=None):
         """Triggered by user input. Saves the current state of the environment
@@ -389,12 +490,21 @@ class GridworldSandbox:
         myFuncs.create_yaml_file_from_dict(valueDict, filepath, nameEmbedding=f"{{}}_{self.H}x{self.W}", initialdir=self.SAFEFILE_PATH)
 
     def _initialize_environment_and_agent(self):
+        seed = self.seedFrame.get_value()
+        agentRng, environmentRng = RandomStream.spawn(None if seed == -1 else seed, 2)
+        eventLog = None
+        if self.logEventsFrame.get_value():
+            eventLog = EventLog(self.LOGS_PATH / (time.strftime("%Y-%m-%d_%H-%M-%S") + EventLog.SUFFIX),  # the world at the start of the run is stored for the replay
+                                world=self.gridworldTilemap.get_yaml_list(),
+                                hWind=[frame.get_value() for frame in self.hWindFrames],
+                                wWind=[frame.get_value() for frame in self.wWindFrames])
         self.environment = Environment(H=self.H, W=self.W,
                                        hasIceFloorVar=self.iceFloorFrame.get_variable(),
                                        isHtorusVar=self.hTorusFrame.get_variable(),
                                        isWtorusVar=self.wTorusFrame.get_variable(),
                                        hWindVars=[frame.get_variable() for frame in self.hWindFrames],
-                                       wWindVars=[frame.get_variable() for frame in self.wWindFrames])
+                                       wWindVars=[frame.get_variable() for frame in self.wWindFrames],
+                                       rng=environmentRng)
         # Agent needs an environment to exist, but environment doesnt need an agent to exist
         self.agent = Agent(environment=self.environment,
                            use_straightActions=self.allow_straightActions,
@@ -415,42 +525,142 @@ class GridworldSandbox:
                            targetEpsilonDecayRateVar=self.targetEpsilonDecayRateFrame.get_variable(),
                            decayEpsilonEpisodeWiseVar=self.decayEpsilonEpisodeWiseFrame.get_variable(),
                            initialActionvalueMean=self.initialActionvalueMeanFrame.get_value(),
-                           initialActionvalueSigma=self.initialActionvalueSigmaFrame.get_value())
+                           initialActionvalueSigma=self.initialActionvalueSigmaFrame.get_value(),
+                           rng=agentRng,
+                           eventLog=eventLog,
+                           convergenceMonitor=ConvergenceMonitor(stablePolicyEpisodesVar=self.stablePolicyEpisodesFrame.get_variable(),
+                                                                 QvalueChangeToleranceVar=self.QvalueChangeToleranceFrame.get_variable(),
+                                                                 plateauEpisodesVar=self.plateauEpisodesFrame.get_variable(),
+                                                                 plateauToleranceVar=self.plateauToleranceFrame.get_variable()),
+                           policyEvaluator=PolicyEvaluator(evaluationIntervalVar=self.evaluationIntervalFrame.get_variable()),
+                           explorationBonusVar=self.explorationBonusFrame.get_variable())
+
+    def _start_training_process(self):
+        """Counterpart of ``_initialize_environment_and_agent`` for runs in a separate process.
+        The ``TrainingProcess`` builds agent and environment from the current world and parameters.
+        """
+        eventLogKwargs = None
+        if self.logEventsFrame.get_value():
+            eventLogKwargs = {"filepath": self.LOGS_PATH / (time.strftime("%Y-%m-%d_%H-%M-%S") + EventLog.SUFFIX),
+                              "world": self.gridworldTilemap.get_yaml_list(),
+                              "hWind": [frame.get_value() for frame in self.hWindFrames],
+                              "wWind": [frame.get_value() for frame in self.wWindFrames]}
+        self.sentParameters = self._get_training_parameters()
+        self.trainingProcess = TrainingProcess(self.gridworldTilemap.get_yaml_list(), self.sentParameters,
+                                               straight=self.allow_straightActions, diagonal=self.allow_diagonalActions, idle=self.allow_idleActions,
+                                               eventLogKwargs=eventLogKwargs)
+        self.trainingProcess.start()
+
+    def _get_training_parameters(self):
+        """:return dict: {GUI label: value} of all parameters, plus "hWind" and "wWind" """
+        parameters = {name: frame.get_value() for name, frame in self.parameterFramesDict.items()}
+        parameters["hWind"] = [frame.get_value() for frame in self.hWindFrames]
+        parameters["wWind"] = [frame.get_value() for frame in self.wWindFrames]
+        return parameters
+
+    def _pop_changed_training_parameters(self):
+        """:return dict: {GUI label: value} of the parameters changed since they were last sent to the training process"""
+        parameters = self._get_training_parameters()
+        changedParameters = {name: value for name, value in parameters.items() if value != self.sentParameters.get(name)}
+        self.sentParameters = parameters
+        return changedParameters
 
     def _update_environment(self):
-        tileData = matrix(self.H, self.W)
-        valueVisualizationTilemaps = self.valueVisualizationFrame.winfo_children()
-        for h in range(self.H):
-            for w in range(self.W):
-                newText = self.gridworldTilemap.get_tile_text(h, w)
-                newBackground = self.gridworldTilemap.get_tile_background_color(h, w)
-                newBordercolor = self.gridworldTilemap.get_tile_border_color(h, w)
-                updateKwargs = {"fg": Tile.LETTER_COLOR, "borderColor": newBordercolor, "bg": newBackground}
-                for tilemap in valueVisualizationTilemaps:
-                    tilemap.unprotect_text_and_textColor(h, w)  # needed to set / remove Goalchar properly
-                    if newText and (newText[-1] in [Tile.GOAL_CHAR, Tile.TELEPORTER_SINK_ONLY_SUFFIX]):
-                        tilemap.update_tile_appearance(h, w, text=newText, **updateKwargs)
-                        tilemap.protect_text_and_color(h, w)
-                    else:
-                        tilemap.update_tile_appearance(h, w, **updateKwargs)
-                teleportSource = None
-                teleportSink = None
-                if newText and newText[0] in Tile.TELEPORTERS:
-                    if newText[1] != Tile.TELEPORTER_SINK_ONLY_SUFFIX:
-                        teleportSource = newText[0]
-                    if newText[1] != Tile.TELEPORTER_SOURCE_ONLY_SUFFIX:
-                        teleportSink = newText[0]
-                arrivalRewardVarName = "Reward " + newBordercolor.capitalize()
-                tileData[h][w] = {"position": (h,w),
-                                  "isWall": newBackground == Tile.WALL_COLOR,
-                                  "isStart": newText == Tile.START_CHAR,
-                                  "isGoal": newText == Tile.GOAL_CHAR,
-                                  "arrivalRewardVar": self.parameterFramesDict[arrivalRewardVarName].get_variable(),
-                                  "teleportSource": teleportSource,
-                                  "teleportSink": teleportSink}
-        self.environment.update(tileData)
+        """Passes the cells changed since the last update to the environment, all other cells stay as they are.
+        """
+        cells = self.gridworldTilemap.pop_dirty_cells()
+        cellData = self._sync_world_views(cells)
+        if self.trainingProcess is not None:
+            self.trainingProcess.update_cells([(cell, {"text": self.gridworldTilemap.get_tile_text(*cell),
+                                                       "bg": self.gridworldTilemap.get_tile_background_color(*cell),
+                                                       "borderColor": self.gridworldTilemap.get_tile_border_color(*cell)}) for cell in cells])
+        else:
+            self.environment.update_cells(cellData)
+        if self.recorder is not None and cellData:
+            self.recorder.set_world(self.gridworldTilemap.get_yaml_list())
         # TODO: Everytime a Tile is changed to an episode terminator, change its Qvalues to 0 explicitly. NO! Agent cant know this beforehand, thats the point!
 
+    def _sync_world_views(self, cells=None):
+        """Copies cells of the world ``Tilemap`` to all value maps and the minimap.
+
+        :param list[tuple] | None cells: Positions of the cells to copy. If None, all cells are copied.
+        :return list[dict]: Keyword arguments for the ``Cell`` objects of these cells in the environment
+        """
+        if cells is None:
+            cells = [(h, w) for h in range(self.H) for w in range(self.W)]
+        cellData = []
+        for h, w in cells:
+            newText, newBackground, newBordercolor = self._sync_value_tilemaps_with_world(h, w)
+            arrivalRewardVarName = "Reward " + newBordercolor.capitalize()
+            cellData.append({"position": (h,w),
+                             "arrivalRewardVar": self.parameterFramesDict[arrivalRewardVarName].get_variable(),
+                             **Tile.get_cell_kwargs({"text": newText, "bg": newBackground})})
+            self.wallMask[h, w] = cellData[-1]["isWall"]
+        self._draw_minimap(cells)
+        return cellData
+
+    def _sync_value_tilemaps_with_world(self, h, w):
+        """Copies the world-defined appearance of a cell (borders, walls, goal- and teleport-sink chars) to all value ``Tilemaps``.
+
+        :param int h: Height coordinate of the cell
+        :param int w: Width  coordinate of the cell
+        :return tuple[str, str, str]: text, background color and border color of the cell in the world ``Tilemap``
+        """
+        newText = self.gridworldTilemap.get_tile_text(h, w)
+        newBackground = self.gridworldTilemap.get_tile_background_color(h, w)
+        newBordercolor = self.gridworldTilemap.get_tile_border_color(h, w)
+        if self.useHeatmaps:  # Heatmaps only need the walls, which are passed at once after the environment update
+            return newText, newBackground, newBordercolor
+        updateKwargs = {"fg": Tile.LETTER_COLOR, "borderColor": newBordercolor, "bg": newBackground}
+        for tilemap in self.valueVisualizationFrame.winfo_children():
+            tilemap.unprotect_text_and_textColor(h, w)  # needed to set / remove Goalchar properly
+            if newText and (newText[-1] in [Tile.GOAL_CHAR, Tile.TELEPORTER_SINK_ONLY_SUFFIX]):
+                tilemap.update_tile_appearance(h, w, text=newText, **updateKwargs)
+                tilemap.protect_text_and_color(h, w)
+            else:
+                tilemap.update_tile_appearance(h, w, **updateKwargs)
+        return newText, newBackground, newBordercolor
+
+    def _refresh_viewport(self):
+        """Triggered by each scroll or zoom, right after all ``Tilemaps`` rebound their ``Tiles``.
+        The value ``Tilemaps`` dont store cells outside the viewport, so the cells that just became
+        visible are rendered again from the world ``Tilemap`` and, if alive, the agent.
+        """
+        for h, w in self.viewport.get_visible_cells():
+            self._sync_value_tilemaps_with_world(h, w)
+        if (self.agent is not None or self.replay is not None or self.trainingProcess is not None) and self.latestAgentOperation is not None:
+            self._visualize()
+
+    def _get_visible_cells(self):
+        if self.viewport is None:
+            return ((h, w) for h in range(self.H) for w in range(self.W))
+        return self.viewport.get_visible_cells()
+
+    def _draw_minimap(self, cells=None):
+        """Draws the world into the minimap.
+
+        :param list[tuple] | None cells: Positions of the cells to redraw. If None, the whole world is redrawn.
+        """
+        if self.minimap is None:
+            return
+        if cells is None:
+            self.minimap.draw_world([[self._get_minimap_color(h, w) for w in range(self.W)] for h in range(self.H)])
+        else:
+            self.minimap.draw_cells({(h, w): self._get_minimap_color(h, w) for h, w in cells})
+
+    def _get_minimap_color(self, h, w):
+        text = self.gridworldTilemap.get_tile_text(h, w)
+        borderColor = self.gridworldTilemap.get_tile_border_color(h, w)
+        if self.gridworldTilemap.get_tile_background_color(h, w) == Tile.WALL_COLOR:
+            return Tile.WALL_COLOR
+        elif text == Tile.GOAL_CHAR:
+            return Minimap.GOAL_COLOR
+        elif text == Tile.START_CHAR:
+            return Minimap.START_COLOR
+        elif borderColor != Tile.BORDER_COLORS[0]:
+            return borderColor
+        return Tile.BLANK_COLOR
+
     #def _start_flow(self, demandPauseAtNextVisualization):
     #    profile = cProfile.Profile()
     #    profile.runcall(lambda arg=demandPauseAtNextVisualization: self._start_flow_real(arg))
@@ -463,39 +673,84 @@ class GridworldSandbox:
         #self.pauseButton.grid()  # use this again if Pause appears over Go when it shouldnt
         self.goButton.grid_remove()
         self.nextButton.config(state=tk.DISABLED)
-        if self.agent is None:
-            self._initialize_environment_and_agent()
+        if self.agent is None and self.trainingProcess is None:
+            if self.trainInBackgroundFrame.get_value():
+                self._start_training_process()
+                self._sync_world_views(self.gridworldTilemap.pop_dirty_cells())  # the training process got the whole world already
+            else:
+                self._initialize_environment_and_agent()
+                self.gridworldTilemap.mark_dirty()  # the new environment has no cells yet
             self._freeze_lifetime_parameters()
+            if self.recordFrame.get_value():
+                self._start_recording()
         if self.gridworldTilemap.interactionAllowed:  # new episode is going to start
             self.gridworldTilemap.set_interactionAllowed(False)
             self._freeze_episodetime_parameters()
             self._update_environment()
-        self._iterate_flow()
+        if self.trainingProcess is not None:
+            self.trainingProcess.set_parameters(self._pop_changed_training_parameters())
+            self.trainingProcess.run(self.relevantOperations, pauseAtNextFrame=demandPauseAtNextVisualization)
+            self._iterate_background_flow()
+        else:
+            self._iterate_flow()
 
     def _iterate_flow(self):
-        if self.operationsLeftFrame.get_value() <= 0:
-            self._apply_pause(end=True)
-            return
-        if self.pauseDemanded:
+        for _ in range(1 if self.recorder is None else self.RECORDING_CHUNK_SIZE):
+            if self.operationsLeftFrame.get_value() <= 0:
+                self._apply_pause(end=True)
+                return
+            if self.pauseDemanded:
+                if self.latestAgentOperation in self.relevantOperations:
+                    self._apply_pause()
+                    return
+                else:  # User clicked too late! Refresh time was over and iterate flow was already running again in the background. Now wait for the next relevant operation and visualization to enter the block above.
+                    self.pauseDemanded = False
+                    self.demandPauseAtNextVisualization = True
+            next_msDelay = 0
+            self.latestAgentOperation = self.agent.operate()  # This is where all the RL-Stuff happens
+            self.agentOperationCounts[self.latestAgentOperation] += 1
+            self.operationsLeftFrame.set_value(self.operationsLeftFrame.get_value() - 1)
+            if self.agent.get_stopReason() is not None:
+                self.operationsLeftFrame.set_value(0)  # ends the run at the next iteration, after the finished episode is shown
             if self.latestAgentOperation in self.relevantOperations:
+                totalRelevantCount = 0
+                for operation in self.relevantOperations:
+                    totalRelevantCount += self.agentOperationCounts[operation]
+                if totalRelevantCount % self.showEveryNoperationsFrame.get_value() == 0:
+                    self.pauseDemanded = self.demandPauseAtNextVisualization
+                    if self.recorder is None:
+                        self._visualize()
+                        next_msDelay = self.minDelayFrame.get_value()
+                    else:
+                        self._record()
+        self.guiProcess.after(next_msDelay, self._iterate_flow)
+
+    def _iterate_background_flow(self):
+        """Counterpart of ``_iterate_flow`` while a ``TrainingProcess`` trains. Passes changed parameters on and shows
+        its latest frame, at most every Min Delay [ms], while the agent keeps operating in the other process.
+        """
+        if self.pauseDemanded:
+            self.pauseDemanded = False
+            self.trainingProcess.pause()
+        self.trainingProcess.set_parameters(self._pop_changed_training_parameters())
+        if self.trainingProcess.poll():
+            self.latestAgentOperation = self.trainingProcess.get_operation()
+            self.currentReturnFrame.set_value(self.trainingProcess.get_currentReturn())
+            self.currentEpisodeFrame.set_value(self.trainingProcess.get_currentEpisode())
+            self.operationsLeftFrame.set_value(self.trainingProcess.get_operationsLeft())
+            self.sentParameters["Operations Left"] = self.trainingProcess.get_operationsLeft()  # not a change of the user
+            if self.recorder is None:
+                self._visualize()
+            else:
+                self._record()
+            if self.trainingProcess.is_finished():
+                self._apply_pause(end=True)
+                return
+            self.trainingProcess.request_frame()
+            if self.trainingProcess.is_paused():
                 self._apply_pause()
                 return
-            else:  # User clicked too late! Refresh time was over and iterate flow was already running again in the background. Now wait for the next relevant operation and visualization to enter the block above.
-                self.pauseDemanded = False
-                self.demandPauseAtNextVisualization = True
-        next_msDelay = 0
-        self.latestAgentOperation = self.agent.operate()  # This is where all the RL-Stuff happens
-        self.agentOperationCounts[self.latestAgentOperation] += 1
-        self.operationsLeftFrame.set_value(self.operationsLeftFrame.get_value() - 1)
-        if self.latestAgentOperation in self.relevantOperations:
-            totalRelevantCount = 0
-            for operation in self.relevantOperations:
-                totalRelevantCount += self.agentOperationCounts[operation]
-            if totalRelevantCount % self.showEveryNoperationsFrame.get_value() == 0:
-                self.pauseDemanded = self.demandPauseAtNextVisualization
-                self._visualize()
-                next_msDelay = self.minDelayFrame.get_value()
-        self.guiProcess.after(next_msDelay, self._iterate_flow)
+        self.guiProcess.after(max(self.minDelayFrame.get_value(), 1), self._iterate_background_flow)
 
     def _demand_pause(self):
         self.pauseDemanded = True
@@ -508,69 +763,256 @@ class GridworldSandbox:
         self.nextButton.config(state=tk.NORMAL)
         if end:
             self._unfreeze_lifetime_parameters()
+            if self.recorder is not None:
+                self._record()
+                self.recorder.close()  # the rendering process saves the recording in the background
+                self.recorder = None
             self._visualize()
-            self._plot()
-            del self.agent
-            self.agent = None
-        if self.agent is None or self.latestAgentOperation == Agent.FINISHED_EPISODE:
+            if self.trainingProcess is not None:
+                results = self.trainingProcess.close()  # the training process closes its event log itself
+                self.trainingProcess = None
+                if results is not None:
+                    self._plot(**results)
+            else:
+                self._plot(self.agent.get_run_summary(), self.agent.get_episodeReturns(), self.agent.get_policyEvaluator().get_greedyReturns(), self.agent.get_stepReturns())
+                if self.agent.get_eventLog() is not None:
+                    self.agent.get_eventLog().close()
+                del self.agent
+                self.agent = None
+        elif self.recorder is not None:
+            self._visualize()  # the GUI isnt updated while recording
+        if (self.agent is None and self.trainingProcess is None) or self.latestAgentOperation == Agent.FINISHED_EPISODE:
             self._unfreeze_episodetime_parameters()
             self.gridworldTilemap.set_interactionAllowed(True)
 
     def _visualize(self):
         # TODO: Qlearning doesnt update some tiles after a while. THATS THE POINT! Because its off-policy. This shows that it works! Great for presentation! Example with no walls and Start/Goal in the edges.
-        if self.visualizeMemoryFrame.get_value():
-            agentcolorDefaultHue, agentcolorDefaultSaturation, agentcolorValue = myFuncs.rgbHexString_to_hsv(myFuncs.get_light_color(Tile.AGENTCOLOR_DEFAULT, self.agentLightnessQvalueFrames))
-            traceCandidates = {state for state, _, _ in self.agent.get_memory()}
-            traceTail = self.agent.get_memory().yield_lastForgottenState()
-            memorySize = self.agent.get_memory_size() + int(bool(traceTail))
-            if traceTail:
-                traceCandidates.add(traceTail)
-
-        for h in range(self.H):
-            for w in range(self.W):
-                if self.gridworldTilemap.get_tile_background_color(h, w) == Tile.WALL_COLOR:
-                    continue
-                gridworldFrame_Color = Tile.BLANK_COLOR
-                valueVisualizationFrame_Color = Tile.BLANK_COLOR
-                if self.visualizeMemoryFrame.get_value() and (h,w) in traceCandidates:
-                    newSaturation = (self.maxLightnessAgentTrace - self.minLightnessAgentTrace * self.agent.get_absence((h,w)) / (memorySize+1)) * agentcolorDefaultSaturation
-                    valueVisualizationFrame_Color = myFuncs.hsv_to_rgbHexString(agentcolorDefaultHue, newSaturation, agentcolorValue)
-                if (h,w) == self.agent.get_state():
-                    if self.operationsLeftFrame.get_value() <= 0:
-                        gridworldFrame_Color = Tile.AGENTCOLOR_DEAD
-                        valueVisualizationFrame_Color = Tile.AGENTCOLOR_DEAD
-                    elif self.latestAgentOperation == Agent.UPDATED_BY_PLANNING:
-                        gridworldFrame_Color = Tile.AGENTCOLOR_PLANNING
-                        valueVisualizationFrame_Color = myFuncs.get_light_color(Tile.AGENTCOLOR_PLANNING, self.agentLightnessQvalueFrames)
-                    elif self.agent.hasMadeExploratoryAction:
-                        gridworldFrame_Color = Tile.AGENTCOLOR_EXPLORATORY
-                        valueVisualizationFrame_Color = myFuncs.get_light_color(Tile.AGENTCOLOR_EXPLORATORY, self.agentLightnessQvalueFrames)
-                    else:
-                        gridworldFrame_Color = Tile.AGENTCOLOR_DEFAULT
-                        valueVisualizationFrame_Color = myFuncs.get_light_color(Tile.AGENTCOLOR_DEFAULT, self.agentLightnessQvalueFrames)
-                elif (h,w) == self.environment.get_teleportJustUsed():
-                    gridworldFrame_Color = Tile.TELEPORT_JUST_USED_COLOR
-                    valueVisualizationFrame_Color = myFuncs.get_light_color(Tile.TELEPORT_JUST_USED_COLOR, self.agentLightnessQvalueFrames)
-                elif (h,w) == self.environment.get_windJustUsed():
-                    gridworldFrame_Color = Tile.WIND_JUST_USED_COLOR
-                    valueVisualizationFrame_Color = myFuncs.get_light_color(Tile.WIND_JUST_USED_COLOR, self.agentLightnessQvalueFrames)
-                self.gridworldTilemap.update_tile_appearance(h, w, bg=gridworldFrame_Color)
-                for action, Qvalue in self.agent.get_Qvalues()[h][w].items():
-                    self.qValueTilemaps[action].update_tile_appearance(h, w, text=f"{Qvalue:< 3.2f}"[:self.QVALUES_WIDTH + 1], bg=valueVisualizationFrame_Color)
-
-                greedyReprKwargs = Tile.get_greedy_actions_representation(tuple(self.agent.get_greedyActions()[h][w]))  # tuple cast because a cached function needs mutable args
-                self.greedyPolicyTilemap.update_tile_appearance(h, w, bg=valueVisualizationFrame_Color, **greedyReprKwargs)
-
-        for action, tilemap in self.qValueTilemaps.items():
-            if action == self.agent.get_targetAction():
+        agent, environment = self._get_shown_agent_and_environment()
+        traceColors = self._get_trace_colors()
+        agentColors = self._get_agent_colors()
+        Qvalues = agent.get_QvalueArray()
+
+        for h, w in self._get_visible_cells():
+            if self.gridworldTilemap.get_tile_background_color(h, w) == Tile.WALL_COLOR:
+                continue
+            gridworldFrame_Color = Tile.BLANK_COLOR
+            valueVisualizationFrame_Color = Tile.BLANK_COLOR
+            if (h,w) in traceColors:
+                valueVisualizationFrame_Color = traceColors[(h,w)]
+            if (h,w) == agent.get_state():
+                gridworldFrame_Color, valueVisualizationFrame_Color = agentColors
+            elif (h,w) == environment.get_teleportJustUsed():
+                gridworldFrame_Color = Tile.TELEPORT_JUST_USED_COLOR
+                valueVisualizationFrame_Color = myFuncs.get_light_color(Tile.TELEPORT_JUST_USED_COLOR, self.agentLightnessQvalueFrames)
+            elif (h,w) == environment.get_windJustUsed():
+                gridworldFrame_Color = Tile.WIND_JUST_USED_COLOR
+                valueVisualizationFrame_Color = myFuncs.get_light_color(Tile.WIND_JUST_USED_COLOR, self.agentLightnessQvalueFrames)
+            self.gridworldTilemap.update_tile_appearance(h, w, bg=gridworldFrame_Color)
+            if self.useHeatmaps:
+                continue
+            QvaluesForS = Qvalues[h, w].tolist()
+            for action, Qvalue in zip(agent.get_actionspace(), QvaluesForS):
+                self.qValueMaps[action].update_tile_appearance(h, w, text=f"{Qvalue:< 3.2f}"[:self.QVALUES_WIDTH + 1], bg=valueVisualizationFrame_Color)
+
+            maxQvalue = max(QvaluesForS)  # per visible cell, so the cost of a frame does not grow with the world
+            greedyActions = tuple(action for action, Qvalue in zip(agent.get_actionspace(), QvaluesForS) if Qvalue == maxQvalue)  # same order as the greedy actions of the Agent
+            greedyReprKwargs = Tile.get_greedy_actions_representation(greedyActions)
+            self.greedyPolicyMap.update_tile_appearance(h, w, bg=valueVisualizationFrame_Color, **greedyReprKwargs)
+        if self.useHeatmaps:
+            self._visualize_heatmaps(agent, agentColors[1])
+
+        for action, tilemap in self.qValueMaps.items():
+            if action == agent.get_targetAction():
                 relief = self.VALUE_TILEMAPS_RELIEF_TARGET_ACTION
             else:
                 relief = self.VALUE_TILEMAPS_RELIEF_DEFAULT
             if tilemap.cget("relief") != relief:  # pre-check gives huge speedup (also used in Tile class)
                 tilemap.config(relief=relief)
+        if self.minimap is not None:
+            self.minimap.set_agent(agent.get_state(), agentColors[0])
 
         self.guiProcess.update_idletasks()
 
+    def _visualize_heatmaps(self, agent, agentColor):
+        """Draws all Q-tables, the maximum Q-values and the greedy actions in one vectorized pass per map.
+
+        :param Agent | Replay agent: Source of the Q-values
+        :param str agentColor: tkinter color of the agent frame
+        """
+        Qvalues = agent.get_QvalueArray()
+        shownQvalues = Qvalues[~self.wallMask]
+        vmin, vmax = (shownQvalues.min(), shownQvalues.max()) if shownQvalues.size else (0, 0)  # shared scale, so colors are comparable between maps
+        for iAction, action in enumerate(agent.get_actionspace()):
+            self.qValueMaps[action].draw(Qvalues[:, :, iAction], vmin, vmax, wallMask=self.wallMask)
+        self.greedyPolicyMap.draw(Qvalues.max(axis=2), vmin, vmax, wallMask=self.wallMask)
+        greedyDirections = agent.get_greedyMask().astype(int) @ np.array(agent.get_actionspace())  # sum of the greedy actions, like in Tile.get_greedy_actions_representation
+        greedyDirections[self.wallMask] = 0
+        self.greedyPolicyMap.draw_greedy_arrows(greedyDirections)
+        for heatmap in [*self.qValueMaps.values(), self.greedyPolicyMap]:
+            heatmap.set_agent(agent.get_state(), agentColor)
+
+    def _get_trace_colors(self):
+        """Returns the colors of the states in the agents memory trace for the value ``Tilemaps``, older states being paler.
+        Must be called once per visualization, since it consumes the state the memory forgot last.
+
+        :return dict: {state: tkinter color}, empty if the memory isnt visualized
+        """
+        if not self.visualizeMemoryFrame.get_value() or self.replay is not None:  # the memory isnt logged
+            return {}
+        agentcolorDefaultHue, agentcolorDefaultSaturation, agentcolorValue = myFuncs.rgbHexString_to_hsv(myFuncs.get_light_color(Tile.AGENTCOLOR_DEFAULT, self.agentLightnessQvalueFrames))
+        if self.trainingProcess is not None:  # the training process collected the trace when it wrote the frame
+            trace, memorySize = self.trainingProcess.get_trace()
+            absences = {(h, w): absence for h, w, absence in trace.tolist()}
+        else:
+            traceTail = self.agent.get_memory().yield_lastForgottenState()
+            memorySize = self.agent.get_memory_size() + int(bool(traceTail))
+            absences = {state: self.agent.get_absence(state) for state in self.agent.get_memory().get_states()}
+            if traceTail:
+                absences[traceTail] = self.agent.get_absence(traceTail)
+        traceColors = {}
+        for state, absence in absences.items():
+            newSaturation = (self.maxLightnessAgentTrace - self.minLightnessAgentTrace * absence / (memorySize+1)) * agentcolorDefaultSaturation
+            traceColors[state] = myFuncs.hsv_to_rgbHexString(agentcolorDefaultHue, newSaturation, agentcolorValue)
+        return traceColors
+
+    def _start_recording(self):
+        fileFormat = self.recordFormatFrame.get_value()
+        filename = time.strftime("%Y-%m-%d_%H-%M-%S") + (".gif" if fileFormat == "GIF" else "")
+        agent, _ = self._get_shown_agent_and_environment()
+        self.recorder = Recorder(self.H, self.W, agent.get_actionspace(), self.RECORDINGS_PATH / filename, fileFormat=fileFormat,
+                                 frameDuration=self.recordingFrameDuration, cellSize=self.recordingCellSize, useHeatmaps=self.useHeatmaps,
+                                 lightness=self.agentLightnessQvalueFrames)
+
+    def _record(self):
+        """Offscreen counterpart of ``_visualize``. Sends a snapshot of the current state to the ``Recorder``.
+        """
+        agent, environment = self._get_shown_agent_and_environment()
+        self.recorder.capture(state=agent.get_state(),
+                              Qvalues=agent.get_QvalueArray(),
+                              targetAction=agent.get_targetAction(),
+                              agentColors=self._get_agent_colors(),
+                              traceColors=self._get_trace_colors(),
+                              teleportJustUsed=environment.get_teleportJustUsed(),
+                              windJustUsed=environment.get_windJustUsed())
+
+    def _get_agent_colors(self):
+        """Returns the color of the agent in the world ``Tilemap`` and in the value ``Tilemaps``.
+
+        :return tuple[str, str]: tkinter colors
+        """
+        agent, _ = self._get_shown_agent_and_environment()
+        if self.replay is None and self.operationsLeftFrame.get_value() <= 0:
+            return Tile.AGENTCOLOR_DEAD, Tile.AGENTCOLOR_DEAD
+        if self.latestAgentOperation == Agent.UPDATED_BY_PLANNING:
+            color = Tile.AGENTCOLOR_PLANNING
+        elif agent.hasMadeExploratoryAction:
+            color = Tile.AGENTCOLOR_EXPLORATORY
+        else:
+            color = Tile.AGENTCOLOR_DEFAULT
+        return color, myFuncs.get_light_color(color, self.agentLightnessQvalueFrames)
+
+    def _get_shown_agent_and_environment(self):
+        """While replaying, the ``Replay`` takes the place of the agent and the environment in all visualizations,
+        while training in the background the ``TrainingProcess`` does.
+
+        :return tuple: (Agent | Replay | TrainingProcess, Environment | Replay | TrainingProcess)
+        """
+        if self.replay is not None:
+            return self.replay, self.replay
+        if self.trainingProcess is not None:
+            return self.trainingProcess, self.trainingProcess
+        return self.agent, self.environment
+
+    def _report_memory(self):
+        """Triggered by user input. Writes the memory footprint of the current agent, environment and maps
+        to a json file in the reports folder and shows the largest structures.
+        """
+        widgets = {"gridworldTilemap": self.gridworldTilemap, "greedyPolicyMap": self.greedyPolicyMap, "minimap": self.minimap}
+        widgets |= {f"qValueMap{action}": valueMap for action, valueMap in self.qValueMaps.items()}
+        report = MemoryReport(self.agent, self.environment, widgets).save(self.REPORTS_PATH / ("memory_" + time.strftime("%Y-%m-%d_%H-%M-%S")))
+        largest = sorted(report["structures"].items(), key=lambda item: -item[1]["bytes"])[:10]
+        messagebox.showinfo("Memory", f"Total: {report['total'] / 2**20:.1f} MiB\n\n" + "\n".join(f"{name}: {structure['bytes'] / 2**10:.0f} KiB" for name, structure in largest)
+                            + ("" if report["tracemalloc"] else "\n\nStart with --trace-memory to also trace allocations by file."))
+
+    def _open_replay(self):
+        """Triggered by user input. Loads an event log, restores its world and opens a window to scrub
+        through the logged run. Until that window is closed, all maps show the replayed steps.
+        """
+        filepath = filedialog.askopenfilename(initialdir=self.LOGS_PATH, filetypes=[("Event Log", f"*{EventLog.SUFFIX}")])
+        if not filepath:
+            return
+        try:
+            replay = Replay(filepath)
+        except ValueError as error:
+            messagebox.showerror("Error", str(error))
+            return
+        if replay.get_actionspace() != Agent.create_actionspace(self.allow_straightActions, self.allow_diagonalActions, self.allow_idleActions) or replay.shape[:2] != (self.H, self.W):
+            messagebox.showerror("Error", "The log was recorded with another world shape or actionspace.")
+            return
+        self.replay = replay
+        header = self.replay.get_header()
+        self._apply_world(header.get("world"), header.get("hWind"), header.get("wWind"))
+        self._sync_world_views()
+        self.gridworldTilemap.set_interactionAllowed(False)
+        self._freeze_episodetime_parameters()
+        for button in [self.goButton, self.nextButton, self.replayButton]:
+            button.config(state=tk.DISABLED)
+
+        self.replayWindow = tk.Toplevel(self.mainWindow)
+        self.replayWindow.title(f"Replay {Path(filepath).name}")
+        self.replayWindow.protocol("WM_DELETE_WINDOW", self._close_replay)
+        self.replayScale = tk.Scale(self.replayWindow, from_=0, to=len(self.replay), orient=tk.HORIZONTAL, length=600, font=self.fontMiddle, label="Step", command=self._on_replay_scale)
+        self.replayInfoLabel = tk.Label(self.replayWindow, font=self.fontMiddle)
+        self.replaySpeedFrame = EntryFrame(self.replayWindow, nameLabel="Replay Speed", font=self.fontMiddle, varTargetType=int, value=1,
+                                           explanation="Steps per frame while playing. Negative values play backwards.\nThe delay between frames is Min Delay [ms].")
+        self.replayPlayButton = tk.Button(self.replayWindow, text="Play", font=self.fontBig, bd=5, width=6, command=self._toggle_replay_playing)
+        myFuncs.arrange_children(self.replayWindow, order="row")
+        self.replayAfterId = None
+        self._seek_replay(0)
+
+    def _on_replay_scale(self, value):
+        if int(value) != self.replay.get_step():  # setting the scale from code triggers this as well
+            self._seek_replay(int(value))
+
+    def _seek_replay(self, step):
+        self.replay.seek(step)
+        self.latestAgentOperation = self.replay.get_operation()
+        record = self.replay.get_record()
+        info = self.latestAgentOperation or "Initial Q-Values"
+        if self.latestAgentOperation == Agent.TOOK_ACTION:
+            info += f", Reward {record['reward']:g}"
+        self.replayInfoLabel.config(text=info)
+        self.replayScale.set(self.replay.get_step())
+        self._visualize()
+
+    def _toggle_replay_playing(self):
+        if self.replayAfterId is None:
+            self.replayPlayButton.config(text="Stop")
+            self._play_replay()
+        else:
+            self.guiProcess.after_cancel(self.replayAfterId)
+            self.replayAfterId = None
+            self.replayPlayButton.config(text="Play")
+
+    def _play_replay(self):
+        self._seek_replay(self.replay.get_step() + self.replaySpeedFrame.get_value())
+        if 0 < self.replay.get_step() < len(self.replay):
+            self.replayAfterId = self.guiProcess.after(self.minDelayFrame.get_value(), self._play_replay)
+        else:
+            self.replayAfterId = None
+            self.replayPlayButton.config(text="Play")
+
+    def _close_replay(self):
+        if self.replayAfterId is not None:
+            self.guiProcess.after_cancel(self.replayAfterId)
+        self.replayWindow.destroy()
+        self.replay = None
+        self.latestAgentOperation = None
+        self.gridworldTilemap.set_interactionAllowed(True)
+        self._unfreeze_episodetime_parameters()
+        for button in [self.goButton, self.nextButton, self.replayButton]:
+            button.config(state=tk.NORMAL)
+
     def _toggle_operation_relevance(self, operation):
         #  This could also be implemented in check_flow_status in a similar way, but this way the stuff which must be computed at every check_flow_status call is minimized, since this function is only called after a checkbutton flip
         if self.operationFrames[operation].get_value():
@@ -585,10 +1027,12 @@ class GridworldSandbox:
     def _freeze_lifetime_parameters(self):
         for frame in self.lifetimeParameterFrames:
             frame.freeze()
+        self.replayButton.config(state=tk.DISABLED)
 
     def _unfreeze_lifetime_parameters(self):
         for frame in self.lifetimeParameterFrames:
             frame.unfreeze()
+        self.replayButton.config(state=tk.NORMAL)
 
     def _freeze_episodetime_parameters(self):
         self.discountFrame.freeze()
@@ -602,6 +1046,18 @@ class GridworldSandbox:
         self.saveButton.config(state=tk.NORMAL)
         self.resetButton.config(state=tk.NORMAL)
 
+    def _refresh_rewards(self):
+        """The environment stores the rewards of all cells in an array, which must follow each change of a reward frame.
+        """
+        if self.environment is not None:
+            self.environment.refresh_rewards()
+
+    def _specialize_agent(self):
+        """The agent picks its per-operation functions by the algorithm flags once, so it must be told when one of them changes.
+        """
+        if self.agent is not None:
+            self.agent.specialize()
+
     def _toggle_algorithm(self):
         for frame in self.parameterFramesDict.values():
             frame.unfreeze()
@@ -680,13 +1136,23 @@ class GridworldSandbox:
         else:
             self._warn_and_pause(self.WARNING_COLOR, self.iceFloorFrame)
 
-    def _plot(self):
-        _, axes = plt.subplots(2, figsize=(7, 9))
-        axes[0].plot(self.agent.get_episodeReturns())
+    def _plot(self, summary, episodeReturns, greedyReturns, stepReturns):
+        """:param dict summary: See ``Agent.get_run_summary``
+        :param list episodeReturns: Return of each episode
+        :param list[tuple] greedyReturns: (episode, return) of each evaluation of the greedy policy
+        :param list stepReturns: Return after each action
+        """
+        figure, axes = plt.subplots(2, figsize=(7, 9))
+        figure.suptitle(", ".join(f"{key}: {value}" for key, value in summary.items() if key != "Stop Reason")
+                        + f"\nStopped: {summary['Stop Reason'] or 'Operations Left exhausted'}")
+        axes[0].plot(episodeReturns, label="Training")
+        if greedyReturns:
+            axes[0].plot(*zip(*greedyReturns), marker=".", label="Greedy Policy")
+            axes[0].legend()
         axes[0].set(xlabel="Episode", ylabel="Return")
-        axes[1].plot(self.agent.get_stepReturns())
+        axes[1].plot(stepReturns)
         axes[1].set(xlabel="Action", ylabel="Return")
-        plt.savefig(self.PLOTS_PATH / f"{len(self.agent.get_stepReturns())}_Actions.png")
+        plt.savefig(self.PLOTS_PATH / f"{len(stepReturns)}_Actions.png")
         plt.show()
 
 
@@ -0,0 +1,154 @@
+from pathlib import Path
+
+import myFuncs
+from Agent import Agent
+from ConvergenceMonitor import ConvergenceMonitor
+from Environment import Environment
+from RandomStream import RandomStream
+from PlainVar import PlainVar
+from PolicyEvaluator import PolicyEvaluator
+from Tile import Tile
+
+
+class HeadlessSandbox:
+    """Builds ``Environment`` and ``Agent`` from the same yaml files as the ``GridworldSandbox``,
+    but without any GUI, so runs can be scripted and repeated at full speed.\n
+    Parameters are addressed by their GUI labels, f.e. "Learning Rate α". Their values are looked up in
+    ``worlds/default.yaml``, overwritten by the world file, by the given parameters and finally by the
+    settings of the chosen "Algorithm", just like the sandbox freezes them.
+    """
+    ROOT_PATH = Path(__file__).resolve().parent.parent  # independent of the working directory of the calling script
+    SAFEFILE_PATH = ROOT_PATH / "worlds"
+    ALGORITHMS_PATH = ROOT_PATH / "algorithms"
+
+    def __init__(self, world, parameters=None, straight=True, diagonal=False, idle=False, eventLog=None, tableStorage=None):
+        """Creates a ``HeadlessSandbox`` object along with its environment and agent.
+
+        :param str | Path | list world: Name of a file in ``worlds/``, path of a world yaml file or the world itself as matrix of yaml-conform ``Tile`` representations
+        :param dict | None parameters: {GUI label: value} overwriting those of the world file, may also contain "hWind" and "wWind"
+        :param bool straight: Use straight actions
+        :param bool diagonal: Use diagonal actions
+        :param bool idle: Use the idle action
+        :param EventLog | None eventLog: Passed to the ``Agent``
+        :param TableStorage | None tableStorage: Passed to the ``Agent``, must match the shape of the world and the actionspace
+        """
+        if isinstance(world, list):
+            parameters = {"world": world} | (parameters or {})
+            filepath = self.SAFEFILE_PATH / "default.yaml"
+        else:
+            filepath = Path(world)
+            if not filepath.is_file():
+                filepath = (self.SAFEFILE_PATH / filepath).with_suffix(".yaml")
+        self.parameters = self.get_parameters(filepath, parameters)
+        world = self.parameters["world"]
+        if not world:
+            raise ValueError(f"{filepath} does not contain a world")
+        self.H, self.W = len(world), len(world[0])
+        hWind = self.parameters["hWind"] or [0] * self.W
+        wWind = self.parameters["wWind"] or [0] * self.H
+        self.variables = {name: PlainVar(value) for name, value in self.parameters.items() if name not in ["world", "hWind", "wWind"]}
+        self.variables |= {"Current Return": PlainVar(0), "Current Episode": PlainVar(0)}
+        self.hWindVars = [PlainVar(value) for value in hWind]
+        self.wWindVars = [PlainVar(value) for value in wWind]
+        seed = self.parameters["Seed"]
+        agentRng, environmentRng = RandomStream.spawn(None if seed == -1 else seed, 2)  # same derivation as in the sandbox
+        self.environment = Environment(H=self.H, W=self.W,
+                                       hasIceFloorVar=self.variables["Ice Floor"],
+                                       isHtorusVar=self.variables["H-Torus"],
+                                       isWtorusVar=self.variables["W-Torus"],
+                                       hWindVars=self.hWindVars,
+                                       wWindVars=self.wWindVars,
+                                       rng=environmentRng)
+        self.environment.update(self.get_tileData())
+        self.agent = Agent(environment=self.environment,
+                           use_straightActions=straight,
+                           use_diagonalActions=diagonal,
+                           use_idleActions=idle,
+                           currentReturnVar=self.variables["Current Return"],
+                           currentEpisodeVar=self.variables["Current Episode"],
+                           learningRateVar=self.variables["Learning Rate α"],
+                           dynamicAlphaVar=self.variables["α = 1/count((S,A))"],
+                           discountVar=self.variables["Discount γ"],
+                           nStepVar=self.variables["n-Step n"],
+                           nPlanVar=self.variables["Dyna-Q n"],
+                           onPolicyVar=self.variables["On-Policy"],
+                           updateByExpectationVar=self.variables["Expectation Update"],
+                           behaviorEpsilonVar=self.variables["Exploration Rate ε"],
+                           behaviorEpsilonDecayRateVar=self.variables["ε-Decay Rate"],
+                           targetEpsilonVar=self.variables["Exploration Rate ε‌"],
+                           targetEpsilonDecayRateVar=self.variables["ε-Decay Rate‌"],
+                           decayEpsilonEpisodeWiseVar=self.variables["Decay ε Episode-wise"],
+                           initialActionvalueMean=self.parameters["Initial Q-Value Mean"],
+                           initialActionvalueSigma=self.parameters["Initial Q-Value Sigma"],
+                           rng=agentRng,
+                           eventLog=eventLog,
+                           convergenceMonitor=ConvergenceMonitor(stablePolicyEpisodesVar=self.variables["Stable Policy Episodes"],
+                                                                 QvalueChangeToleranceVar=self.variables["ΔQ Tolerance"],
+                                                                 plateauEpisodesVar=self.variables["Plateau Episodes"],
+                                                                 plateauToleranceVar=self.variables["Plateau Tolerance"]),
+                           policyEvaluator=PolicyEvaluator(evaluationIntervalVar=self.variables["Evaluate Greedy Every"]),
+                           explorationBonusVar=self.variables["Dyna-Q+ κ"],
+                           tableStorage=tableStorage)
+
+    @classmethod
+    def get_parameters(cls, filepath, parameters=None):
+        """Merges default, world file, given parameters and algorithm settings, in increasing priority.
+
+        :param Path filepath: Path of the world yaml file
+        :param dict | None parameters: {GUI label: value}
+        :return dict: {GUI label: value}, plus "world", "hWind" and "wWind"
+        """
+        merged = myFuncs.get_dict_from_yaml_file(cls.SAFEFILE_PATH / "default.yaml") | myFuncs.get_dict_from_yaml_file(filepath) | (parameters or {})
+        if merged["Algorithm"] != "Custom":
+            merged |= myFuncs.get_dict_from_yaml_file(cls.ALGORITHMS_PATH / f"{merged['Algorithm']}.yaml")
+        return merged
+
+    def get_tileData(self):
+        """Same as ``GridworldSandbox._sync_world_views``, but read from the world file instead of the ``Tilemap``.
+
+        :return list[list[dict]]: Matrix of keyword arguments for the ``Cell`` objects of the environment
+        """
+        return [[self.get_cellKwargs((h, w), tile) for w, tile in enumerate(row)] for h, row in enumerate(self.parameters["world"])]
+
+    def get_cellKwargs(self, position, tile):
+        """:param tuple position: (h, w) of the cell
+        :param dict tile: Yaml-conform ``Tile`` representation
+        :return dict: Keyword arguments for the ``Cell`` object of the environment
+        """
+        return {"position": position,
+                "arrivalRewardVar": self.variables["Reward " + tile["borderColor"].capitalize()],
+                **Tile.get_cell_kwargs(tile)}
+
+    def run(self, nOperations=None):
+        """Lets the agent operate until the budget is used up or the convergence monitor asks to stop.
+
+        :param int | None nOperations: Number of ``Agent.operate`` calls. If None, "Operations Left" is used.
+        :return list[float]: Returns of all episodes finished so far
+        """
+        for _ in range(self.parameters["Operations Left"] if nOperations is None else nOperations):
+            self.agent.operate()
+            if self.agent.get_stopReason() is not None:
+                break
+        return self.agent.get_episodeReturns()
+
+    def get_environment(self):
+        return self.environment
+
+    def get_agent(self):
+        return self.agent
+
+    def get_variable(self, name):
+        return self.variables[name]
+
+    def get_windVars(self):
+        """:return tuple[list[PlainVar], list[PlainVar]]: Wind variables of the columns and of the rows"""
+        return self.hWindVars, self.wWindVars
+
+
+if __name__ == "__main__":
+    sandbox = HeadlessSandbox("06_22_cliff_walking_4x12", {"Algorithm": "Q-Learning", "Seed": 0, "Exploration Rate ε": 0.1, "ε-Decay Rate": 1})
+    episodeReturns = sandbox.run(20000)
+    print(f"{len(episodeReturns)} episodes, last returns: {episodeReturns[-10:]}")
+    sandbox = HeadlessSandbox("06_22_cliff_walking_4x12", {"Algorithm": "Q-Learning", "Seed": 0, "Exploration Rate ε": 0.1, "ε-Decay Rate": 0.999, "Stable Policy Episodes": 20})
+    sandbox.run(100000)
+    print(sandbox.get_agent().get_run_summary())
@@ -0,0 +1,91 @@
+import tkinter as tk
+import numpy as np
+import math
+
+import myFuncs
+from Tile import Tile
+
+
+class Heatmap(tk.Canvas):
+    """Alternative to a value ``Tilemap`` for large worlds. Shows a whole value table
+    as a single colour-mapped ``tk.PhotoImage``, so each visualization costs one image
+    upload instead of a ``config`` call per ``Tile``.\n
+    Optionally draws the greedy policy as arrows on top, but only if the cells are
+    big enough for arrows to be readable.
+    """
+    COLORMAP = "RdYlGn"  # red for low and green for high values, just like the numerical change indication of Tiles
+    MIN_ARROW_CELL_SIZE = 12  # pixels
+
+    def __init__(self, master, H, W, *args, maxSize=200, drawGreedyArrows=False, **kwargs):
+        """Creates a ``Heatmap`` object.
+
+        :param master: Parent container.
+        :param int H: Height of the environment in Cells.
+        :param int W: Width  of the environment in Cells.
+        :param args: Additional arguments passed to the super().__init__ (tk.Canvas)
+        :param int maxSize: Maximum width and height of the image in pixels. Worlds with more cells than pixels are shown with a stride.
+        :param bool drawGreedyArrows: If True, greedy actions may be drawn as arrows by the draw_greedy_arrows method.
+        :param kwargs: Additional keyword arguments passed to the super().__init__ (tk.Canvas)
+        """
+        self.stride = math.ceil(max(H, W) / maxSize)  # cells per pixel, 1 unless the world is huge
+        self.shownShape = (math.ceil(H / self.stride), math.ceil(W / self.stride))
+        self.cellSize = max(1, maxSize // max(self.shownShape))  # pixels per shown cell
+        super().__init__(master, *args, width=self.shownShape[1] * self.cellSize, height=self.shownShape[0] * self.cellSize, highlightthickness=0, **kwargs)
+        self.origin = int(self.cget("borderwidth"))  # canvas coordinates start below the border
+        self.image = tk.PhotoImage(width=self.shownShape[1] * self.cellSize, height=self.shownShape[0] * self.cellSize)
+        self.create_image(self.origin, self.origin, anchor=tk.NW, image=self.image)
+        self.wallRgb = np.array(myFuncs.color_to_rgbTriple(Tile.WALL_COLOR), dtype=np.uint8)
+        self.arrowItems = None
+        self.arrowDirections = None
+        if drawGreedyArrows and self.stride == 1 and self.cellSize >= self.MIN_ARROW_CELL_SIZE:
+            self.arrowItems = [[self.create_line(0, 0, 0, 0, arrow=tk.LAST, width=max(1, self.cellSize // 8), state=tk.HIDDEN) for _ in range(W)] for _ in range(H)]
+            self.arrowDirections = np.zeros((H, W, 2), dtype=int)
+        self.agentItem = self.create_rectangle(0, 0, 0, 0, width=2, state=tk.HIDDEN)
+
+    def draw(self, values, vmin, vmax, wallMask=None):
+        """Replaces the image by a new one built from a value table in one vectorized pass.
+
+        :param np.ndarray values: Array of shape (H, W)
+        :param float vmin: Value mapped to the lowest color
+        :param float vmax: Value mapped to the highest color
+        :param np.ndarray | None wallMask: Boolean array of shape (H, W). True cells are drawn in the wall color.
+        """
+        rgb = myFuncs.values_to_rgb(values[::self.stride, ::self.stride], vmin, vmax, self.COLORMAP)
+        if wallMask is not None:
+            rgb[wallMask[::self.stride, ::self.stride]] = self.wallRgb
+        if self.cellSize > 1:
+            rgb = rgb.repeat(self.cellSize, axis=0).repeat(self.cellSize, axis=1)
+        self.image.configure(data=myFuncs.rgb_to_ppm(rgb), format="PPM")
+
+    def draw_greedy_arrows(self, directions):
+        """Updates the arrows of all cells whose greedy direction changed since the last call.
+        Does nothing if the cells are too small for arrows.
+
+        :param np.ndarray directions: Integer array of shape (H, W, 2), the sum of the greedy actions of each cell like in ``Tile.get_greedy_actions_representation``
+        """
+        if self.arrowItems is None:
+            return
+        for h, w in np.argwhere((directions != self.arrowDirections).any(axis=2)):
+            direction = (int(directions[h, w, 0]), int(directions[h, w, 1]))
+            if direction == (0, 0):  # idle or opposing greedy actions
+                self.itemconfig(self.arrowItems[h][w], state=tk.HIDDEN)
+                continue
+            hCenter, wCenter = self.origin + self.cellSize * (h + 0.5), self.origin + self.cellSize * (w + 0.5)
+            length = 0.4 * self.cellSize / math.hypot(*direction)
+            self.coords(self.arrowItems[h][w], wCenter - length * direction[1], hCenter - length * direction[0], wCenter + length * direction[1], hCenter + length * direction[0])
+            self.itemconfig(self.arrowItems[h][w], state=tk.NORMAL, fill=myFuncs.direction_to_hsvHexString(direction, hsvValue=Tile.DEFAULT_HSV_VALUE))
+        self.arrowDirections = directions.copy()
+
+    def set_agent(self, state, color):
+        """Frames the cell of the agent or hides the frame.
+
+        :param tuple | None state: Agent position. None hides the frame.
+        :param str color: tkinter color
+        """
+        if state is None:
+            self.itemconfig(self.agentItem, state=tk.HIDDEN)
+            return
+        size = self.cellSize / self.stride
+        h, w = state
+        self.coords(self.agentItem, self.origin + w * size, self.origin + h * size, self.origin + (w + 1) * size, self.origin + (h + 1) * size)
+        self.itemconfig(self.agentItem, state=tk.NORMAL, outline=color)
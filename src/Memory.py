@@ -17,14 +17,20 @@ class Memory(deque):
         self.agent = agent
         self.discountedRewardSum = 0
         self.lastForgottenState = None
+        self.stateCounts = {}  # number of memories of each state, its keys are the trace of the agent
 
     def memorize(self, state, action, reward):
         self.appendleft((state, action, reward))  # the higher the index, the older the memory
+        self.stateCounts[state] = self.stateCounts.get(state, 0) + 1
         self.discountedRewardSum *= self.agent.get_discount()
         self.discountedRewardSum += reward
 
     def forget_oldest_memory(self):
         self.lastForgottenState, _, reward = self.pop()
+        if self.stateCounts[self.lastForgottenState] > 1:
+            self.stateCounts[self.lastForgottenState] -= 1
+        else:
+            del self.stateCounts[self.lastForgottenState]
         self.discountedRewardSum -= cached_power(self.agent.get_discount(), len(self)) * reward  # len(self) here returns the original size minus one, because of the pop
 
     def yield_lastForgottenState(self):  # needed for trace visualization
@@ -32,6 +38,10 @@ class Memory(deque):
         self.lastForgottenState = None
         return state
 
+    def get_states(self):
+        """Returns the distinct states in memory without iterating over it. The view changes along with the memory."""
+        return self.stateCounts.keys()
+
     def get_oldest_memory(self):
         return self[-1]
 
@@ -0,0 +1,197 @@
+import sys
+import json
+import time
+import tracemalloc
+import tkinter as tk
+import numpy as np
+from collections import deque
+from pathlib import Path
+from types import FunctionType, ModuleType
+
+import myFuncs
+from Tile import Tile
+
+
+class MemoryReport:
+    """Accounts the bytes of every large data structure of a run, f.e. to find out what the RAM goes to
+    on large worlds or to track memory regressions between versions.\n
+    Each structure is measured by a deep size: ``sys.getsizeof`` summed over all objects reachable from it.
+    Objects shared between structures are counted only once, for the structure listed first, and references
+    to the agent, the environment and widget masters are not followed, so no structure swallows the others.
+    Numpy arrays count their buffer, views that of their base. Widgets only count their Python side,
+    the memory tk itself holds per widget is not visible from Python, which is why their number is reported as well.\n
+    If ``tracemalloc`` was started early enough, f.e. by ``MemoryReport.start_tracing``, the report also contains the
+    traced memory grouped by the source file that allocated it.
+    """
+    SUFFIX = ".json"
+    AGENT_STRUCTURES = ["Qvalues", "QvalueArray", "greedyActions", "maxQvalues", "QvalueSums", "model", "stateActionPairCounts",
+                        "visitedStateActionPairs", "visitedStateActionPairList", "lastVisitTimes", "stateArrivalTimes", "memory", "episodeReturns", "stepReturns", "actionHistory", "tableStorage"]
+    ENVIRONMENT_STRUCTURES = ["isWall", "isStart", "isGoal", "teleportSources", "teleportSinks", "rewardClasses", "arrivalRewards", "positionLists", "cells"]
+    CACHES = {"hsv_to_rgbHexString": myFuncs.hsv_to_rgbHexString,
+              "rgbHexString_to_hsv": myFuncs.rgbHexString_to_hsv,
+              "direction_to_hsvHexString": myFuncs.direction_to_hsvHexString,
+              "get_colormap_lut": myFuncs.get_colormap_lut,
+              "cached_power": myFuncs.cached_power,
+              "get_greedy_actions_representation": Tile.get_greedy_actions_representation}
+    SKIPPED_ATTRIBUTES = {"master", "agent", "environment"}  # back references, their targets are measured as structures of their own
+    N_TRACED_FILES = 15
+
+    def __init__(self, agent=None, environment=None, widgets=None):
+        """Creates a ``MemoryReport`` object. Nothing is measured until ``measure`` is called.
+
+        :param Agent | None agent: Agent whose tables are measured
+        :param Environment | None environment: Environment whose arrays are measured
+        :param dict | None widgets: {name: widget}, f.e. the ``Tilemap`` objects of the sandbox, each measured with all its children
+        """
+        self.agent = agent
+        self.environment = environment
+        self.widgets = {name: widget for name, widget in (widgets or {}).items() if widget is not None}
+
+    @staticmethod
+    def start_tracing():
+        """Starts ``tracemalloc``. Only allocations made afterwards are traced, and everything runs noticeably slower while tracing."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def measure(self):
+        """:return dict: json-conform report, sizes in bytes"""
+        seen = {id(self.agent), id(self.environment)}
+        structures = {}
+        if self.agent is not None:
+            for name in self.AGENT_STRUCTURES:
+                structures[f"Agent.{name}"] = self.get_deep_size(getattr(self.agent, name), seen)
+        if self.environment is not None:
+            for name in self.ENVIRONMENT_STRUCTURES:
+                structures[f"Environment.{name}"] = self.get_deep_size(getattr(self.environment, name), seen)
+        for name, widget in self.widgets.items():
+            structures[name] = self.get_deep_size(widget, seen)
+        report = {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                  "structures": structures,
+                  "total": sum(structure["bytes"] for structure in structures.values()),
+                  "cacheEntries": {name: function.cache_info().currsize for name, function in self.CACHES.items()},  # the cached values are hidden inside functools
+                  "tracemalloc": self._get_traced_memory()}
+        if self.environment is not None:
+            report["H"], report["W"] = self.environment.get_shape()
+        if self.agent is not None:
+            report["nActions"] = len(self.agent.get_actionspace())
+        return report
+
+    def save(self, filepath):
+        """Measures and writes the report as json.
+
+        :param Path | str filepath: Path of the file, ".json" suffix optional
+        :return dict: The report
+        """
+        report = self.measure()
+        filepath = Path(filepath).with_suffix(self.SUFFIX)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with filepath.open(mode="w") as file:
+            json.dump(report, file, indent=2)
+        return report
+
+    @classmethod
+    def get_deep_size(cls, obj, seen=None):
+        """Sums ``sys.getsizeof`` over all objects reachable from ``obj`` that are not in ``seen`` yet.
+
+        :param obj: Root object
+        :param set | None seen: Ids of objects already accounted for, extended by those reached here
+        :return dict: {"bytes": <int>, "objects": <int>, "widgets": <int>}
+        """
+        seen = set() if seen is None else seen
+        nBytes = nObjects = nWidgets = 0
+        stack = [obj]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen or isinstance(obj, (type, ModuleType, FunctionType)):
+                continue
+            seen.add(id(obj))
+            nObjects += 1
+            nBytes += sys.getsizeof(obj)
+            if isinstance(obj, (str, bytes, int, float, complex, bool)) or obj is None:
+                continue
+            if isinstance(obj, np.ndarray):
+                if obj.base is not None:  # views do not own their buffer
+                    stack.append(obj.base)
+                elif obj.dtype == object:
+                    stack.extend(obj.ravel())
+                continue
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+                stack.extend(obj)
+            if isinstance(obj, tk.Misc):
+                nWidgets += 1
+            attributes = getattr(obj, "__dict__", None)
+            if attributes is not None:
+                nBytes += sys.getsizeof(attributes)
+                stack.extend(value for name, value in attributes.items() if name not in cls.SKIPPED_ATTRIBUTES)
+            for name in getattr(type(obj), "__slots__", ()):
+                if name not in cls.SKIPPED_ATTRIBUTES and hasattr(obj, name):
+                    stack.append(getattr(obj, name))
+        return {"bytes": nBytes, "objects": nObjects, "widgets": nWidgets}
+
+    @classmethod
+    def _get_traced_memory(cls):
+        if not tracemalloc.is_tracing():
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        statistics = tracemalloc.take_snapshot().statistics("filename")[:cls.N_TRACED_FILES]
+        return {"current": current, "peak": peak,
+                "byFile": {Path(statistic.traceback[0].filename).name: statistic.size for statistic in statistics}}
+
+    @classmethod
+    def measure_scaling(cls, sizes, actionspaces=((True, False, False),), nOperations=1000, parameters=None):
+        """Measures the structures of headless runs on generated open worlds, to see how they scale with H, W and the number of actions.
+
+        :param list[tuple[int, int]] sizes: (H, W) of each world
+        :param list[tuple[bool, bool, bool]] actionspaces: (straight, diagonal, idle) of each actionspace
+        :param int nOperations: Number of operations each run takes before it is measured
+        :param dict | None parameters: {GUI label: value} passed to each ``HeadlessSandbox``
+        :return list[dict]: One report per combination, with additional bytes per state of each structure
+        """
+        from tempfile import TemporaryDirectory
+        from HeadlessSandbox import HeadlessSandbox
+        from WorldGenerator import WorldGenerator
+
+        reports = []
+        with TemporaryDirectory() as directory:
+            for H, W in sizes:
+                filepath = WorldGenerator(H, W, seed=0, wallDensity=0).save(Path(directory) / "world")
+                for straight, diagonal, idle in actionspaces:
+                    sandbox = HeadlessSandbox(filepath, {"Seed": 0} | (parameters or {}), straight=straight, diagonal=diagonal, idle=idle)
+                    sandbox.run(nOperations)
+                    report = cls(sandbox.get_agent(), sandbox.get_environment()).measure()
+                    report["bytesPerState"] = {name: structure["bytes"] / (H * W) for name, structure in report["structures"].items()}
+                    reports.append(report)
+        return reports
+
+
+if __name__ == "__main__":
+    import argparse
+    from HeadlessSandbox import HeadlessSandbox
+
+    parser = argparse.ArgumentParser(description="Writes the memory footprint of a headless run, or of runs on generated worlds of several sizes, as json.")
+    parser.add_argument("world", nargs="?", default="06_22_cliff_walking_4x12", help="World file of the single run")
+    parser.add_argument("--operations", type=int, default=10000)
+    parser.add_argument("--scaling", type=int, nargs="*", help="Square world sizes, f.e. 10 100 300. Measures those instead of the single run.")
+    parser.add_argument("--trace", action="store_true", help="Also trace allocations by file with tracemalloc")
+    parser.add_argument("--output", type=Path, default=HeadlessSandbox.ROOT_PATH / "reports" / "memory")
+    arguments = parser.parse_args()
+    if arguments.trace:
+        MemoryReport.start_tracing()
+    if arguments.scaling:
+        reports = MemoryReport.measure_scaling([(size, size) for size in arguments.scaling], [(True, False, False), (True, True, False), (True, True, True)], arguments.operations)
+        filepath = arguments.output.with_suffix(MemoryReport.SUFFIX)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with filepath.open(mode="w") as file:
+            json.dump(reports, file, indent=2)
+        for report in reports:
+            print(f"{report['H']}x{report['W']}, {report['nActions']} actions: {report['total'] / 2**20:.1f} MiB, "
+                  + ", ".join(f"{name} {perState:.0f}" for name, perState in sorted(report["bytesPerState"].items(), key=lambda item: -item[1])[:3]) + " bytes per state")
+    else:
+        sandbox = HeadlessSandbox(arguments.world)
+        sandbox.run(arguments.operations)
+        report = MemoryReport(sandbox.get_agent(), sandbox.get_environment()).save(arguments.output)
+        for name, structure in sorted(report["structures"].items(), key=lambda item: -item[1]["bytes"]):
+            print(f"{name:<35} {structure['bytes']:>12} bytes {structure['objects']:>10} objects")
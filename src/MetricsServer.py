@@ -0,0 +1,231 @@
+import io
+import json
+import math
+import time
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from PIL import Image
+
+import myFuncs
+from Heatmap import Heatmap
+from Tile import Tile
+
+
+class MetricsServer:
+    """Serves the progress of a ``HeadlessSandbox`` run over HTTP, for long runs on remote machines where
+    looking at the GUI is not practical. Routes:\n
+    - ``/status``: episode, actions, operations, current return, ε, α and operations per second as json
+    - ``/metrics``: the same in the Prometheus text format
+    - ``/curves``: episode returns and greedy returns as json, averaged into at most ``?points=`` points
+    - ``/heatmap.png``: the maximum Q-value of each state, colored like the greedy policy ``Heatmap`` of the GUI\n
+    The server runs in a daemon thread and reads the counters and variables the run maintains anyway, but only when
+    a request arrives, so the operations of the agent do not get any extra work. The reads are not synchronized with
+    the run either, a response may combine values of neighbouring operations, which does not matter for monitoring.
+    """
+    HOST = "127.0.0.1"  # not reachable from other machines, f.e. use ssh port forwarding
+    PORT = 8050
+    MAX_CURVE_POINTS = 500
+    MAX_IMAGE_SIZE = 400  # pixels
+    RATE_INTERVAL = 1.  # minimum seconds between two samples of the operation count
+    PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    METRICS = [("episode", "gauge", "Current episode", "episode"),  # (Prometheus name, type, help, key of the status)
+               ("actions_total", "counter", "Actions taken in the environment", "actions"),
+               ("operations_total", "counter", "Operations of the agent, including updates and planning", "operations"),
+               ("current_return", "gauge", "Return of the current episode so far", "currentReturn"),
+               ("epsilon", "gauge", "Exploration rate of the behavior policy", "epsilon"),
+               ("alpha", "gauge", "Constant learning rate, unused while alpha is count-based", "alpha"),
+               ("dynamic_alpha", "gauge", "1 if alpha = 1/count((S,A)), else 0", "dynamicAlpha"),
+               ("operations_per_second", "gauge", "Operations per second since the previous sample", "operationsPerSecond")]
+    METRIC_PREFIX = "gridworld_"
+
+    def __init__(self, sandbox, host=HOST, port=PORT):
+        """Creates a ``MetricsServer`` object. The server is started by ``start``.
+
+        :param HeadlessSandbox sandbox: The sandbox whose run is served
+        :param str host: Interface to listen on
+        :param int port: Port to listen on, 0 picks a free one
+        """
+        self.sandbox = sandbox
+        self.agent = sandbox.get_agent()
+        self.host = host
+        self.port = port
+        self.httpServer = None  # assigned by start
+        self.thread = None
+        self.lock = threading.Lock()  # requests are handled in parallel threads, but share the rate sample
+        self.sampleTime = None
+        self.sampleOperations = None
+        self.operationsPerSecond = 0.
+        self.routes = {"/status": (lambda query: self._encode_json(self.get_status()), "application/json"),
+                       "/metrics": (lambda query: self.get_prometheus_text().encode(), self.PROMETHEUS_CONTENT_TYPE),
+                       "/curves": (lambda query: self._encode_json(self.get_curves(int(query.get("points", [self.MAX_CURVE_POINTS])[0]))), "application/json"),
+                       "/heatmap.png": (lambda query: self.get_heatmap_png(), "image/png")}
+
+    def start(self):
+        """Starts serving in a daemon thread.
+
+        :return str: Base url of the server
+        """
+        self.sampleTime = time.perf_counter()
+        self.sampleOperations = self.agent.get_run_summary()["Operations"]
+        self.httpServer = ThreadingHTTPServer((self.host, self.port), self.RequestHandler)
+        self.httpServer.metricsServer = self
+        self.port = self.httpServer.server_address[1]
+        self.thread = threading.Thread(target=self.httpServer.serve_forever, daemon=True)
+        self.thread.start()
+        return self.get_url()
+
+    def close(self):
+        if self.httpServer is not None:
+            self.httpServer.shutdown()
+            self.httpServer.server_close()
+            self.thread.join()
+            self.httpServer = None
+
+    def get_status(self):
+        """:return dict: Current counters and parameters of the run"""
+        summary = self.agent.get_run_summary()
+        greedyReturns = self.agent.get_policyEvaluator().get_greedyReturns()
+        return {"episode": self.sandbox.get_variable("Current Episode").get(),
+                "episodesFinished": summary["Episodes"],
+                "actions": summary["Actions"],
+                "operations": summary["Operations"],
+                "currentReturn": self.sandbox.get_variable("Current Return").get(),
+                "epsilon": self.sandbox.get_variable("Exploration Rate ε").get(),
+                "alpha": self.sandbox.get_variable("Learning Rate α").get(),
+                "dynamicAlpha": int(self.sandbox.get_variable("α = 1/count((S,A))").get()),
+                "operationsPerSecond": self._sample_operationsPerSecond(summary["Operations"]),
+                "greedyReturn": self._to_json_float(greedyReturns[-1][1]) if greedyReturns else None,
+                "stopReason": summary["Stop Reason"]}
+
+    def _sample_operationsPerSecond(self, nOperations):
+        """Updates the rate if the latest sample is old enough, so frequent requests do not make it noisy."""
+        with self.lock:
+            now = time.perf_counter()
+            if now - self.sampleTime >= self.RATE_INTERVAL:
+                self.operationsPerSecond = (nOperations - self.sampleOperations) / (now - self.sampleTime)
+                self.sampleTime, self.sampleOperations = now, nOperations
+            return self.operationsPerSecond
+
+    def get_prometheus_text(self):
+        """:return str: The status in the Prometheus text exposition format"""
+        status = self.get_status()
+        lines = []
+        for name, metricType, description, key in self.METRICS:
+            lines += [f"# HELP {self.METRIC_PREFIX}{name} {description}",
+                      f"# TYPE {self.METRIC_PREFIX}{name} {metricType}",
+                      f"{self.METRIC_PREFIX}{name} {float(status[key])!r}"]
+        return "\n".join(lines) + "\n"
+
+    def get_curves(self, maxPoints=MAX_CURVE_POINTS):
+        """:param int maxPoints: Maximum number of points of each curve
+        :return dict: "episodeReturns" and "greedyReturns", each as "episodes" and "returns" lists. A point is the mean of consecutive episodes, placed at the last of them.
+        """
+        episodeReturns = self.agent.get_episodeReturns()[1:]  # the first entry is a placeholder
+        greedyReturns = list(self.agent.get_policyEvaluator().get_greedyReturns())
+        return {"episodeReturns": self.downsample(np.arange(1, len(episodeReturns) + 1), np.array(episodeReturns, dtype=float), maxPoints),
+                "greedyReturns": self.downsample(np.array([episode for episode, _ in greedyReturns], dtype=int),
+                                                 np.array([value for _, value in greedyReturns], dtype=float), maxPoints)}
+
+    @classmethod
+    def downsample(cls, episodes, values, maxPoints):
+        """Averages consecutive values into at most maxPoints bins of nearly equal size.
+
+        :param np.ndarray episodes: Episode of each value
+        :param np.ndarray values: Values of the same length
+        :param int maxPoints: Maximum number of bins
+        :return dict: "episodes" (last episode of each bin) and "returns" (mean of each bin)
+        """
+        if len(values) > maxPoints > 0:
+            edges = np.linspace(0, len(values), maxPoints + 1).astype(int)
+            values = np.add.reduceat(values, edges[:-1]) / np.diff(edges)
+            episodes = episodes[edges[1:] - 1]
+        return {"episodes": episodes.tolist(), "returns": [cls._to_json_float(value) for value in values.tolist()]}
+
+    def get_heatmap_png(self):
+        """:return bytes: PNG of the maximum Q-value of each state, walls in the wall color. Huge worlds are shown with a stride."""
+        Qvalues = self.agent.get_QvalueArray()
+        wallMask = self.sandbox.get_environment().get_wallMask()
+        H, W = wallMask.shape
+        stride = math.ceil(max(H, W) / self.MAX_IMAGE_SIZE)  # same scaling as the Heatmap
+        maxQvalues = Qvalues[::stride, ::stride].max(axis=2)
+        shownWallMask = wallMask[::stride, ::stride]
+        shownQvalues = maxQvalues[~shownWallMask]
+        vmin, vmax = (shownQvalues.min(), shownQvalues.max()) if shownQvalues.size else (0, 0)
+        rgb = myFuncs.values_to_rgb(maxQvalues, vmin, vmax, Heatmap.COLORMAP)
+        rgb[shownWallMask] = myFuncs.color_to_rgbTriple(Tile.WALL_COLOR)
+        cellSize = max(1, self.MAX_IMAGE_SIZE // max(maxQvalues.shape))
+        if cellSize > 1:
+            rgb = rgb.repeat(cellSize, axis=0).repeat(cellSize, axis=1)
+        file = io.BytesIO()
+        Image.fromarray(rgb).save(file, format="PNG")
+        return file.getvalue()
+
+    @staticmethod
+    def _to_json_float(value):
+        """json has no nan, f.e. the greedy return of a policy that never finishes"""
+        return None if math.isnan(value) else value
+
+    @staticmethod
+    def _encode_json(content):
+        return json.dumps(content, ensure_ascii=False).encode()
+
+    def respond(self, path):
+        """:param str path: Path of the request, including the query
+        :return tuple[int, str, bytes]: HTTP status, content type and body
+        """
+        url = urlsplit(path)
+        if url.path not in self.routes:
+            return 404, "application/json", self._encode_json({"routes": list(self.routes)})
+        get_body, contentType = self.routes[url.path]
+        try:
+            return 200, contentType, get_body(parse_qs(url.query))
+        except ValueError as error:  # f.e. points that are not an integer
+            return 400, "application/json", self._encode_json({"error": str(error)})
+
+    def get_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def get_port(self):
+        return self.port
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, contentType, body = self.server.metricsServer.respond(self.path)
+            self.send_response(status)
+            self.send_header("Content-Type", contentType)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # a scraper polling every few seconds would flood the output of the run
+
+
+if __name__ == "__main__":
+    import argparse
+    from HeadlessSandbox import HeadlessSandbox
+
+    parser = argparse.ArgumentParser(description="Trains a headless agent while serving its progress on localhost.")
+    parser.add_argument("world", nargs="?", default="06_22_cliff_walking_4x12")
+    parser.add_argument("--algorithm", default="Q-Learning")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--operations", type=int, help='Default: "Operations Left" of the world')
+    parser.add_argument("--port", type=int, default=MetricsServer.PORT)
+    parser.add_argument("--linger", action="store_true", help="Keep serving after the run until interrupted")
+    arguments = parser.parse_args()
+    sandbox = HeadlessSandbox(arguments.world, {"Algorithm": arguments.algorithm, "Seed": arguments.seed})
+    server = MetricsServer(sandbox, port=arguments.port)
+    url = server.start()
+    print(f"Serving {', '.join(url + route for route in server.routes)}")
+    startTime = time.time()
+    sandbox.run(arguments.operations)
+    print(f"{sandbox.get_agent().get_run_summary()} in {time.time() - startTime:.1f} s")
+    if arguments.linger:
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+    server.close()
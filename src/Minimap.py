@@ -0,0 +1,88 @@
+import tkinter as tk
+import math
+
+
+class Minimap(tk.Canvas):
+    """Overview of a whole gridworld for virtualized ``Tilemaps``.
+    The world is drawn as a single image with one pixel per cell (scaled to fit),
+    the section covered by the ``Viewport`` as a rectangle and the agent as a dot.
+    Clicking or dragging centers the viewport on the chosen cell.
+    """
+    VIEWPORT_COLOR = "#FF00FF"  # magenta
+    START_COLOR = "#8080FF"
+    GOAL_COLOR = "#00C000"
+
+    def __init__(self, master, viewport, *args, maxSize=200, **kwargs):
+        """Creates a ``Minimap`` object.
+
+        :param master: Parent container.
+        :param Viewport viewport: Viewport shown and controlled by this Minimap.
+        :param args: Additional arguments passed to the super().__init__ (tk.Canvas)
+        :param int maxSize: Maximum width and height of the Minimap in pixels.
+        :param kwargs: Additional keyword arguments passed to the super().__init__ (tk.Canvas)
+        """
+        self.viewport = viewport
+        H, W = viewport.H, viewport.W
+        if max(H, W) <= maxSize:
+            self.imageZoom = maxSize // max(H, W)
+            self.imageSubsample = 1
+        else:
+            self.imageZoom = 1
+            self.imageSubsample = math.ceil(max(H, W) / maxSize)
+        self.cellSize = self.imageZoom / self.imageSubsample  # in pixels
+        super().__init__(master, *args, width=math.ceil(W * self.cellSize), height=math.ceil(H * self.cellSize), highlightthickness=0, **kwargs)
+        self.origin = int(self.cget("borderwidth"))  # canvas coordinates start below the border
+        self.worldImage = tk.PhotoImage(width=W, height=H)
+        self.displayedImage = None  # reference must be kept, otherwise tk forgets the image
+        self.imageItem = self.create_image(self.origin, self.origin, anchor=tk.NW)
+        self.viewportItem = self.create_rectangle(0, 0, 0, 0, outline=self.VIEWPORT_COLOR, width=2)
+        self.agentItem = self.create_oval(0, 0, 0, 0, state=tk.HIDDEN, outline="")
+        for sequence in ["<Button-1>", "<B1-Motion>"]:
+            self.bind(sequence, lambda event: self.viewport.center_on(int((event.y - self.origin) / self.cellSize), int((event.x - self.origin) / self.cellSize)))
+        self.viewport.add_listener(self._update_viewport_rectangle)
+        self._update_viewport_rectangle()
+
+    def draw_world(self, colors):
+        """Redraws the world image in a single ``tk.PhotoImage.put`` call.
+
+        :param list[list[str]] colors: Matrix of hex colors, one per cell
+        """
+        self.worldImage.put(" ".join("{" + " ".join(row) + "}" for row in colors))
+        self._refresh_displayed_image()
+
+    def draw_cells(self, colors):
+        """Redraws single cells of the world image, f.e. those changed in the editor.
+
+        :param dict[tuple, str] colors: {position: hex color}
+        """
+        if not colors:
+            return
+        for (h, w), color in colors.items():
+            self.worldImage.put(color, to=(w, h))
+        self._refresh_displayed_image()
+
+    def _refresh_displayed_image(self):
+        if self.imageSubsample > 1:
+            self.displayedImage = self.worldImage.subsample(self.imageSubsample)
+        else:
+            self.displayedImage = self.worldImage.zoom(self.imageZoom)
+        self.itemconfig(self.imageItem, image=self.displayedImage)
+
+    def set_agent(self, state, color):
+        """Moves the agent dot to a cell or hides it.
+
+        :param tuple | None state: Agent position. None hides the dot.
+        :param str color: tkinter color
+        """
+        if state is None:
+            self.itemconfig(self.agentItem, state=tk.HIDDEN)
+            return
+        radius = max(self.cellSize, 3)  # stays visible on huge worlds
+        h, w = (self.origin + self.cellSize * (coordinate + 0.5) for coordinate in state)
+        self.coords(self.agentItem, w - radius, h - radius, w + radius, h + radius)
+        self.itemconfig(self.agentItem, state=tk.NORMAL, fill=color)
+
+    def _update_viewport_rectangle(self):
+        hOffset, wOffset = self.viewport.get_offset()
+        viewH, viewW = self.viewport.get_shape()
+        self.coords(self.viewportItem, *(self.origin + self.cellSize * coordinate for coordinate in (wOffset, hOffset, wOffset + viewW, hOffset + viewH)))
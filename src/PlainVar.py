@@ -0,0 +1,16 @@
+class PlainVar:
+    """Minimal stand-in for ``SafeVar`` outside of a GUI: holds a single value behind the same
+    ``get`` / ``set`` interface, so ``Agent`` and ``Environment`` can be run without ``tkinter``.
+    No checks, no traces.
+    """
+    def __init__(self, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"PlainVar({self.value!r})"
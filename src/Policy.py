@@ -1,8 +1,3 @@
-import random
-
-from myFuncs import evaluate
-
-
 class Policy:
     """Base Class for policies used by an ``Agent``.
     A policy object may be set as his behaviour- or his target policy.\n
@@ -11,16 +6,17 @@ class Policy:
     """
     def __init__(self, agent):
         self.agent = agent
+        self.rng = agent.get_rng()
 
     def give_greedy_action(self, state):
-        greedyActions = evaluate(self.agent.get_greedyActions(), state)
+        greedyActions = self.agent.get_greedyActions()[state]
         if len(greedyActions) == 1:  # use rng only if necessary
             return greedyActions[0]
         else:
-            return random.choice(greedyActions)
+            return self.rng.choice(greedyActions)
         
     def sample_random_action(self):
-        return random.choice(self.agent.get_actionspace())
+        return self.rng.choice(self.agent.get_actionspace())
         # We can use this one-liner ONLY BECAUSE in a gridworld, the actionspace does not depend on the state.
     
     def generate_action(self, state):
@@ -0,0 +1,129 @@
+import numpy as np
+
+
+class PolicyEvaluator:
+    """Computes the true expected return of the current greedy policy every few episodes, so progress can be
+    judged without the exploration noise of the training returns.\n
+    The greedy actions are read from a snapshot of the Q-values of the ``Agent``, ties are taken uniformly like
+    ``EpsilonGreedyPolicy`` does with ε = 0. Nothing is sampled and nothing of the agent is changed, so
+    evaluating neither shifts its random stream nor its counts, memory or ε.\n
+    As long as the policy and the world are deterministic along the way, the return of each start state is
+    computed exactly by following the policy, with repeated states detected as never ending loops.
+    As soon as ties of greedy actions or teleporters with several destinations make the outcome random,
+    all reachable states are evaluated at once by iterative policy evaluation, vectorized over all states.
+    The greedy return is the mean over the start states, each of which the ``Environment`` picks equally likely.
+    """
+    MAX_ITERATIONS = 10000
+    TOLERANCE = 1e-09
+
+    def __init__(self, evaluationIntervalVar):
+        """Creates a ``PolicyEvaluator`` object.
+
+        :param evaluationIntervalVar: Number of episodes between two evaluations, 0 disables evaluation
+        """
+        self.evaluationIntervalVar = evaluationIntervalVar
+        self.greedyReturns = []  # (episode, return) pairs
+
+    def check(self, agent, nEpisodes):
+        """Called by the ``Agent`` whenever an episode finished. Evaluates if the interval is due.
+
+        :param Agent agent: The learning agent
+        :param int nEpisodes: Number of episodes finished so far
+        """
+        interval = self.evaluationIntervalVar.get()
+        if interval and nEpisodes % interval == 0:
+            self.greedyReturns.append((nEpisodes, self.evaluate(agent)))
+
+    def evaluate(self, agent):
+        """:return float: Expected return of the greedy policy of the agent, nan if it does not finish with γ = 1 or no start exists"""
+        environment = agent.get_environment()
+        initialPositions = environment.get_initial_position_candidates()
+        if initialPositions == [None]:
+            return float("nan")
+        H, W = environment.get_shape()
+        self.discount = agent.get_discount()
+        Qvalues = agent.get_QvalueArray().reshape(H * W, -1)
+        self.isGreedy = Qvalues == Qvalues.max(axis=1, keepdims=True)  # frozen snapshot
+        self.destinations = np.stack([np.ravel_multi_index(np.moveaxis(environment.get_move_destinations(action), 2, 0), (H, W)).ravel()
+                                      for action in agent.get_actionspace()], axis=1)
+        self.arrivalRewards = environment.get_arrivalRewards().ravel().astype(float)
+        self.isTerminal = environment.isGoal.ravel()
+        self.isTeleportEntry = (environment.teleportSinks != 0).ravel()
+        self.teleportDestinations = {entry: np.array([h * W + w for h, w in environment.get_teleport_destination_candidates(divmod(int(entry), W))])
+                                     for entry in np.flatnonzero(self.isTeleportEntry)}
+        starts = [h * W + w for h, w in initialPositions]
+        values = self._roll_out(starts)
+        if values is None:
+            values = self._iterate(starts)
+        return float(np.mean(values))
+
+    def _roll_out(self, starts):
+        """Exact returns by following the policy, or None as soon as a random outcome is met."""
+        values = {}
+        for start in starts:
+            path = []
+            pathIndices = {}
+            state = start
+            while state not in values and state not in pathIndices and not self.isTerminal[state]:
+                greedyActions = np.flatnonzero(self.isGreedy[state])
+                if len(greedyActions) != 1:
+                    return None
+                successor = int(self.destinations[state, greedyActions[0]])
+                reward = self.arrivalRewards[successor]
+                if self.isTeleportEntry[successor]:
+                    if len(self.teleportDestinations[successor]) != 1:
+                        return None
+                    successor = int(self.teleportDestinations[successor][0])
+                    reward += self.arrivalRewards[successor]
+                pathIndices[state] = len(path)
+                path.append(reward)
+                state = successor
+            if state in values:
+                value = values[state]
+            elif self.isTerminal[state]:
+                value = 0.
+            else:  # the path entered a loop at state, which repeats forever
+                loopRewards = path[pathIndices[state]:]
+                loopReturn = sum(reward * self.discount ** i for i, reward in enumerate(loopRewards))
+                loopDiscount = self.discount ** len(loopRewards)
+                value = loopReturn / (1 - loopDiscount) if loopDiscount < 1 else (0. if not any(loopRewards) else float("nan"))
+            visitedStates = sorted(pathIndices, key=pathIndices.get)
+            for visitedState, reward in zip(reversed(visitedStates), reversed(path)):
+                value = reward + self.discount * value
+                values[visitedState] = value
+            if start not in values:  # start is terminal
+                values[start] = 0.
+        return [values[start] for start in starts]
+
+    def _iterate(self, starts):
+        """Iterative policy evaluation, only the states reachable from the starts need to converge."""
+        policy = self.isGreedy / self.isGreedy.sum(axis=1, keepdims=True)
+        isReachable = self._get_reachable_mask(starts)
+        values = np.zeros(len(policy))
+        for _ in range(self.MAX_ITERATIONS):
+            landingValues = self.arrivalRewards + self.discount * values
+            arrivalValues = landingValues.copy()
+            for entry, destinations in self.teleportDestinations.items():  # teleports land in a cell without teleporting again, even if it is an entry itself
+                arrivalValues[entry] = self.arrivalRewards[entry] + landingValues[destinations].mean()
+            newValues = (policy * arrivalValues[self.destinations]).sum(axis=1)
+            newValues[self.isTerminal] = 0
+            change = np.abs(newValues - values)[isReachable].max()
+            values = newValues
+            if change < self.TOLERANCE:
+                return values[starts]
+        return [float("nan")]  # does not finish, only possible with γ = 1
+
+    def _get_reachable_mask(self, starts):
+        isReachable = np.zeros(len(self.isGreedy), dtype=bool)
+        frontier = np.unique(starts)
+        while frontier.size:
+            isReachable[frontier] = True
+            frontier = frontier[~self.isTerminal[frontier]]
+            successors = np.unique(self.destinations[frontier][self.isGreedy[frontier]])
+            isEntry = self.isTeleportEntry[successors]
+            successors = np.concatenate([successors[~isEntry]] + [self.teleportDestinations[entry] for entry in successors[isEntry]])
+            frontier = np.unique(successors[~isReachable[successors]])
+        return isReachable
+
+    def get_greedyReturns(self):
+        return self.greedyReturns
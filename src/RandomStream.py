@@ -0,0 +1,112 @@
+import numpy as np
+
+
+class RandomStream:
+    """Seedable source of random numbers owned by exactly one ``Agent`` or ``Environment``.\n
+    Wraps a ``numpy.random.Generator`` and pre-draws blocks of uniforms and raw integers,
+    which the hot paths (ε-greedy selection, tie breaking, planning) then consume one by one
+    from a buffer. This avoids paying the overhead of a generator call for every single number.\n
+    Streams of the same run should be created together by the ``spawn`` class method, so that
+    they are reproducible from a single run seed but independent of each other.
+    """
+    BLOCK_SIZE = 4096
+    INTEGER_BOUND = np.iinfo(np.int64).max  # raw integers are reduced modulo the requested bound, the bias of that is negligible for any realistic bound
+    BLOCK_SPAWN_KEY = 2**32 - 1  # appended to the spawn key of the stream, so block substreams never coincide with streams of spawn
+
+    @classmethod
+    def spawn(cls, seed, n, **kwargs):
+        """Derives n independent streams deterministically from a single run seed.
+
+        :param int | None seed: Run seed. If None, fresh entropy is drawn from the OS.
+        :param int n: Number of streams.
+        :param kwargs: Additional keyword arguments passed to the constructor of each stream.
+        :return list[RandomStream]: Streams
+        """
+        return [cls(childSeed, **kwargs) for childSeed in np.random.SeedSequence(seed).spawn(n)]
+
+    def __init__(self, seed=None, blockSize=BLOCK_SIZE):
+        """Creates a ``RandomStream`` object.
+
+        :param int | np.random.SeedSequence | None seed: Anything accepted by ``numpy.random.default_rng``.
+        :param int blockSize: Number of uniforms/integers pre-drawn at once.
+        """
+        self.generator = np.random.default_rng(seed)
+        self.blockSize = blockSize
+        self.uniforms = []  # plain lists, since popping python floats from a list is way faster than indexing a numpy array
+        self.integers = []
+
+    def random(self):
+        """Returns a uniform sample from [0, 1)."""
+        if not self.uniforms:
+            self.uniforms = self.generator.random(self.blockSize).tolist()
+        return self.uniforms.pop()
+
+    def integer(self, bound):
+        """Returns a uniform sample from {0, ..., bound-1}."""
+        if not self.integers:
+            self.integers = self.generator.integers(self.INTEGER_BOUND, size=self.blockSize).tolist()
+        return self.integers.pop() % bound
+
+    def integer_array(self, bound, size):
+        """Returns the same samples as ``size`` calls of ``integer``, but taken from the buffer as a single array.
+
+        :param int bound: Exclusive upper bound
+        :param int size: Number of samples
+        :return np.ndarray: int64 samples in the order ``integer`` would return them
+        """
+        blocks = []
+        while size:
+            if not self.integers:
+                self.integers = self.generator.integers(self.INTEGER_BOUND, size=self.blockSize).tolist()
+            n = min(size, len(self.integers))
+            blocks.append(np.array(self.integers[:-n - 1:-1], dtype=np.int64))  # the last n, in popping order
+            del self.integers[-n:]
+            size -= n
+        return np.concatenate(blocks) % bound if blocks else np.empty(0, dtype=np.int64)
+
+    def take_uniforms(self):
+        """Hands the buffered uniforms over to a consumer outside of this stream, f.e. a compiled kernel, and empties the buffer.
+        If it is empty already, the next block is drawn instead. Like the buffer, the returned array is consumed from its end.
+
+        :return np.ndarray: float64 uniforms
+        """
+        if not self.uniforms:
+            return self.generator.random(self.blockSize)
+        uniforms, self.uniforms = np.array(self.uniforms, dtype=np.float64), []
+        return uniforms
+
+    def take_integers(self):
+        """Same as ``take_uniforms`` for the raw integers, which the consumer has to reduce modulo its bound like ``integer`` does.
+
+        :return np.ndarray: int64 raw integers
+        """
+        if not self.integers:
+            return self.generator.integers(self.INTEGER_BOUND, size=self.blockSize)
+        integers, self.integers = np.array(self.integers, dtype=np.int64), []
+        return integers
+
+    def choice(self, sequence):
+        """Returns a uniformly chosen element of a nonempty sequence."""
+        return sequence[self.integer(len(sequence))]
+
+    def normal(self, mean, sigma, size=None):
+        """Draws normally distributed values in a single vectorized call. Not buffered, since it is not used in hot paths."""
+        return self.generator.normal(mean, sigma, size)
+
+    def normal_block(self, iBlock, mean, sigma, size):
+        """Draws normally distributed values for block iBlock of a table that is filled lazily, from a substream derived
+        from the seed of this stream. So the values of a block neither depend on when it is drawn nor consume this stream.
+
+        :param int iBlock: Index of the block
+        :param float mean: Mean
+        :param float sigma: Standard deviation
+        :param tuple size: Shape of the block
+        :return np.ndarray: float64 values
+        """
+        seedSequence = self.generator.bit_generator.seed_seq
+        blockSeedSequence = np.random.SeedSequence(seedSequence.entropy, spawn_key=(*seedSequence.spawn_key, self.BLOCK_SPAWN_KEY, iBlock),
+                                                   pool_size=seedSequence.pool_size)
+        return np.random.default_rng(blockSeedSequence).normal(mean, sigma, size)
+
+    def get_generator(self):
+        return self.generator
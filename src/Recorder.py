@@ -0,0 +1,96 @@
+import multiprocessing
+import weakref
+from pathlib import Path
+from PIL import Image
+
+from FrameRenderer import FrameRenderer
+
+
+class Recorder:
+    """Records a run as PNG frames or as an animated GIF. The training loop only
+    captures lightweight snapshots (positions, trace colors and a copy of the Q-values),
+    which are rendered and saved by a ``FrameRenderer`` in a separate process,
+    so the agent keeps operating at headless speed.
+    """
+    FORMATS = ["GIF", "PNG"]
+    QUEUE_SIZE = 256  # snapshots. If the renderer falls behind, capture blocks instead of filling up the memory.
+
+    def __init__(self, H, W, actionspace, filepath, fileFormat="GIF", frameDuration=100, **rendererKwargs):
+        """Creates a ``Recorder`` object and starts its rendering process.
+
+        :param int H: Height of the environment in Cells.
+        :param int W: Width  of the environment in Cells.
+        :param list[tuple] actionspace: Actions of the agent, in the order of the last axis of its Q-value array
+        :param Path | str filepath: Path of the GIF file, or of the directory for the PNG frames
+        :param str fileFormat: One of ``Recorder.FORMATS``
+        :param int frameDuration: Display time of each GIF frame in milliseconds
+        :param rendererKwargs: Additional keyword arguments passed to the ``FrameRenderer``
+        """
+        if fileFormat not in self.FORMATS:
+            raise ValueError(f"fileFormat must be one of {self.FORMATS}, not {fileFormat}")
+        filepath = Path(filepath)
+        (filepath if fileFormat == "PNG" else filepath.parent).mkdir(parents=True, exist_ok=True)
+        context = multiprocessing.get_context("spawn")  # a forked child would inherit the tkinter state of the GUI
+        self.queue = context.Queue(maxsize=self.QUEUE_SIZE)
+        self.process = context.Process(target=self._render_and_save, args=(self.queue, H, W, actionspace, filepath, fileFormat, frameDuration, rendererKwargs))
+        self.process.start()
+        self.finalizer = weakref.finalize(self, self.queue.put, None)  # also runs at interpreter exit, before multiprocessing joins the rendering process
+        self.filepath = filepath
+        self.nFrames = 0
+
+    def set_world(self, world):
+        """Passes the current world to the renderer. Applies to all frames captured afterwards.
+
+        :param list[list[dict]] world: Matrix of yaml-conform ``Tile`` representations, like ``Tilemap.get_yaml_list`` returns
+        """
+        self.queue.put(("world", world))
+
+    def capture(self, state, Qvalues, targetAction, agentColors, traceColors=None, teleportJustUsed=None, windJustUsed=None):
+        """Takes a snapshot of everything a visualization shows and sends it to the renderer.
+
+        :param tuple | None state: Agent position
+        :param np.ndarray Qvalues: Q-value array of shape (H, W, A). Is copied, so the agent may continue changing it.
+        :param tuple | None targetAction: Action whose value map is marked
+        :param tuple[str, str] agentColors: Colors of the agent in the world and in the value maps
+        :param dict | None traceColors: {state: color} of the memory trace in the value maps
+        :param tuple | None teleportJustUsed: Position of the teleporter used by the last move
+        :param tuple | None windJustUsed: Position where the wind acted during the last move
+        """
+        snapshot = {"state": state,
+                    "Qvalues": Qvalues.copy(),
+                    "targetAction": targetAction,
+                    "agentColors": agentColors,
+                    "traceColors": traceColors or {},
+                    "teleportJustUsed": teleportJustUsed,
+                    "windJustUsed": windJustUsed}
+        self.queue.put(("frame", snapshot))
+        self.nFrames += 1
+
+    def close(self):
+        """Stops accepting snapshots. The rendering process finishes the remaining ones, saves the result and exits.
+        """
+        self.finalizer()
+
+    def join(self):
+        """Blocks until all captured frames are saved.
+        """
+        self.process.join()
+
+    @staticmethod
+    def _render_and_save(queue, H, W, actionspace, filepath, fileFormat, frameDuration, rendererKwargs):
+        renderer = FrameRenderer(H, W, actionspace, **rendererKwargs)
+        gifFrames = []
+        iFrame = 0
+        while (message := queue.get()) is not None:
+            kind, data = message
+            if kind == "world":
+                renderer.set_world(data)
+                continue
+            frame = renderer.render(data)
+            if fileFormat == "PNG":
+                frame.save(filepath / f"frame_{iFrame:06d}.png")
+            else:
+                gifFrames.append(frame.quantize(method=Image.Quantize.FASTOCTREE))  # a third of the memory of an rgb frame, and much faster than the default median cut
+            iFrame += 1
+        if gifFrames:
+            gifFrames[0].save(filepath, save_all=True, append_images=gifFrames[1:], duration=frameDuration, loop=0)
@@ -0,0 +1,130 @@
+import numpy as np
+import json
+from pathlib import Path
+
+from EventLog import EventLog
+
+
+class Replay:
+    """Reconstructs any step of a run recorded by an ``EventLog``.\n
+    Seeking loads the nearest keyframe and applies the logged Q-value deltas in
+    between, or applies the deltas directly if the target is closer to the current
+    step, in both directions. Offers the parts of the ``Agent`` and ``Environment``
+    interfaces that the visualization reads, so it can take their place while replaying.
+    """
+    def __init__(self, filepath):
+        """Creates a ``Replay`` object, reads all records and indexes the keyframes of a log file.
+
+        :param Path | str filepath: Path of the log file
+        """
+        with open(filepath, "rb") as file:
+            if file.read(len(EventLog.MAGIC)) != EventLog.MAGIC:
+                raise ValueError(f"{filepath} is not an event log")
+            headerSize = int(np.frombuffer(file.read(4), dtype=np.uint32)[0])
+            self.header = json.loads(file.read(headerSize))
+            self.shape = tuple(self.header["shape"])
+            self.operations = self.header["operations"]
+            self.actionspace = [tuple(action) for action in self.header["actionspace"]]
+            keyframeSize = int(np.prod(self.shape)) * 8
+            recordBlocks = []
+            self.keyframeOffsets = {}  # step -> file offset of the Q-value array
+            while tag := file.read(1):
+                if tag == EventLog.EVENT_TAG:
+                    nRecords = int(np.frombuffer(file.read(4), dtype=np.uint32)[0])
+                    recordBlocks.append(np.frombuffer(file.read(nRecords * EventLog.RECORD_DTYPE.itemsize), dtype=EventLog.RECORD_DTYPE))
+                elif tag == EventLog.KEYFRAME_TAG:
+                    step = int(np.frombuffer(file.read(8), dtype=np.uint64)[0])
+                    self.keyframeOffsets[step] = file.tell()
+                    file.seek(keyframeSize, 1)
+                else:
+                    raise ValueError(f"{filepath} is corrupted")
+        self.filepath = Path(filepath)
+        self.records = np.concatenate(recordBlocks) if recordBlocks else np.empty(0, dtype=EventLog.RECORD_DTYPE)
+        self.keyframeSteps = np.array(sorted(self.keyframeOffsets))
+        self.hasUpdate = self.records["updatedAction"] != EventLog.NONE
+        self.flatUpdateIndices = (self.records["updatedState"][:, 0].astype(np.intp) * self.shape[1] + self.records["updatedState"][:, 1]) * self.shape[2] + self.records["updatedAction"]
+        self.Qvalues = None
+        self.step = None  # number of records applied to self.Qvalues
+        self.seek(0)
+
+    def __len__(self):
+        return len(self.records)
+
+    def seek(self, step):
+        """Reconstructs the Q-values after the first ``step`` operations.
+
+        :param int step: Between 0 and ``len(self)``
+        """
+        step = min(max(int(step), 0), len(self))
+        nearestKeyframe = self.keyframeSteps[np.searchsorted(self.keyframeSteps, step, side="right") - 1]
+        if self.step is None or abs(step - self.step) > step - nearestKeyframe:
+            self.Qvalues = self._load_keyframe(nearestKeyframe)
+            self.step = nearestKeyframe
+        if step > self.step:
+            self._apply(self.step, step, "newQ", lastWins=True)
+        elif step < self.step:
+            self._apply(step, self.step, "oldQ", lastWins=False)
+        self.step = step
+
+    def get_step(self):
+        return self.step
+
+    def get_record(self):
+        """Returns the record of the operation that led to the current step, or None at step 0."""
+        return self.records[self.step - 1] if self.step else None
+
+    def get_operation(self):
+        record = self.get_record()
+        return None if record is None else self.operations[record["operation"]]
+
+    def get_header(self):
+        return self.header
+
+    def get_state(self):
+        return self._get_position("state")
+
+    def get_QvalueArray(self):
+        return self.Qvalues
+
+    def get_greedyMask(self):
+        return self.Qvalues == self.Qvalues.max(axis=2, keepdims=True)
+
+    def get_actionspace(self):
+        return self.actionspace
+
+    def get_targetAction(self):
+        record = self.get_record()
+        return None if record is None or record["targetAction"] == EventLog.NONE else self.actionspace[record["targetAction"]]
+
+    @property
+    def hasMadeExploratoryAction(self):
+        record = self.get_record()
+        return record is not None and bool(record["exploratory"])
+
+    def get_teleportJustUsed(self):
+        return self._get_position("teleportJustUsed")
+
+    def get_windJustUsed(self):
+        return self._get_position("windJustUsed")
+
+    def _get_position(self, field):
+        record = self.get_record()
+        if record is None or record[field][0] == EventLog.NONE:
+            return None
+        return int(record[field][0]), int(record[field][1])
+
+    def _load_keyframe(self, step):
+        with open(self.filepath, "rb") as file:
+            return np.fromfile(file, dtype=np.float64, count=int(np.prod(self.shape)), offset=self.keyframeOffsets[step]).reshape(self.shape)
+
+    def _apply(self, start, stop, field, lastWins):
+        """Writes the old or new Q-values of the records in [start, stop) in one vectorized assignment.
+        Forward, the last update of each pair wins, backward the first one.
+        """
+        mask = self.hasUpdate[start:stop]
+        indices = self.flatUpdateIndices[start:stop][mask]
+        values = self.records[field][start:stop][mask]
+        if lastWins:
+            indices, values = indices[::-1], values[::-1]
+        uniqueIndices, iFirst = np.unique(indices, return_index=True)
+        self.Qvalues.reshape(-1)[uniqueIndices] = values[iFirst]
@@ -0,0 +1,351 @@
+import numpy as np
+
+from myFuncs import cached_power
+
+try:
+    import numba
+except ImportError:  # optional, without it the kernel only runs uncompiled, which is merely good for validating it
+    numba = None
+
+_compile = numba.njit(cache=True) if numba is not None else (lambda function: function)
+
+# fields of the state arrays that survive between calls of the kernel
+_STATE, _TARGET_ACTION, _IS_FINISHED, _MEMORY_START, _MEMORY_END, _N_UNIFORMS, _N_INTEGERS, _N_ENVIRONMENT_INTEGERS, _N_ACTIONS_TAKEN = range(9)
+_BEHAVIOR_EPSILON, _TARGET_EPSILON, _LEARNING_RATE, _TARGET_VALUE, _DISCOUNTED_REWARD_SUM, _CURRENT_RETURN = range(6)  # rewards may be fractional, so the return is a float
+_MIN_BUFFERED = 4  # random numbers one operation may consume at most from each buffer
+_MIN_EPSILON = 1e-04  # same floor as in EpsilonGreedyPolicy.decay_epsilon
+_NONE = -1
+
+
+class StepKernel:
+    """Runs whole episodes of tabular TD control inside one compiled function, for headless runs that only need
+    the learned Q-values and the returns. Covers SARSA, Q-learning, Expected SARSA and n-step (including Monte Carlo),
+    on- and off-policy, with constant or dynamic α and step- or episode-wise ε-decay. Planning, stopping criteria,
+    greedy evaluations, event logs and table storages are not covered, runs using them fall back to the ``Agent``.\n
+    The kernel takes over a freshly built ``HeadlessSandbox``: its initial Q-values, its tabulated dynamics and the
+    random streams of agent and environment. It replays the ``Agent`` operation by operation, consuming the same
+    random numbers in the same order and computing every float in the same order, so it reproduces a run of the
+    ``Agent`` with the same seed exactly, which ``validate`` checks. Whenever a random buffer runs low or the memory
+    outgrows its arrays, the kernel returns, the buffers are refilled in Python and it continues where it left off.\n
+    The kernel is compiled by ``numba`` if it is installed. Otherwise ``run`` falls back to the ``Agent``, since the
+    uncompiled kernel is slower than the agent itself. The sandbox must not be used anymore once the kernel took over.
+    """
+    IS_COMPILED = numba is not None
+    N_DISCOUNT_POWERS = 64  # initial number of precomputed powers of γ, more are added if the memory grows beyond
+
+    def __init__(self, sandbox, useKernel=None):
+        """Creates a ``StepKernel`` object, which takes over the sandbox right away if the kernel is used.
+
+        :param HeadlessSandbox sandbox: Sandbox whose agent has not operated yet
+        :param bool | None useKernel: If None, the kernel is used if it is compiled and the run is supported.
+            True uses it even uncompiled, f.e. to validate it. False always uses the ``Agent``.
+        """
+        self.sandbox = sandbox
+        self.fallbackReason = self.get_unsupported_reason(sandbox)
+        self.useKernel = (self.IS_COMPILED and self.fallbackReason is None) if useKernel is None else useKernel
+        if self.useKernel and self.fallbackReason is not None:
+            raise ValueError(f"The kernel does not support this run: {self.fallbackReason}")
+        self.episodeReturns = []
+        if not self.useKernel:
+            return
+        agent = sandbox.get_agent()
+        environment = sandbox.get_environment()
+        if agent.get_run_summary()["Operations"]:
+            raise ValueError("The kernel can only take over an agent that has not operated yet")
+        self.H, self.W = environment.get_shape()
+        self.nActions = len(agent.get_actionspace())
+        self._tabulate_environment(environment, agent.get_actionspace())
+        self.Qvalues = agent.get_QvalueArray().reshape(self.H * self.W, self.nActions).copy()
+        self.QvalueSums = np.array([sum(Qvalues) for Qvalues in self.Qvalues.tolist()], dtype=np.float64)  # summed in actionspace order and then maintained incrementally, like the agent does
+        self.counts = np.zeros((self.H * self.W, self.nActions), dtype=np.int64)
+        self.nStep = sandbox.get_variable("n-Step n").get()
+        self.discount = sandbox.get_variable("Discount γ").get()
+        self.discountPowers = np.array([cached_power(self.discount, k) for k in range(max(self.nStep + 1, self.N_DISCOUNT_POWERS))], dtype=np.float64)
+        self.integerState = np.zeros(9, dtype=np.int64)
+        self.integerState[[_STATE, _TARGET_ACTION]] = _NONE
+        self.floatState = np.array([sandbox.get_variable("Exploration Rate ε").get(), sandbox.get_variable("Exploration Rate ε‌").get(),
+                                    sandbox.get_variable("Learning Rate α").get(), 0., 0., 0.], dtype=np.float64)
+        self.memoryStates = np.zeros(2 * max(self.nStep, 1), dtype=np.int64)
+        self.memoryActions = np.zeros_like(self.memoryStates)
+        self.memoryRewards = np.zeros(len(self.memoryStates), dtype=np.float64)
+        self.agentRng = agent.get_rng()
+        self.environmentRng = environment.get_rng()
+        self.uniforms = np.empty(0, dtype=np.float64)
+        self.integers = np.empty(0, dtype=np.int64)
+        self.environmentIntegers = np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def get_unsupported_reason(sandbox):
+        """:return str | None: Why the kernel cannot reproduce the run of the sandbox, None if it can"""
+        if sandbox.get_agent().get_eventLog() is not None:
+            return "event log"
+        if sandbox.get_agent().get_tableStorage() is not None:
+            return "table storage"
+        for name in ["Dyna-Q n", "Stable Policy Episodes", "ΔQ Tolerance", "Plateau Episodes", "Evaluate Greedy Every"]:
+            if sandbox.get_variable(name).get():
+                return name
+        return None
+
+    def _tabulate_environment(self, environment, actionspace):
+        """Same tables as ``BatchAgent._tabulate_environment``, states are flat indices h*W + w."""
+        flat = lambda position: position[0] * self.W + position[1]
+        self.destinations = np.stack([np.ravel_multi_index(np.moveaxis(environment.get_move_destinations(action), 2, 0), (self.H, self.W)).ravel()
+                                      for action in actionspace], axis=1).astype(np.int64)
+        self.arrivalRewards = environment.get_arrivalRewards().ravel().astype(np.float64)
+        self.isTerminal = environment.isGoal.ravel().copy()
+        teleportCandidates = [[flat(candidate) for candidate in environment.get_teleport_destination_candidates(divmod(state, self.W))] if environment.teleportSinks.flat[state] else []
+                              for state in range(self.H * self.W)]
+        self.nTeleportCandidates = np.array([len(candidates) for candidates in teleportCandidates], dtype=np.int64)
+        self.teleportCandidates = np.zeros((self.H * self.W, max(1, self.nTeleportCandidates.max())), dtype=np.int64)
+        for state, candidates in enumerate(teleportCandidates):
+            self.teleportCandidates[state, :len(candidates)] = candidates
+        initialPositions = environment.get_initial_position_candidates()
+        if initialPositions == [None]:
+            raise RuntimeError("No Starting Point found")
+        self.initialStates = np.array([flat(position) for position in initialPositions], dtype=np.int64)
+
+    def run(self, nEpisodes):
+        """Runs the given number of further episodes.
+
+        :param int nEpisodes: Number of episodes
+        :return tuple[np.ndarray, list]: Q-values of shape (H, W, number of actions) and the returns of all episodes finished so far
+        """
+        if not self.useKernel:
+            agent = self.sandbox.get_agent()
+            nFinished = len(agent.get_episodeReturns()) + nEpisodes  # the agent starts its list with a 0
+            while len(agent.get_episodeReturns()) < nFinished:
+                agent.operate()
+            return agent.get_QvalueArray(), agent.get_episodeReturns()[1:]
+        episodeReturns = np.zeros(nEpisodes, dtype=np.float64)
+        nFinished = 0
+        while nFinished < nEpisodes:
+            self._refill()
+            nFinished += _run_episodes(nEpisodes - nFinished, episodeReturns[nFinished:], self.Qvalues, self.QvalueSums, self.counts,
+                                       self.destinations, self.arrivalRewards, self.isTerminal, self.teleportCandidates, self.nTeleportCandidates, self.initialStates,
+                                       self.nStep, self.sandbox.get_variable("α = 1/count((S,A))").get(), self.sandbox.get_variable("On-Policy").get(),
+                                       self.sandbox.get_variable("Expectation Update").get(), self.discount,
+                                       self.sandbox.get_variable("ε-Decay Rate").get(), self.sandbox.get_variable("ε-Decay Rate‌").get(),
+                                       self.sandbox.get_variable("Decay ε Episode-wise").get(),
+                                       self.integerState, self.floatState, self.memoryStates, self.memoryActions, self.memoryRewards,
+                                       self.discountPowers, self.uniforms, self.integers, self.environmentIntegers)
+        self.episodeReturns += episodeReturns.tolist()
+        return self.get_QvalueArray(), self.episodeReturns
+
+    def _refill(self):
+        """Tops up the random buffers and makes room in the memory, so the kernel can go on for a while.
+        New blocks go in front of the remaining numbers, since the kernel consumes them from the end, like ``RandomStream`` does.
+        """
+        state = self.integerState
+        for name, counterIndex, take in [("uniforms", _N_UNIFORMS, self.agentRng.take_uniforms),
+                                         ("integers", _N_INTEGERS, self.agentRng.take_integers),
+                                         ("environmentIntegers", _N_ENVIRONMENT_INTEGERS, self.environmentRng.take_integers)]:
+            if state[counterIndex] < _MIN_BUFFERED:
+                buffer = np.concatenate((take(), getattr(self, name)[:state[counterIndex]]))
+                setattr(self, name, buffer)
+                state[counterIndex] = len(buffer)
+        memorySize = state[_MEMORY_END] - state[_MEMORY_START]
+        if memorySize >= len(self.memoryStates):  # Monte Carlo memorizes whole episodes
+            capacity = 2 * memorySize
+            for name in ["memoryStates", "memoryActions", "memoryRewards"]:
+                memory = np.zeros(capacity, dtype=getattr(self, name).dtype)
+                memory[:memorySize] = getattr(self, name)[state[_MEMORY_START]:state[_MEMORY_END]]
+                setattr(self, name, memory)
+            state[_MEMORY_START], state[_MEMORY_END] = 0, memorySize
+        if memorySize >= len(self.discountPowers):
+            self.discountPowers = np.array([cached_power(self.discount, k) for k in range(2 * memorySize)], dtype=np.float64)
+
+    def get_QvalueArray(self):
+        return self.Qvalues.reshape(self.H, self.W, self.nActions) if self.useKernel else self.sandbox.get_agent().get_QvalueArray()
+
+    def get_nActionsTaken(self):
+        return int(self.integerState[_N_ACTIONS_TAKEN]) if self.useKernel else self.sandbox.get_agent().get_run_summary()["Actions"]
+
+    def get_fallbackReason(self):
+        """:return str | None: Why the run is not supported by the kernel, None if it is"""
+        return self.fallbackReason
+
+    @classmethod
+    def validate(cls, world, parameters, nEpisodes):
+        """Runs the kernel, compiled or not, and the ``Agent`` with the same seed and compares their outcomes.
+
+        :param str | Path world: See ``HeadlessSandbox``
+        :param dict parameters: See ``HeadlessSandbox``, should contain a seed other than -1
+        :param int nEpisodes: Number of episodes
+        :return dict: Whether the returns are equal and the largest difference of the Q-values, 0 if bit-identical
+        """
+        from HeadlessSandbox import HeadlessSandbox
+
+        referenceQvalues, referenceReturns = cls(HeadlessSandbox(world, parameters), useKernel=False).run(nEpisodes)
+        Qvalues, episodeReturns = cls(HeadlessSandbox(world, parameters), useKernel=True).run(nEpisodes)
+        return {"returnsEqual": list(referenceReturns) == episodeReturns,
+                "maxQvalueDifference": float(np.abs(referenceQvalues - Qvalues).max())}
+
+
+@_compile
+def _run_episodes(nEpisodes, episodeReturns, Qvalues, QvalueSums, counts, destinations, arrivalRewards, isTerminal, teleportCandidates, nTeleportCandidates, initialStates,
+                  nStep, isDynamicAlpha, isOnPolicy, isExpectationUpdate, discount, behaviorEpsilonDecayRate, targetEpsilonDecayRate, decayEpsilonEpisodeWise,
+                  integerState, floatState, memoryStates, memoryActions, memoryRewards, discountPowers, uniforms, integers, environmentIntegers):
+    """Follows ``Agent._operate`` operation by operation until nEpisodes are finished or a buffer needs to be refilled.
+
+    :return int: Number of episodes finished, their returns are written to episodeReturns
+    """
+    nFinished = 0
+    while nFinished < nEpisodes:
+        memorySize = integerState[_MEMORY_END] - integerState[_MEMORY_START]
+        if (integerState[_N_UNIFORMS] < _MIN_BUFFERED or integerState[_N_INTEGERS] < _MIN_BUFFERED or integerState[_N_ENVIRONMENT_INTEGERS] < _MIN_BUFFERED
+                or memorySize >= len(memoryStates) or memorySize >= len(discountPowers)):
+            return nFinished
+        if memorySize >= nStep >= 1 or (integerState[_IS_FINISHED] and memorySize):  # Experience Update
+            start = integerState[_MEMORY_START]
+            state, action = memoryStates[start], memoryActions[start]
+            Qbefore = Qvalues[state, action]
+            returnEstimate = floatState[_DISCOUNTED_REWARD_SUM] + discountPowers[nStep] * floatState[_TARGET_VALUE]
+            TD_error = returnEstimate - Qbefore
+            if isDynamicAlpha:
+                counts[state, action] += 1
+                floatState[_LEARNING_RATE] = 1 / counts[state, action]
+            _set_Q(Qvalues, QvalueSums, state, action, Qbefore + floatState[_LEARNING_RATE] * TD_error)
+            integerState[_MEMORY_START] += 1  # forget the oldest memory
+            floatState[_DISCOUNTED_REWARD_SUM] -= discountPowers[memorySize - 1] * memoryRewards[start]
+        elif integerState[_IS_FINISHED]:  # Episode Finish
+            episodeReturns[nFinished] = floatState[_CURRENT_RETURN]
+            nFinished += 1
+            integerState[_IS_FINISHED] = False
+            integerState[_STATE] = _NONE
+        elif integerState[_STATE] == _NONE:  # Episode Start
+            integerState[_TARGET_ACTION] = _NONE
+            floatState[_CURRENT_RETURN] = 0.
+            integerState[_STATE] = initialStates[_draw_integer(environmentIntegers, integerState, _N_ENVIRONMENT_INTEGERS, len(initialStates))]
+        else:  # Action Taken
+            state = integerState[_STATE]
+            if isOnPolicy and integerState[_TARGET_ACTION] != _NONE:
+                action = integerState[_TARGET_ACTION]
+            else:
+                action = _generate_action(Qvalues, state, floatState[_BEHAVIOR_EPSILON], uniforms, integers, integerState)
+            successorState = destinations[state, action]
+            reward = arrivalRewards[successorState]
+            if nTeleportCandidates[successorState]:
+                successorState = teleportCandidates[successorState, _draw_integer(environmentIntegers, integerState, _N_ENVIRONMENT_INTEGERS, nTeleportCandidates[successorState])]
+                reward += arrivalRewards[successorState]
+            isFinished = isTerminal[successorState]
+            integerState[_IS_FINISHED] = isFinished
+            floatState[_CURRENT_RETURN] += reward
+            integerState[_N_ACTIONS_TAKEN] += 1
+            if integerState[_MEMORY_END] == len(memoryStates):  # move the memory to the front, there is room since it is not full
+                start = integerState[_MEMORY_START]
+                memoryStates[:memorySize] = memoryStates[start:start + memorySize].copy()
+                memoryActions[:memorySize] = memoryActions[start:start + memorySize].copy()
+                memoryRewards[:memorySize] = memoryRewards[start:start + memorySize].copy()
+                integerState[_MEMORY_START], integerState[_MEMORY_END] = 0, memorySize
+            end = integerState[_MEMORY_END]  # memorize
+            memoryStates[end], memoryActions[end], memoryRewards[end] = state, action, reward
+            integerState[_MEMORY_END] += 1
+            floatState[_DISCOUNTED_REWARD_SUM] = floatState[_DISCOUNTED_REWARD_SUM] * discount + reward
+            integerState[_STATE] = successorState
+            if isFinished:  # generate the target
+                integerState[_TARGET_ACTION] = _NONE
+                floatState[_TARGET_VALUE] = 0.
+            else:
+                epsilon = floatState[_BEHAVIOR_EPSILON] if isOnPolicy else floatState[_TARGET_EPSILON]
+                if isExpectationUpdate:
+                    integerState[_TARGET_ACTION] = _NONE
+                    floatState[_TARGET_VALUE] = _get_expected_Qvalue(Qvalues, QvalueSums, successorState, epsilon)
+                else:
+                    targetAction = _generate_action(Qvalues, successorState, epsilon, uniforms, integers, integerState)
+                    integerState[_TARGET_ACTION] = targetAction
+                    floatState[_TARGET_VALUE] = Qvalues[successorState, targetAction]
+            if not decayEpsilonEpisodeWise or isFinished:
+                floatState[_BEHAVIOR_EPSILON] = _decay(floatState[_BEHAVIOR_EPSILON], behaviorEpsilonDecayRate)
+                floatState[_TARGET_EPSILON] = _decay(floatState[_TARGET_EPSILON], targetEpsilonDecayRate)
+    return nFinished
+
+
+@_compile
+def _draw_integer(buffer, integerState, counterIndex, bound):
+    """``RandomStream.integer`` on a handed over buffer."""
+    integerState[counterIndex] -= 1
+    return buffer[integerState[counterIndex]] % bound
+
+
+@_compile
+def _generate_action(Qvalues, state, epsilon, uniforms, integers, integerState):
+    """``EpsilonGreedyPolicy.generate_action``, ties between greedy actions are broken in actionspace order like the ``Agent`` lists them."""
+    nActions = Qvalues.shape[1]
+    if epsilon:
+        integerState[_N_UNIFORMS] -= 1
+        if uniforms[integerState[_N_UNIFORMS]] < epsilon:
+            return _draw_integer(integers, integerState, _N_INTEGERS, nActions)
+    maxQvalue = Qvalues[state].max()
+    nGreedy = 0
+    for action in range(nActions):
+        nGreedy += Qvalues[state, action] == maxQvalue
+    iGreedy = 0 if nGreedy == 1 else _draw_integer(integers, integerState, _N_INTEGERS, nGreedy)
+    for action in range(nActions):
+        if Qvalues[state, action] == maxQvalue:
+            if iGreedy == 0:
+                return action
+            iGreedy -= 1
+    return _NONE  # unreachable
+
+
+@_compile
+def _get_expected_Qvalue(Qvalues, QvalueSums, state, epsilon):
+    """``EpsilonGreedyPolicy.get_expected_actionvalue``"""
+    greedyMean = Qvalues[state].max()
+    if epsilon:
+        return epsilon * (QvalueSums[state] / Qvalues.shape[1]) + (1 - epsilon) * greedyMean
+    return greedyMean
+
+
+@_compile
+def _set_Q(Qvalues, QvalueSums, state, action, value):
+    """``Agent._set_Q``, including when the agent rescans the sum of a state instead of updating it."""
+    oldValue = Qvalues[state, action]
+    QvalueSums[state] += value - oldValue
+    maxQvalue = Qvalues[state].max()
+    nGreedy = 0
+    for otherAction in range(Qvalues.shape[1]):
+        nGreedy += Qvalues[state, otherAction] == maxQvalue
+    Qvalues[state, action] = value
+    if value < maxQvalue and oldValue == maxQvalue and nGreedy == 1:  # the maximum decreased
+        QvalueSum = 0.
+        for otherAction in range(Qvalues.shape[1]):
+            QvalueSum += Qvalues[state, otherAction]
+        QvalueSums[state] = QvalueSum
+
+
+@_compile
+def _decay(epsilon, decayRate):
+    """``EpsilonGreedyPolicy.decay_epsilon``"""
+    newEpsilon = epsilon * decayRate
+    return 0. if newEpsilon < _MIN_EPSILON else newEpsilon
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from HeadlessSandbox import HeadlessSandbox
+
+    parser = argparse.ArgumentParser(description="Validates the step kernel against the agent by seed, then measures its speed.")
+    parser.add_argument("world", nargs="?", default="06_22_cliff_walking_4x12")
+    parser.add_argument("--episodes", type=int, default=300, help="Episodes of each validation run")
+    parser.add_argument("--benchmark-episodes", type=int, default=100000)
+    arguments = parser.parse_args()
+    settings = {"Q-Learning": {"Algorithm": "Q-Learning"},
+                "SARSA": {"Algorithm": "SARSA"},
+                "Expected SARSA": {"Algorithm": "Expected SARSA"},
+                "10-Step SARSA": {"Algorithm": "10-Step SARSA"},
+                "Every-Visit MC, γ = 0.9": {"Algorithm": "Every-Visit-MC", "Discount γ": 0.9},
+                "Dynamic α, episode-wise decay": {"Algorithm": "Custom", "α = 1/count((S,A))": True, "Decay ε Episode-wise": True, "ε-Decay Rate": 0.99},
+                "Q-Learning, fractional rewards": {"Algorithm": "Q-Learning", "Reward Grey": -0.5, "Reward Red": -100.25}}
+    print(f"numba {'found, the kernel is compiled' if StepKernel.IS_COMPILED else 'not found, the kernel runs uncompiled'}")
+    for name, parameters in settings.items():
+        print(f"{name:<30}", StepKernel.validate(arguments.world, {"Seed": 0, "Initial Q-Value Sigma": 0} | parameters, arguments.episodes))
+    if StepKernel.IS_COMPILED:
+        kernel = StepKernel(HeadlessSandbox(arguments.world, {"Seed": 0, "Algorithm": "Q-Learning"}))
+        kernel.run(1)  # compiles
+        nActionsBefore = kernel.get_nActionsTaken()
+        startTime = time.perf_counter()
+        kernel.run(arguments.benchmark_episodes)
+        duration = time.perf_counter() - startTime
+        print(f"Q-Learning: {arguments.benchmark_episodes} episodes in {duration:.2f} s, {(kernel.get_nActionsTaken() - nActionsBefore) / duration * 60 / 1e6:.1f} million actions per minute")
@@ -9,7 +9,7 @@
 
 # Potential future features
 # TODO  Does Inverse y-Wind feel better?
-# TODO  Dyna-Q+? (Which way? Book Ex 8.4 + footnote?) Also Nondeterministic Env?
+# TODO  Dyna-Q+ as in Book Ex 8.4 / footnote (bonus in action selection, untried actions in planning)? Also Nondeterministic Env?
 # TODO: Implement Double Learning: Default 2 tables, if double on: choose 50/50, if off: 100/0. How to deal with expected?
 # TODO: Implement Statevalue-Based TD
 # TODO: Implement Policy Evaluation, Policy Improvement, Policy Iteration, Value Iteration
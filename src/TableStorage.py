@@ -0,0 +1,129 @@
+import json
+import numpy as np
+from pathlib import Path
+
+
+class TableStorage:
+    """Compact storage of the tables an ``Agent`` keeps per state-action pair, for worlds too large for its nested dicts.
+    A 1000x1000 world with king and idle actions has 9 million pairs, which as Python dicts of Q-values, counts and
+    model entries take many gigabytes. Here they are plain arrays of shape (H, W, number of actions):
+    float32 Q-values, int32 or uint16 visit counts, int32 model successors packed as h*W + w, float32 model rewards
+    and the int32 times of the latest real visits that Dyna-Q+ needs, which limits such runs to 2**31 - 1 actions.\n
+    If a directory is given, the arrays are ``numpy.memmap`` files in it, described by a json header. Then a run may
+    exceed the RAM, its tables persist on their own and other processes can inspect them while training, see ``open``.\n
+    Q-values are rounded to float32 and counts saturate at the largest value of their type, so a run with a
+    ``TableStorage`` is not bit-identical to the same run with the default dicts.
+    """
+    HEADER_FILENAME = "tables.json"
+    COUNT_DTYPES = {"int32": np.int32, "uint16": np.uint16}
+    UNKNOWN = -1  # model successor of a pair that was never taken
+
+    def __init__(self, H, W, nActions, directory=None, countDtype="int32", mode="w+"):
+        """Creates a ``TableStorage`` object with a fresh or, in file mode "r" or "r+", an existing set of tables.
+
+        :param int H: Height of the world
+        :param int W: Width of the world
+        :param int nActions: Size of the actionspace
+        :param Path | str | None directory: Directory of the memmap files, created if necessary. If None, the tables are held in RAM.
+        :param str countDtype: One of ``TableStorage.COUNT_DTYPES``
+        :param str mode: ``numpy.memmap`` mode, only used with a directory. "w+" overwrites existing tables.
+        """
+        self.shape = (H, W, nActions)
+        self.directory = None if directory is None else Path(directory)
+        self.countDtype = countDtype
+        self.maxCount = int(np.iinfo(self.COUNT_DTYPES[countDtype]).max)
+        self.mode = mode if self.directory is not None else "w+"
+        dtypes = {"Qvalues": np.float32, "counts": self.COUNT_DTYPES[countDtype], "modelSuccessors": np.int32, "modelRewards": np.float32, "lastVisitTimes": np.int32}
+        if self.directory is None:
+            self.arrays = {name: np.zeros(self.shape, dtype=dtype) for name, dtype in dtypes.items()}
+        else:
+            if mode == "w+":
+                self.directory.mkdir(parents=True, exist_ok=True)
+                with (self.directory / self.HEADER_FILENAME).open(mode="w") as file:
+                    json.dump({"H": H, "W": W, "nActions": nActions, "countDtype": countDtype}, file)
+            self.arrays = {name: np.memmap(self.directory / f"{name}.dat", dtype=dtype, mode=mode, shape=self.shape) for name, dtype in dtypes.items()}
+        if self.mode == "w+":
+            self.arrays["modelSuccessors"].fill(self.UNKNOWN)  # the other tables are zero already
+
+    @classmethod
+    def open(cls, directory, mode="r"):
+        """Opens the tables another run stored in a directory, f.e. to inspect them while that run is still training.
+
+        :param Path | str directory: Directory passed to the ``TableStorage`` of that run
+        :param str mode: "r" for read-only access, "r+" to modify them
+        :return TableStorage: Storage backed by the existing files
+        """
+        with (Path(directory) / cls.HEADER_FILENAME).open() as file:
+            header = json.load(file)
+        return cls(header["H"], header["W"], header["nActions"], directory, header["countDtype"], mode)
+
+    def flush(self):
+        """Writes changes of memmap tables to their files. Not needed for consistency, the OS writes them anyway,
+        but other processes only see the latest values reliably after a flush.
+        """
+        for array in self.arrays.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def get_nbytes(self):
+        """:return int: Size of all tables, in RAM or on disk"""
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def get_Qvalues(self):
+        return self.arrays["Qvalues"]
+
+    def get_counts(self):
+        return self.arrays["counts"]
+
+    def get_modelSuccessors(self):
+        return self.arrays["modelSuccessors"]
+
+    def get_modelRewards(self):
+        return self.arrays["modelRewards"]
+
+    def get_lastVisitTimes(self):
+        return self.arrays["lastVisitTimes"]
+
+    def get_maxCount(self):
+        return self.maxCount
+
+    def get_shape(self):
+        return self.shape
+
+    def get_directory(self):
+        return self.directory
+
+    def get_mode(self):
+        """:return str: "w+" for fresh tables, "r" or "r+" for the tables of an earlier run"""
+        return self.mode
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+    from tempfile import TemporaryDirectory
+    from HeadlessSandbox import HeadlessSandbox
+    from MemoryReport import MemoryReport
+    from WorldGenerator import WorldGenerator
+
+    parser = argparse.ArgumentParser(description="Runs an agent with king and idle actions on a generated open world, once with memmap tables and once with the default dicts, and compares their memory.")
+    parser.add_argument("--size", type=int, default=300, help="Height and width of the world")
+    parser.add_argument("--operations", type=int, default=100000)
+    parser.add_argument("--directory", type=Path, help="Directory of the memmap files, a temporary one if omitted")
+    parser.add_argument("--skip-dicts", action="store_true", help="Only run with memmap tables, f.e. for worlds whose dicts do not fit into the RAM")
+    arguments = parser.parse_args()
+    with TemporaryDirectory() as temporaryDirectory:
+        worldFilepath = WorldGenerator(arguments.size, arguments.size, seed=0, wallDensity=0).save(Path(temporaryDirectory) / "world")
+        directory = arguments.directory or Path(temporaryDirectory) / "tables"
+        runs = [("memmap tables", lambda: TableStorage(arguments.size, arguments.size, 9, directory))] + ([] if arguments.skip_dicts else [("dicts", lambda: None)])
+        for name, create_storage in runs:
+            startTime = time.time()
+            sandbox = HeadlessSandbox(worldFilepath, {"Seed": 0}, straight=True, diagonal=True, idle=True, tableStorage=create_storage())
+            sandbox.run(arguments.operations)
+            report = MemoryReport(sandbox.get_agent()).measure()
+            print(f"{name:<14} {time.time() - startTime:6.1f} s, agent structures {report['total'] / 2**20:8.1f} MiB in RAM")
+            if sandbox.get_agent().get_tableStorage() is not None:
+                sandbox.get_agent().get_tableStorage().flush()
+                inspected = TableStorage.open(directory)  # like another process would
+                print(f"{'':<14} {inspected.get_nbytes() / 2**20:8.1f} MiB of tables in {directory}, {int((inspected.get_modelSuccessors() != TableStorage.UNKNOWN).sum())} pairs visited")
+            del sandbox
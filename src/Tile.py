@@ -10,6 +10,7 @@ from myFuncs import evaluate
 class Tile(tk.Frame):
     """This class manages the graphical representation of a single gridworld cell
     as well as optional user interaction to specify the properties of that cell.
+    The input events themselves are bound by the ``Tilemap``, which forwards them to the ``Tile`` they occurred on.
     """
     BLANK_COLOR = "white"
     WALL_COLOR = "black"
@@ -87,6 +88,36 @@ class Tile(tk.Frame):
                 symbol = evaluate(cls.GREEDYCHARS_3_4, index)
         return {"text": symbol, "fg": color}
 
+    @classmethod
+    def get_default_yaml_dict(cls):
+        """Returns the yaml-conform representation of a ``Tile`` right after its ``reset``.
+
+        :return dict: Tile data representation
+        """
+        return cls.TYPES[0] | {"borderColor": cls.BORDER_COLORS[0]}
+
+    @classmethod
+    def get_cell_kwargs(cls, yamlDict):
+        """Translates the yaml-conform representation of a ``Tile`` into keyword arguments of a ``Cell``.
+        Position and arrival reward are left out, since they are not part of the ``Tile`` itself.
+
+        :param dict yamlDict: Tile data representation, needs at least "text" and "bg"
+        :return dict: isWall, isStart, isGoal, teleportSource and teleportSink
+        """
+        text = yamlDict["text"]
+        teleportSource = None
+        teleportSink = None
+        if text and text[0] in cls.TELEPORTERS:
+            if text[1] != cls.TELEPORTER_SINK_ONLY_SUFFIX:
+                teleportSource = text[0]
+            if text[1] != cls.TELEPORTER_SOURCE_ONLY_SUFFIX:
+                teleportSink = text[0]
+        return {"isWall": yamlDict["bg"] == cls.WALL_COLOR,
+                "isStart": text == cls.START_CHAR,
+                "isGoal": text == cls.GOAL_CHAR,
+                "teleportSource": teleportSource,
+                "teleportSink": teleportSink}
+
     def __init__(self, master, indicateNumericalValueChange, labelWidth, labelHeight, *args, font="calibri 14 bold", **kwargs):
         """Creates a ``Tile`` object. Manages a single ``packed tk.Label`` inside
         to allow providing information and explicitly coloring the the edges independent
@@ -105,19 +136,8 @@ class Tile(tk.Frame):
         self.label.pack(fill=tk.BOTH, expand=True)
         self.typeCycleIndex = 0
         self.borderColorCycleIndex = 0
+        self.position = None  # cell coordinates, assigned by the Tilemap. May change if the Tilemap is virtualized.
         self.protectedAttributes = set()
-        for widget in [self, self.label]:
-            widget.bind("<Button-1>", lambda _: self._cycle_type(direction=1))  # left click
-            widget.bind("<Control-Button-1>", lambda _: self._cycle_type(direction=-1))  # ctrl + left click
-            widget.bind("<Button-3>", lambda _: self._cycle_borderColor(direction=1))  # right click
-            widget.bind("<Control-Button-3>", lambda _: self._cycle_borderColor(direction=-1))  # ctrl + right click
-            widget.bind("<Button-2>", lambda _: widget.focus_set())  # focus is needed to toggle teleport
-            for char in self.TELEPORTERS:
-                widget.bind(char, lambda _, char_=char: self._toggle_teleport(number=char_))
-            for button in ["<Up>", "w", "+"]:
-                widget.bind(button, lambda _: self._specify_teleport(suffix=self.TELEPORTER_SOURCE_ONLY_SUFFIX))
-            for button in ["<Down>", "s", "-"]:
-                widget.bind(button, lambda _: self._specify_teleport(suffix=self.TELEPORTER_SINK_ONLY_SUFFIX))
         self.indicateNumericalValueChange = indicateNumericalValueChange
         self.reset()
 
@@ -181,6 +201,20 @@ class Tile(tk.Frame):
         if borderColor and borderColor != self.cget("bg"):  # borderColor cannot be protected since "bg" isnt unique, but this isnt needed anyway.
             self.config(bg=borderColor)
 
+    def set_position(self, position):
+        self.position = position
+
+    def get_position(self):
+        return self.position
+
+    def derive_cycle_indices(self):
+        """Sets the type- and border color cycle to the current appearance, so that the next user interaction
+        continues from there. Needed after a ``Tile`` was rebound to another cell.
+        """
+        yamlDict = self.get_yaml_dict()
+        self.typeCycleIndex = next((i for i, type_ in enumerate(self.TYPES) if all(yamlDict[key] == value for key, value in type_.items())), 0)
+        self.borderColorCycleIndex = self.BORDER_COLORS.index(yamlDict["borderColor"]) if yamlDict["borderColor"] in self.BORDER_COLORS else 0
+
     def get_yaml_dict(self):
         """Returns the representation of this ``Tile`` as a yaml-conform dictionary.
 
@@ -190,15 +224,16 @@ class Tile(tk.Frame):
         yamlDict["borderColor"] = self.cget("bg")
         return yamlDict
 
-    def _toggle_teleport(self, number: str):
+    def toggle_teleport(self, number: str):
         if self.master.interactionAllowed:
             if number in self.label.cget("text"):
                 number = ""
             else:
                 number += self.TELEPORTER_DEFAULT_SUFFIX
             self.update_appearance(text=number, bg=self.BLANK_COLOR)  # without bg, if toggled on a wall tile, teleport number would hide behind the black color and cause unwanted behavior during run
+            self.master.remember_tile(self)
 
-    def _specify_teleport(self, suffix):
+    def specify_teleport(self, suffix):
         text = self.label.cget("text")
         if self.master.interactionAllowed and text and (text[0] in self.TELEPORTERS):
             if text[1] == suffix:
@@ -207,13 +242,16 @@ class Tile(tk.Frame):
                 replacement = suffix
             text = text[0] + replacement
             self.update_appearance(text=text)
+            self.master.remember_tile(self)
 
-    def _cycle_type(self, direction):
+    def cycle_type(self, direction):
         if self.master.interactionAllowed:
             self.typeCycleIndex = (self.typeCycleIndex + direction) % len(self.TYPES)
             self.update_appearance(**self.TYPES[self.typeCycleIndex])
+            self.master.remember_tile(self)
 
-    def _cycle_borderColor(self, direction):
+    def cycle_borderColor(self, direction):
         if self.master.interactionAllowed:
             self.borderColorCycleIndex = (self.borderColorCycleIndex + direction) % len(self.BORDER_COLORS)
             self.update_appearance(borderColor=self.BORDER_COLORS[self.borderColorCycleIndex])
+            self.master.remember_tile(self)
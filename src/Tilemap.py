@@ -1,20 +1,31 @@
 import tkinter as tk
 
+import myFuncs
 from myFuncs import matrix, get_default_kwargs
 from Tile import Tile
 
 
 class Tilemap(tk.Frame):
     """This class inherits from ``tk.Frame`` and acts as a container for ``Tiles``.
-    It provides a geometric representation of the underlying gridworld environment.
+    It provides a geometric representation of the underlying gridworld environment.\n
+    If a ``Viewport`` is given, the ``Tilemap`` is virtualized: Only the cells inside the
+    viewport get ``Tiles``, which are rebound to other cells when the viewport scrolls or zooms.
+    All methods still take world coordinates. Updates of cells outside the viewport are
+    either remembered in a lightweight cell store (``storeOffscreenCells``) or dropped,
+    in which case the owner of the ``Tilemap`` has to re-render the visible cells after
+    each viewport change.\n
+    User input is bound once to a bind tag instead of to every ``Tile``, and each handler looks up the ``Tile``
+    from the widget the event occurred on. Tilemaps that never allow interaction do not give that tag to their Tiles.
     """
-    def __init__(self, master, H, W, interactionAllowed, *args, font=get_default_kwargs(Tile)["font"], displayWind=False, indicateNumericalValueChange=False, tileWidth=2, tileHeight=2, tileBd=2, **kwargs):
+    INPUT_TAG = "TilemapInput"
+    def __init__(self, master, H, W, interactionAllowed, *args, font=get_default_kwargs(Tile)["font"], displayWind=False, indicateNumericalValueChange=False, tileWidth=2, tileHeight=2, tileBd=2,
+                 viewport=None, storeOffscreenCells=False, scrollbars=False, **kwargs):
         """Creates a ``Tilemap`` object.
 
         :param master: Parent container.
         :param int H: Height of the environment in Cells. Cannot be changed afterwards.
         :param int W: Width  of the environment in Cells. Cannot be changed afterwards.
-        :param bool interactionAllowed: if True, the user may change the appearance of the Tiles of this Tilemap by interacting with them. Can be changed afterwards.
+        :param bool interactionAllowed: if True, the user may change the appearance of the Tiles of this Tilemap by interacting with them. Can be changed afterwards, the input bindings are created when it is allowed for the first time.
         :param args: Additional arguments passed to the super().__init__ (tk.Frame)
         :param str font: tkinter font used for the text of the Tiles of this Tilemap
         :param bool displayWind: If True, changes the coordinates of all ``Tiles`` by +1/+1 to make the 0-th row/column a placeholder for wind strength EntryFrames for each column/row. Cannot be changed afterwards. The EntryFrames must be added afterwards using the add_wind method.
@@ -22,16 +33,182 @@ class Tilemap(tk.Frame):
         :param int tileWidth:   Width of the label inside each Tile.
         :param int tileHeight: Height of the label inside each Tile.
         :param int tileBd: Borderwidth of each Tile.
+        :param Viewport | None viewport: If not None, only the cells inside this viewport get Tiles. Cannot be changed afterwards.
+        :param bool storeOffscreenCells: Only used with a viewport. If True, the appearance of every cell is kept in a cell store, so content of cells outside the viewport survives scrolling. Protected attributes are only respected for visible cells.
+        :param bool scrollbars: Only used with a viewport. If True, adds scrollbars that move the viewport.
         :param kwargs: Additional keyword arguments passed to the super().__init__ (tk.Frame)
         """
         super().__init__(master, *args, **kwargs)
+        self.H = H
+        self.W = W
         self.interactionAllowed = interactionAllowed
         self.windLabel: tk.Label = None  # Wind frames must be added later manually, because they need a master (namely this tilemap instance) for the init call
-        self.tiles = matrix(H, W)
-        for h in range(H):
-            for w in range(W):
-                self.tiles[h][w] = Tile(self, bd=tileBd, labelWidth=tileWidth, labelHeight=tileHeight, font=font, indicateNumericalValueChange=indicateNumericalValueChange)
-                self.tiles[h][w].grid(row=h+displayWind, column=w+displayWind)
+        self.hWindFrames = []
+        self.wWindFrames = []
+        self.displayWind = displayWind
+        self.font = font
+        self.tileKwargs = {"bd": tileBd, "labelWidth": tileWidth, "labelHeight": tileHeight, "indicateNumericalValueChange": indicateNumericalValueChange}
+        self.viewport = viewport
+        self.cellStore = None
+        self.scrollbars = []
+        if self.viewport is not None:
+            if storeOffscreenCells:
+                self.cellStore = [[Tile.get_default_yaml_dict() for _ in range(W)] for _ in range(H)]
+            if scrollbars:
+                self.scrollbars = [tk.Scrollbar(self, orient=tk.VERTICAL, command=lambda *args: self._scroll(0, *args)),
+                                   tk.Scrollbar(self, orient=tk.HORIZONTAL, command=lambda *args: self._scroll(1, *args))]
+            self.scrollTag = f"Viewport{id(self.viewport)}"  # shared by all Tilemaps of the same viewport
+            self.viewport.add_listener(self._refresh_viewport)
+        self.hasInputBindings = False  # assigned by _bind_input
+        self.tiles = []
+        self.dirtyCells = {(h, w) for h in range(H) for w in range(W)}  # cells changed since the last pop_dirty_cells call, nothing was synced yet
+        self._build_tiles()
+        if self.interactionAllowed:
+            self._bind_input()
+
+    def _build_tiles(self):
+        """(Re)creates all ``Tiles``. Without viewport this happens only once, with viewport also after each zoom.
+        """
+        for row in self.tiles:
+            for tile in row:
+                tile.destroy()
+        if self.viewport is None:
+            viewH, viewW = self.H, self.W
+            font = self.font
+        else:
+            viewH, viewW = self.viewport.get_shape()
+            font = myFuncs.scale_font(self.font, self.viewport.get_zoom())
+        self.tiles = matrix(viewH, viewW)
+        for h in range(viewH):
+            for w in range(viewW):
+                self.tiles[h][w] = Tile(self, font=font, **self.tileKwargs)
+                self.tiles[h][w].grid(row=h+self.displayWind, column=w+self.displayWind)
+                self.tiles[h][w].set_position((h, w))
+                if self.viewport is not None:
+                    self._bind_scrolling(self.tiles[h][w])
+                if self.hasInputBindings:
+                    self._add_input_tag(self.tiles[h][w])
+        if self.viewport is not None:
+            self._rebind_tiles()
+
+    def _bind_scrolling(self, tile):
+        for widget in [tile, tile.label]:
+            widget.bindtags((self.scrollTag,) + widget.bindtags())
+        # bind_class is global per tag, so every Tilemap of this viewport could do this. Binding the same handlers again just replaces them.
+        for sequence, dh, dw in [("<Button-4>", -1, 0), ("<Button-5>", 1, 0), ("<Shift-Button-4>", 0, -1), ("<Shift-Button-5>", 0, 1)]:  # X11 mousewheel
+            self.bind_class(self.scrollTag, sequence, lambda _, dh=dh, dw=dw: self.viewport.scroll(dh, dw))
+        self.bind_class(self.scrollTag, "<Control-Button-4>", lambda _: self.viewport.zoom(1))
+        self.bind_class(self.scrollTag, "<Control-Button-5>", lambda _: self.viewport.zoom(-1))
+        self.bind_class(self.scrollTag, "<MouseWheel>", lambda event: self.viewport.scroll(dh=-myFuncs.sign(event.delta)))  # Windows and macOS mousewheel
+        self.bind_class(self.scrollTag, "<Shift-MouseWheel>", lambda event: self.viewport.scroll(dw=-myFuncs.sign(event.delta)))
+        self.bind_class(self.scrollTag, "<Control-MouseWheel>", lambda event: self.viewport.zoom(myFuncs.sign(event.delta)))
+
+    def _bind_input(self):
+        """Binds all user input of the ``Tiles`` to the input tag and gives that tag to all ``Tiles`` of this ``Tilemap``.
+        """
+        # bind_class is global per tag and the handlers only depend on the event, so every interactive Tilemap may do this. Binding the same handlers again just replaces them.
+        self.hasInputBindings = True
+        self.bind_class(self.INPUT_TAG, "<Button-1>", lambda event: Tilemap._get_event_tile(event).cycle_type(direction=1))  # left click
+        self.bind_class(self.INPUT_TAG, "<Control-Button-1>", lambda event: Tilemap._get_event_tile(event).cycle_type(direction=-1))  # ctrl + left click
+        self.bind_class(self.INPUT_TAG, "<Button-3>", lambda event: Tilemap._get_event_tile(event).cycle_borderColor(direction=1))  # right click
+        self.bind_class(self.INPUT_TAG, "<Control-Button-3>", lambda event: Tilemap._get_event_tile(event).cycle_borderColor(direction=-1))  # ctrl + right click
+        self.bind_class(self.INPUT_TAG, "<Button-2>", lambda event: event.widget.focus_set())  # focus is needed to toggle teleport
+        for char in Tile.TELEPORTERS:
+            self.bind_class(self.INPUT_TAG, char, lambda event, char_=char: Tilemap._get_event_tile(event).toggle_teleport(number=char_))
+        for button in ["<Up>", "w", "+"]:
+            self.bind_class(self.INPUT_TAG, button, lambda event: Tilemap._get_event_tile(event).specify_teleport(suffix=Tile.TELEPORTER_SOURCE_ONLY_SUFFIX))
+        for button in ["<Down>", "s", "-"]:
+            self.bind_class(self.INPUT_TAG, button, lambda event: Tilemap._get_event_tile(event).specify_teleport(suffix=Tile.TELEPORTER_SINK_ONLY_SUFFIX))
+        for row in self.tiles:
+            for tile in row:
+                self._add_input_tag(tile)
+
+    def _add_input_tag(self, tile):
+        for widget in [tile, tile.label]:
+            widget.bindtags((self.INPUT_TAG,) + widget.bindtags())
+
+    @staticmethod
+    def _get_event_tile(event):
+        """Returns the ``Tile`` an input event occurred on, which is either the ``Tile`` itself or its label."""
+        return event.widget if isinstance(event.widget, Tile) else event.widget.master
+
+    def _refresh_viewport(self):
+        """Registered at the viewport, so it is triggered by each scroll or zoom.
+        """
+        if (len(self.tiles), len(self.tiles[0])) != self.viewport.get_shape():
+            self._build_tiles()
+        else:
+            self._rebind_tiles()
+
+    def _rebind_tiles(self):
+        """Assigns all ``Tiles`` to the cells currently covered by the viewport and restores their appearance
+        from the cell store. ``Tiles`` of Tilemaps without cell store are just reset.
+        """
+        hOffset, wOffset = self.viewport.get_offset()
+        for h, row in enumerate(self.tiles):
+            for w, tile in enumerate(row):
+                tile.set_position((h + hOffset, w + wOffset))
+                tile.unprotect_attributes("text", "fg")
+                if self.cellStore is None:
+                    tile.reset()
+                else:
+                    tile.update_appearance(**self.cellStore[h + hOffset][w + wOffset])
+                    tile.derive_cycle_indices()
+        self._place_wind()
+        self._place_scrollbars()
+
+    def _place_wind(self):
+        if not self.hWindFrames:
+            return
+        hOffset, wOffset = (0, 0) if self.viewport is None else self.viewport.get_offset()
+        viewH, viewW = len(self.tiles), len(self.tiles[0])
+        for w, frame in enumerate(self.hWindFrames):
+            if 0 <= w - wOffset < viewW:
+                frame.grid(row=0, column=w-wOffset+1)
+            else:
+                frame.grid_remove()
+        for h, frame in enumerate(self.wWindFrames):
+            if 0 <= h - hOffset < viewH:
+                frame.grid(row=h-hOffset+1, column=0)
+            else:
+                frame.grid_remove()
+
+    def _place_scrollbars(self):
+        if not self.scrollbars:
+            return
+        viewH, viewW = len(self.tiles), len(self.tiles[0])
+        vScrollbar, hScrollbar = self.scrollbars
+        vScrollbar.grid(row=self.displayWind, column=viewW+self.displayWind, rowspan=viewH, sticky=tk.N+tk.S)
+        hScrollbar.grid(row=viewH+self.displayWind, column=self.displayWind, columnspan=viewW, sticky=tk.W+tk.E)
+        vScrollbar.set(*self.viewport.get_fractions(0))
+        hScrollbar.set(*self.viewport.get_fractions(1))
+
+    def _scroll(self, iDim, command, *args):
+        """Translates the ``tk.Scrollbar`` command protocol into viewport movements.
+        """
+        if command == "moveto":
+            offset = round(float(args[0]) * (self.H, self.W)[iDim])
+        else:  # "scroll"
+            step = self.viewport.get_shape()[iDim] if args[1] == "pages" else 1
+            offset = self.viewport.get_offset()[iDim] + int(args[0]) * step
+        if iDim == 0:
+            self.viewport.moveto(hOffset=offset)
+        else:
+            self.viewport.moveto(wOffset=offset)
+
+    def _get_tile(self, h, w):
+        """Returns the ``Tile`` currently representing a cell, or None if the cell is outside the viewport.
+
+        :param int h: Height coordinate of the cell
+        :param int w: Width  coordinate of the cell
+        :return Tile | None: Tile
+        """
+        if self.viewport is None:
+            return self.tiles[h][w]
+        if self.viewport.contains(h, w):
+            hOffset, wOffset = self.viewport.get_offset()
+            return self.tiles[h - hOffset][w - wOffset]
+        return None
 
     def protect_text_and_color(self, h, w):
         """Protect text and color of a ``Tile`` from being changed by its ``update_appearance`` method.
@@ -39,7 +216,9 @@ class Tilemap(tk.Frame):
         :param int h: Height coordinate of the Tile
         :param int w: Width  coordinate of the Tile
         """
-        self.tiles[h][w].protect_attributes("text", "fg")
+        tile = self._get_tile(h, w)
+        if tile is not None:
+            tile.protect_attributes("text", "fg")
 
     def unprotect_text_and_textColor(self, h, w):
         """Allows text and color of a ``Tile`` to be changed by its ``update_appearance`` method.
@@ -47,7 +226,9 @@ class Tilemap(tk.Frame):
         :param int h: Height coordinate of the Tile
         :param int w: Width  coordinate of the Tile
         """
-        self.tiles[h][w].unprotect_attributes("text", "fg")
+        tile = self._get_tile(h, w)
+        if tile is not None:
+            tile.unprotect_attributes("text", "fg")
 
     def get_tile_background_color(self, h, w):
         """Returns the ""bg"" of the ``tk.Label`` of a ``Tile``
@@ -56,7 +237,9 @@ class Tilemap(tk.Frame):
         :param int w: Width  coordinate of the Tile
         :return str: tkinter color
         """
-        return self.tiles[h][w].label.cget("bg")
+        if self.cellStore is not None:
+            return self.cellStore[h][w]["bg"]
+        return self._get_tile(h, w).label.cget("bg")
 
     def get_tile_text(self, h, w):
         """Returns the "text" of the ``tk.Label`` of a ``Tile``
@@ -65,7 +248,9 @@ class Tilemap(tk.Frame):
         :param int w: Width  coordinate of the Tile
         :return str: text
         """
-        return self.tiles[h][w].label.cget("text")
+        if self.cellStore is not None:
+            return self.cellStore[h][w]["text"]
+        return self._get_tile(h, w).label.cget("text")
 
     def get_tile_border_color(self, h, w):
         """Returns the "bg" of a ``Tile``
@@ -74,19 +259,21 @@ class Tilemap(tk.Frame):
         :param int w: Width  coordinate of the Tile
         :return str: tkinter color
         """
-        return self.tiles[h][w].cget("bg")
+        if self.cellStore is not None:
+            return self.cellStore[h][w]["borderColor"]
+        return self._get_tile(h, w).cget("bg")
 
     def add_wind(self, hWindFrames, wWindFrames):
         """Fills the wind placeholders with given EntryFrames.
         Use only if this object was initialized with True displayWind argument.
+        With a viewport, only the EntryFrames of visible rows and columns are shown.
 
         :param list[EntryFrame] hWindFrames: EntryFrames for the wind strengths in each column. Number must equal the environment WIDTH!
         :param list[EntryFrame] wWindFrames: EntryFrames for the wind strengths in each row. Number must equal the environment HEIGHT!
         """
-        for w, frame in enumerate(hWindFrames):
-            frame.grid(row=0, column=w+1)
-        for h, frame in enumerate(wWindFrames):
-            frame.grid(row=h+1, column=0)
+        self.hWindFrames = hWindFrames
+        self.wWindFrames = wWindFrames
+        self._place_wind()
         self.windLabel = tk.Label(self, text="W.", font=hWindFrames[0].get_font())
         self.windLabel.grid(row=0, column=0)
 
@@ -103,18 +290,57 @@ class Tilemap(tk.Frame):
         Keyword arguments that would change its protected attributes are ignored.
         If ``Tile.indicateNumericalChange`` is ``True``, also applies the appropriate
         textcolor change (keyword "fg"), unless its "fg" is protected.
+        With a viewport, cells outside of it are only updated in the cell store, if there is one.
 
         :param h: Height coordinate of the Tile
         :param w: Width  coordinate of the Tile
         :param kwargs: Keyword arguments that are passed to Tile.update_appearance.
         """
-        self.tiles[h][w].update_appearance(**kwargs)
+        if self.cellStore is not None:
+            cell = self.cellStore[h][w]
+            for key, value in kwargs.items():
+                if key in cell and value is not None:
+                    cell[key] = value
+        tile = self._get_tile(h, w)
+        if tile is not None:
+            tile.update_appearance(**kwargs)
+
+    def remember_tile(self, tile):
+        """Called by a ``Tile`` after the user changed it, so the cell store stays in sync with the visible content
+        and the cell is marked as dirty.
+
+        :param Tile tile: Tile that was changed
+        """
+        h, w = tile.get_position()
+        self.dirtyCells.add((h, w))
+        if self.cellStore is not None:
+            self.cellStore[h][w] = tile.get_yaml_dict()
+
+    def mark_dirty(self, cells=None):
+        """Marks cells as changed, for changes that were not made by the user, f.e. by loading a world.
+
+        :param Iterable[tuple] | None cells: Positions of the cells. If None, all cells are marked.
+        """
+        self.dirtyCells.update(((h, w) for h in range(self.H) for w in range(self.W)) if cells is None else cells)
+
+    def pop_dirty_cells(self):
+        """Returns the positions of all cells changed since the last call, in row-major order, and forgets them.
+
+        :return list[tuple]: Positions
+        """
+        dirtyCells = sorted(self.dirtyCells)
+        self.dirtyCells = set()
+        return dirtyCells
 
     def reset(self):
         """Restore the initial representation of all ``Tiles``.
         """
-        for tile in self.tiles.flatten():
-            tile.reset()
+        if self.cellStore is not None:
+            self.cellStore = [[Tile.get_default_yaml_dict() for _ in range(self.W)] for _ in range(self.H)]
+        self.mark_dirty()
+        for row in self.tiles:
+            for tile in row:
+                tile.reset()
 
     def set_interactionAllowed(self, value):
         """Toggles if the user may change the appearance of the ``Tiles``
@@ -123,6 +349,8 @@ class Tilemap(tk.Frame):
         :param bool value: True allows, False prohibits
         """
         self.interactionAllowed = value
+        if value and not self.hasInputBindings:
+            self._bind_input()
 
     def get_yaml_list(self):
         """Returns a geometry-conserving matrix containing the representations
@@ -130,4 +358,6 @@ class Tilemap(tk.Frame):
 
         :return list[dict]: Tilemap data representation
         """
+        if self.cellStore is not None:
+            return [[dict(cell) for cell in row] for row in self.cellStore]
         return [[tile.get_yaml_dict() for tile in row] for row in self.tiles]
@@ -0,0 +1,127 @@
+import numpy as np
+import json
+from pathlib import Path
+
+from EventLog import EventLog
+
+
+class Trace(EventLog):
+    """In-memory ``EventLog`` that keeps every record of a run along with the final Q-values, so two runs can be
+    compared operation by operation. Any engine that feeds the ``EventLog`` interface like the ``Agent`` does can be traced.\n
+    Saved traces are compressed ``.npz`` files with the records in ``EventLog.RECORD_DTYPE``, the final Q-values and a
+    json header, which makes them small enough to be kept in the repository as golden references.
+    """
+    SUFFIX = ".npz"
+    FLOAT_FIELDS = ["reward", "oldQ", "newQ"]
+
+    def __init__(self, **header):
+        """Creates an empty ``Trace`` object, to be passed to an ``Agent`` as event log.
+
+        :param header: Additional json-conform data stored in the header
+        """
+        super().__init__(None, **header)
+        self.operations = None
+        self.actionspace = None
+        self.recordBlocks = []
+        self.records = None
+        self.finalQvalues = None
+
+    def start(self, operations, actionspace, Qvalues):
+        self.operationIndices = {operation: i for i, operation in enumerate(operations)}
+        self.actionIndices = {action: i for i, action in enumerate(actionspace)} | {None: self.NONE}
+        self.operations = list(operations)
+        self.actionspace = [tuple(action) for action in actionspace]
+        self.Qvalues = Qvalues
+
+    def close(self):
+        """Concatenates the records and copies the final Q-values. Must be called once the run is over."""
+        if self.pendingRecords:
+            self._flush()
+        self.records = np.concatenate(self.recordBlocks) if self.recordBlocks else np.empty(0, dtype=self.RECORD_DTYPE)
+        self.finalQvalues = np.array(self.Qvalues, dtype=np.float64)
+
+    def _flush(self):
+        self.recordBlocks.append(np.array(self.pendingRecords, dtype=self.RECORD_DTYPE))
+        self.pendingRecords = []
+
+    def _write_keyframe(self):
+        pass
+
+    def save(self, filepath):
+        """:param Path | str filepath: Path of the file, ".npz" suffix optional"""
+        filepath = Path(filepath).with_suffix(self.SUFFIX)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        header = self.header | {"operations": self.operations, "actionspace": self.actionspace}
+        np.savez_compressed(filepath, records=self.records, finalQvalues=self.finalQvalues, header=np.array(json.dumps(header)))
+
+    @classmethod
+    def load(cls, filepath):
+        with np.load(Path(filepath).with_suffix(cls.SUFFIX)) as data:
+            header = json.loads(str(data["header"]))
+            trace = cls(**{key: value for key, value in header.items() if key not in ["operations", "actionspace"]})
+            trace.operations = header["operations"]
+            trace.actionspace = [tuple(action) for action in header["actionspace"]]
+            trace.records = data["records"]
+            trace.finalQvalues = data["finalQvalues"]
+        return trace
+
+    def find_first_divergence(self, other, tolerance=0., nContext=5):
+        """Compares another trace against this one, which is taken as the reference.
+
+        :param Trace other: Trace of the run to check
+        :param float tolerance: Largest absolute difference accepted for rewards and Q-values, 0 demands bit-identical floats
+        :param int nContext: Number of records before the divergence included in the report
+        :return dict | None: Step, field, expected and actual value and the preceding records of both runs. None if the runs match.
+        """
+        if other.actionspace != self.actionspace or other.operations != self.operations:
+            return {"step": 0, "field": "actionspace / operations", "expected": [self.actionspace, self.operations], "actual": [other.actionspace, other.operations], "context": []}
+        nCommon = min(len(self.records), len(other.records))
+        divergences = []
+        for field in self.RECORD_DTYPE.names:
+            expected, actual = self.records[field][:nCommon], other.records[field][:nCommon]
+            isDifferent = np.abs(expected - actual) > tolerance if field in self.FLOAT_FIELDS else expected != actual
+            if isDifferent.ndim > 1:
+                isDifferent = isDifferent.any(axis=1)
+            if isDifferent.any():
+                divergences.append((int(np.argmax(isDifferent)), field))
+        if divergences:
+            step, field = min(divergences)
+            return {"step": step, "field": field, "expected": self.describe(step)[field], "actual": other.describe(step)[field],
+                    "context": [{"step": i, "expected": self.describe(i), "actual": other.describe(i)} for i in range(max(0, step - nContext), step + 1)]}
+        if len(self.records) != len(other.records):
+            return {"step": nCommon, "field": "length", "expected": len(self.records), "actual": len(other.records),
+                    "context": [{"step": i, "expected": self.describe(i), "actual": other.describe(i)} for i in range(max(0, nCommon - nContext), nCommon)]}
+        if self.finalQvalues.shape != other.finalQvalues.shape:
+            return {"step": nCommon, "field": "finalQvalues", "expected": self.finalQvalues.shape, "actual": other.finalQvalues.shape, "context": []}
+        differences = np.abs(self.finalQvalues - other.finalQvalues)
+        if differences.max(initial=0) > tolerance:
+            worst = np.unravel_index(np.argmax(differences), differences.shape)
+            return {"step": nCommon, "field": "finalQvalues", "expected": float(self.finalQvalues[worst]), "actual": float(other.finalQvalues[worst]),
+                    "context": [{"state": tuple(worst[:2]), "action": self.actionspace[worst[2]]}]}
+        return None
+
+    def describe(self, step):
+        """:return dict: Record of an operation with names, actions and positions decoded, None beyond the end"""
+        if step >= len(self.records):
+            return None
+        record = self.records[step]
+        action = lambda index: None if index == self.NONE else self.actionspace[index]
+        position = lambda array: None if array[0] == self.NONE else tuple(array.tolist())
+        return {"operation": self.operations[record["operation"]],
+                "exploratory": bool(record["exploratory"]),
+                "state": position(record["state"]),
+                "action": action(record["action"]),
+                "targetAction": action(record["targetAction"]),
+                "reward": float(record["reward"]),
+                "updatedState": position(record["updatedState"]),
+                "updatedAction": action(record["updatedAction"]),
+                "oldQ": float(record["oldQ"]),
+                "newQ": float(record["newQ"]),
+                "teleportJustUsed": position(record["teleportJustUsed"]),
+                "windJustUsed": position(record["windJustUsed"])}
+
+    def get_records(self):
+        return self.records
+
+    def get_finalQvalues(self):
+        return self.finalQvalues
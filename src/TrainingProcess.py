@@ -0,0 +1,354 @@
+import queue
+import multiprocessing
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+
+from Agent import Agent
+from EventLog import EventLog
+from HeadlessSandbox import HeadlessSandbox
+
+
+class TrainingProcess:
+    """Runs ``Agent`` and ``Environment`` in a child process, so learning no longer waits for the rendering and vice versa.\n
+    The child builds them like the ``HeadlessSandbox`` does and publishes frames into shared memory: the Q-values,
+    the greedy mask, the trace of the memory and a status record with the position of the agent, its highlights
+    and the counters. The parent reads all of it as numpy views, nothing is copied on its side.\n
+    Frames are handed over by a sequence counter. The parent requests a frame once it is done reading the last one,
+    the child writes the next one at its next relevant operation, with the counter odd while writing and even
+    afterwards, and does not touch the buffers again until the next request. So each frame stays consistent for as
+    long as the parent reads it, and copying happens at the frame rate of the parent, not at every operation.\n
+    Control messages go the other way through a queue: running, pausing, changed parameters and edited cells.
+    Edited cells are applied between episodes only. When the run is over, the results are sent back through a second queue.
+    """
+    STATUS_DTYPE = np.dtype([("sequence", "i8"),           # odd while the child writes a frame
+                             ("frameRequested", "?"),      # set by the parent, cleared by the child once the frame is written
+                             ("nRuns", "i8"),              # number of run messages the child has processed
+                             ("isPaused", "?"),
+                             ("isFinished", "?"),
+                             ("operation", "i1"),          # index in Agent.OPERATIONS
+                             ("state", "i4", (2,)),
+                             ("targetAction", "i1"),       # index in the actionspace
+                             ("exploratory", "?"),
+                             ("teleportJustUsed", "i4", (2,)),
+                             ("windJustUsed", "i4", (2,)),
+                             ("currentReturn", "f8"),      # rewards may be fractional in scripted runs
+                             ("currentEpisode", "i8"),
+                             ("operationsLeft", "i8"),
+                             ("traceLength", "i8"),        # number of valid rows in the trace
+                             ("traceSize", "i8")])         # memory size the trace colors are scaled to
+    NONE = -1  # stored instead of None for positions and action indices
+    MESSAGE_INTERVAL = 100  # operations between two checks of the control queue
+    WAIT_TIMEOUT = 0.01  # seconds the paused child waits for messages before it checks for frame requests again
+    JOIN_TIMEOUT = 5
+
+    def __init__(self, world, parameters, straight=True, diagonal=False, idle=False, eventLogKwargs=None):
+        """Creates a ``TrainingProcess`` object along with its shared memory. The child is started by ``start``.
+
+        :param list[list[dict]] world: Matrix of yaml-conform ``Tile`` representations
+        :param dict parameters: {GUI label: value}, may also contain "hWind" and "wWind"
+        :param bool straight: Use straight actions
+        :param bool diagonal: Use diagonal actions
+        :param bool idle: Use the idle action
+        :param dict | None eventLogKwargs: Arguments of an ``EventLog`` the child creates and closes. None logs nothing.
+        """
+        self.H, self.W = len(world), len(world[0])
+        self.actionspace = Agent.create_actionspace(straight, diagonal, idle)
+        self.sharedMemories = {name: SharedMemory(create=True, size=max(dtype.itemsize * int(np.prod(shape)), 1))
+                               for name, (shape, dtype) in self._get_layout(self.H, self.W, len(self.actionspace)).items()}
+        self.arrays = self._get_arrays(self.sharedMemories, self.H, self.W, len(self.actionspace))
+        self.status = self.arrays["status"]
+        self.status["frameRequested"] = True
+        self.lastSequence = 0
+        self.nRuns = 0
+        context = multiprocessing.get_context("spawn")  # forking a process that runs tkinter is unsafe
+        self.controlQueue = context.Queue()
+        self.resultQueue = context.Queue()
+        self.process = context.Process(target=self._train, daemon=True,
+                                       args=(world, parameters, straight, diagonal, idle, eventLogKwargs,
+                                             {name: sharedMemory.name for name, sharedMemory in self.sharedMemories.items()}, self.controlQueue, self.resultQueue))
+
+    @staticmethod
+    def _get_layout(H, W, nActions):
+        """:return dict: {name: (shape, dtype)} of all shared arrays"""
+        return {"status": ((), TrainingProcess.STATUS_DTYPE),
+                "Qvalues": ((H, W, nActions), np.dtype(np.float64)),
+                "greedyMask": ((H, W, nActions), np.dtype(bool)),
+                "trace": ((H * W, 3), np.dtype(np.int32))}  # h, w and absence of each traced state
+
+    @classmethod
+    def _get_arrays(cls, sharedMemories, H, W, nActions):
+        return {name: np.ndarray(shape, dtype=dtype, buffer=sharedMemories[name].buf) for name, (shape, dtype) in cls._get_layout(H, W, nActions).items()}
+
+    def start(self):
+        self.process.start()
+
+    def run(self, relevantOperations, pauseAtNextFrame=False):
+        """Lets the child operate until it is paused or the run is over.
+
+        :param Iterable[str] relevantOperations: Operations after which frames are written and the child may pause
+        :param bool pauseAtNextFrame: Pause at the next relevant operation, f.e. for single steps
+        """
+        self.nRuns += 1
+        self.controlQueue.put(("run", list(relevantOperations), pauseAtNextFrame))
+
+    def pause(self):
+        """Lets the child pause at its next relevant operation."""
+        self.controlQueue.put(("pause",))
+
+    def set_parameters(self, parameters):
+        """:param dict parameters: {GUI label: value} of changed parameters, "hWind" and "wWind" as lists"""
+        if parameters:
+            self.controlQueue.put(("parameters", parameters))
+
+    def update_cells(self, cells):
+        """:param list[tuple[tuple, dict]] cells: Position and yaml-conform ``Tile`` representation of each edited cell, applied before the next episode"""
+        if cells:
+            self.controlQueue.put(("cells", cells))
+
+    def poll(self):
+        """Checks whether the child wrote a new frame. Until ``request_frame`` is called, the shared arrays stay as they are.
+
+        :return bool: True if there is a new frame
+        """
+        sequence = int(self.status["sequence"])
+        if self.status["frameRequested"] or sequence % 2 or sequence == self.lastSequence:
+            return False
+        self.lastSequence = sequence
+        return True
+
+    def request_frame(self):
+        """Hands the shared arrays back to the child. Must only be called once reading the current frame is done."""
+        self.status["frameRequested"] = True
+
+    def close(self):
+        """Stops the child and releases the shared memory. No array of this object may be used afterwards.
+
+        :return dict | None: Results of the run, see ``_get_results``. None if the child did not finish on its own.
+        """
+        results = None
+        if self.process.is_alive() and self.status["isFinished"]:
+            try:
+                results = self.resultQueue.get(timeout=self.JOIN_TIMEOUT)
+            except queue.Empty:
+                pass
+        self.controlQueue.put(("stop",))
+        self.process.join(self.JOIN_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.arrays = self.status = None  # views must be gone before the buffers can be closed
+        for sharedMemory in self.sharedMemories.values():
+            sharedMemory.close()
+            sharedMemory.unlink()
+        return results
+
+    def is_paused(self):
+        """Only pauses of the latest run count, those of earlier runs may still be shown while the run message is on its way."""
+        return bool(self.status["isPaused"]) and self.status["nRuns"] == self.nRuns
+
+    def is_finished(self):
+        return bool(self.status["isFinished"])
+
+    def get_operation(self):
+        operation = int(self.status["operation"])
+        return None if operation == self.NONE else Agent.OPERATIONS[operation]
+
+    def get_currentReturn(self):
+        return float(self.status["currentReturn"])
+
+    def get_currentEpisode(self):
+        return int(self.status["currentEpisode"])
+
+    def get_operationsLeft(self):
+        return int(self.status["operationsLeft"])
+
+    def get_state(self):
+        return self._get_position("state")
+
+    def get_QvalueArray(self):
+        return self.arrays["Qvalues"]
+
+    def get_greedyMask(self):
+        """Returns a boolean array of the shape of the Q-values, True for the greedy actions of each state."""
+        return self.arrays["greedyMask"]
+
+    def get_actionspace(self):
+        return self.actionspace
+
+    def get_targetAction(self):
+        targetAction = int(self.status["targetAction"])
+        return None if targetAction == self.NONE else self.actionspace[targetAction]
+
+    @property
+    def hasMadeExploratoryAction(self):
+        return bool(self.status["exploratory"])
+
+    def get_teleportJustUsed(self):
+        return self._get_position("teleportJustUsed")
+
+    def get_windJustUsed(self):
+        return self._get_position("windJustUsed")
+
+    def get_trace(self):
+        """Returns the states in the memory of the agent, plus the one it forgot last.
+
+        :return tuple[np.ndarray, int]: Rows of (h, w, absence) and the memory size the absences are scaled to
+        """
+        return self.arrays["trace"][:int(self.status["traceLength"])], int(self.status["traceSize"])
+
+    def _get_position(self, field):
+        position = self.status[field]
+        return None if position[0] == self.NONE else (int(position[0]), int(position[1]))
+
+    @classmethod
+    def _train(cls, world, parameters, straight, diagonal, idle, eventLogKwargs, sharedMemoryNames, controlQueue, resultQueue):
+        """Main loop of the child process."""
+        sharedMemories = {name: SharedMemory(name=sharedMemoryName) for name, sharedMemoryName in sharedMemoryNames.items()}
+        eventLog = None if eventLogKwargs is None else EventLog(**eventLogKwargs)
+        sandbox = HeadlessSandbox(world, parameters, straight, diagonal, idle, eventLog)
+        agent = sandbox.get_agent()
+        arrays = cls._get_arrays(sharedMemories, sandbox.H, sandbox.W, len(agent.get_actionspace()))
+        status = arrays["status"]
+        operationsLeftVar = sandbox.get_variable("Operations Left")
+        relevantOperations = set()
+        pendingCells = []
+        operation = None
+        isPaused = True
+        isFinished = False
+        pauseAtNextFrame = False
+        hasUnpublishedChanges = True
+        iOperation = 0
+        while True:
+            messages = []
+            if isPaused:
+                try:
+                    messages.append(controlQueue.get(timeout=cls.WAIT_TIMEOUT))
+                except queue.Empty:
+                    pass
+            if isPaused or iOperation % cls.MESSAGE_INTERVAL == 0:
+                try:
+                    while True:
+                        messages.append(controlQueue.get_nowait())
+                except queue.Empty:
+                    pass
+            if ("stop",) in messages:
+                break
+            for message in messages:
+                if message[0] == "run" and not isFinished:
+                    relevantOperations = set(message[1])
+                    pauseAtNextFrame = message[2]
+                    isPaused = False
+                    status["nRuns"] += 1
+                elif message[0] == "run":
+                    status["nRuns"] += 1
+                elif message[0] == "pause":
+                    pauseAtNextFrame = True
+                elif message[0] == "parameters":
+                    cls._apply_parameters(sandbox, message[1])
+                elif message[0] == "cells":
+                    pendingCells += message[1]
+            if pendingCells and agent.get_state() is None:  # between episodes
+                sandbox.get_environment().update_cells(sandbox.get_cellKwargs(tuple(position), tile) for position, tile in pendingCells)
+                pendingCells = []
+            if isPaused:
+                if hasUnpublishedChanges and status["frameRequested"]:
+                    cls._publish(arrays, sandbox, operation, isPaused, isFinished)
+                    hasUnpublishedChanges = False
+                continue
+            operation = agent.operate()
+            iOperation += 1
+            hasUnpublishedChanges = True
+            operationsLeftVar.set(operationsLeftVar.get() - 1)
+            if operationsLeftVar.get() <= 0 or agent.get_stopReason() is not None:
+                isPaused = isFinished = True
+                if eventLog is not None:
+                    eventLog.close()
+                resultQueue.put(cls._get_results(agent))
+            elif operation in relevantOperations:
+                if pauseAtNextFrame:
+                    isPaused = True
+                    pauseAtNextFrame = False
+                if status["frameRequested"]:
+                    cls._publish(arrays, sandbox, operation, isPaused, isFinished)
+                    hasUnpublishedChanges = False
+        del arrays, status  # views must be gone before the buffers can be closed
+        for sharedMemory in sharedMemories.values():
+            sharedMemory.close()
+
+    @staticmethod
+    def _apply_parameters(sandbox, parameters):
+        hWindVars, wWindVars = sandbox.get_windVars()
+        for name, value in parameters.items():
+            if name in ["hWind", "wWind"]:
+                for variable, windValue in zip(hWindVars if name == "hWind" else wWindVars, value):
+                    variable.set(windValue)
+            elif name in sandbox.variables:
+                sandbox.get_variable(name).set(value)
+        if any(name.startswith("Reward ") for name in parameters):
+            sandbox.get_environment().refresh_rewards()
+        if parameters.keys() & {"n-Step n", "On-Policy", "Expectation Update", "α = 1/count((S,A))", "Decay ε Episode-wise", "Dyna-Q+ κ"}:
+            sandbox.get_agent().specialize()
+
+    @classmethod
+    def _publish(cls, arrays, sandbox, operation, isPaused, isFinished):
+        """Writes a frame into the shared arrays, enclosed by two increments of the sequence counter."""
+        agent = sandbox.get_agent()
+        environment = sandbox.get_environment()
+        status = arrays["status"]
+        status["sequence"] += 1
+        Qvalues = agent.get_QvalueArray()
+        np.copyto(arrays["Qvalues"], Qvalues)
+        np.equal(Qvalues, Qvalues.max(axis=2, keepdims=True), out=arrays["greedyMask"])
+        if sandbox.get_variable("Visualize Memory").get():
+            traceStates = list(agent.get_memory().get_states())
+            traceTail = agent.get_memory().yield_lastForgottenState()
+            if traceTail and traceTail not in agent.get_memory().get_states():
+                traceStates.append(traceTail)
+            trace = arrays["trace"][:len(traceStates)]
+            if traceStates:
+                trace[:, :2] = list(traceStates)
+                trace[:, 2] = [agent.get_absence(state) for state in traceStates]
+            status["traceLength"] = len(traceStates)
+            status["traceSize"] = agent.get_memory_size() + int(bool(traceTail))
+        else:
+            status["traceLength"] = 0
+        status["operation"] = cls.NONE if operation is None else Agent.OPERATIONS.index(operation)
+        for field, position in [("state", agent.get_state()), ("teleportJustUsed", environment.get_teleportJustUsed()), ("windJustUsed", environment.get_windJustUsed())]:
+            status[field] = (cls.NONE, cls.NONE) if position is None else position
+        targetAction = agent.get_targetAction()
+        status["targetAction"] = cls.NONE if targetAction is None else agent.get_actionspace().index(targetAction)
+        status["exploratory"] = bool(agent.hasMadeExploratoryAction)
+        status["currentReturn"] = sandbox.get_variable("Current Return").get()
+        status["currentEpisode"] = sandbox.get_variable("Current Episode").get()
+        status["operationsLeft"] = sandbox.get_variable("Operations Left").get()
+        status["isPaused"] = isPaused
+        status["isFinished"] = isFinished  # only with the frame, so the final frame is the one shown at the end
+        status["sequence"] += 1
+        status["frameRequested"] = False
+
+    @staticmethod
+    def _get_results(agent):
+        """:return dict: Keyword arguments of ``GridworldSandbox._plot``"""
+        return {"summary": agent.get_run_summary(),
+                "episodeReturns": agent.get_episodeReturns(),
+                "greedyReturns": agent.get_policyEvaluator().get_greedyReturns(),
+                "stepReturns": agent.get_stepReturns()}
+
+
+if __name__ == "__main__":
+    import time
+
+    sandbox = HeadlessSandbox("06_22_cliff_walking_4x12", {"Algorithm": "Q-Learning", "Seed": 0})
+    trainingProcess = TrainingProcess(sandbox.parameters["world"], sandbox.parameters | {"Operations Left": 200000})
+    trainingProcess.start()
+    trainingProcess.run(Agent.OPERATIONS)
+    nFrames = 0
+    startTime = time.perf_counter()
+    while not trainingProcess.is_finished():
+        if trainingProcess.poll():
+            nFrames += 1
+            Qvalues = trainingProcess.get_QvalueArray()  # read in place, the child does not write until the next request
+            assert (trainingProcess.get_greedyMask() == (Qvalues == Qvalues.max(axis=2, keepdims=True))).all()
+            trainingProcess.request_frame()
+        time.sleep(1 / 60)
+    results = trainingProcess.close()
+    print(f"{nFrames} frames in {time.perf_counter() - startTime:.1f} s, {results['summary']}, last returns: {results['episodeReturns'][-5:]}")
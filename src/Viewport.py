@@ -0,0 +1,109 @@
+class Viewport:
+    """Describes the rectangular section of a gridworld that is currently shown by
+    virtualized ``Tilemaps``.\n
+    A single ``Viewport`` is shared by the world map and all value maps, so that they
+    always show the same cells. Only the cells inside the viewport get ``Tiles``, which
+    makes memory and rendering time depend on the viewport size instead of the world size.
+    Scrolling and zooming notify all registered listeners.
+    """
+    ZOOM_LEVELS = [0.5, 0.75, 1, 1.5, 2]  # factors applied to the tile size. Zooming out shows more cells with smaller tiles.
+
+    def __init__(self, H, W, viewH, viewW):
+        """Creates a ``Viewport`` object.
+
+        :param int H: Height of the environment in Cells.
+        :param int W: Width  of the environment in Cells.
+        :param int viewH: Number of visible rows at zoom 1.
+        :param int viewW: Number of visible columns at zoom 1.
+        """
+        self.H = H
+        self.W = W
+        self.baseShape = (viewH, viewW)
+        self.iZoom = self.ZOOM_LEVELS.index(1)
+        self.hOffset = 0
+        self.wOffset = 0
+        self.listeners = []
+
+    def add_listener(self, func):
+        """Registers a function that is called without arguments after every scroll or zoom.
+
+        :param function func: Function to be registered
+        """
+        self.listeners.append(func)
+
+    def get_zoom(self):
+        return self.ZOOM_LEVELS[self.iZoom]
+
+    def get_shape(self):
+        """Returns the number of visible rows and columns at the current zoom level.
+
+        :return tuple[int, int]: (viewH, viewW)
+        """
+        return (min(self.H, max(1, round(self.baseShape[0] / self.get_zoom()))),
+                min(self.W, max(1, round(self.baseShape[1] / self.get_zoom()))))
+
+    def get_offset(self):
+        """Returns the world coordinates of the upper left visible cell.
+
+        :return tuple[int, int]: (hOffset, wOffset)
+        """
+        return self.hOffset, self.wOffset
+
+    def contains(self, h, w):
+        viewH, viewW = self.get_shape()
+        return 0 <= h - self.hOffset < viewH and 0 <= w - self.wOffset < viewW
+
+    def get_visible_cells(self):
+        """Yields the world coordinates of all visible cells, row by row.
+        """
+        viewH, viewW = self.get_shape()
+        for h in range(self.hOffset, self.hOffset + viewH):
+            for w in range(self.wOffset, self.wOffset + viewW):
+                yield h, w
+
+    def get_fractions(self, iDim):
+        """Returns the visible part of a dimension as fractions of its size, in the format expected by ``tk.Scrollbar.set``.
+
+        :param int iDim: 0 for height, 1 for width
+        :return tuple[float, float]: (first, last)
+        """
+        size = (self.H, self.W)[iDim]
+        offset = (self.hOffset, self.wOffset)[iDim]
+        return offset / size, (offset + self.get_shape()[iDim]) / size
+
+    def scroll(self, dh=0, dw=0):
+        self.moveto(self.hOffset + dh, self.wOffset + dw)
+
+    def moveto(self, hOffset=None, wOffset=None):
+        """Moves the upper left visible cell to the given coordinates, as far as the world borders allow.
+        None keeps the current offset of that dimension.
+        """
+        viewH, viewW = self.get_shape()
+        hOffset = self.hOffset if hOffset is None else min(max(int(hOffset), 0), self.H - viewH)
+        wOffset = self.wOffset if wOffset is None else min(max(int(wOffset), 0), self.W - viewW)
+        if (hOffset, wOffset) != (self.hOffset, self.wOffset):
+            self.hOffset, self.wOffset = hOffset, wOffset
+            self._notify()
+
+    def center_on(self, h, w):
+        viewH, viewW = self.get_shape()
+        self.moveto(h - viewH // 2, w - viewW // 2)
+
+    def zoom(self, direction):
+        """Switches to the next bigger (direction > 0) or smaller (direction < 0) zoom level while keeping the center cell in place.
+
+        :param int direction: Sign defines the zoom direction
+        """
+        iZoom = min(max(self.iZoom + (direction > 0) - (direction < 0), 0), len(self.ZOOM_LEVELS) - 1)
+        if iZoom != self.iZoom:
+            viewH, viewW = self.get_shape()
+            center = (self.hOffset + viewH // 2, self.wOffset + viewW // 2)
+            self.iZoom = iZoom
+            viewH, viewW = self.get_shape()
+            self.hOffset = min(max(center[0] - viewH // 2, 0), self.H - viewH)
+            self.wOffset = min(max(center[1] - viewW // 2, 0), self.W - viewW)
+            self._notify()
+
+    def _notify(self):
+        for func in self.listeners:
+            func()
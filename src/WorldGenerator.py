@@ -0,0 +1,221 @@
+import numpy as np
+from pathlib import Path
+
+import myFuncs
+from Agent import Agent
+from Environment import Environment
+from PlainVar import PlainVar
+from RandomStream import RandomStream
+from Tile import Tile
+
+
+class WorldGenerator:
+    """Generates random world files, f.e. to benchmark the sandbox on worlds far larger than the handmade ones.\n
+    Open layouts scatter walls with a given density, maze layouts carve a maze into a full wall block,
+    optionally with loops. Cliff rows are segments of terminal cells with "Reward Red" borders, like in the cliff
+    walking world. Wind, ice, torus shapes and teleporter pairs can be added as well. Everything is drawn from a
+    single seed, so the same arguments always produce the same world.\n
+    Each draft is checked with the dynamics of the ``Environment`` itself, using straight actions only.
+    The goal must be reachable from the start without passing through a terminal cell, otherwise the
+    draft is discarded and the next one drawn. Saved files only contain the world and its world settings,
+    so they can be loaded by the sandbox and the ``HeadlessSandbox`` like any other world.
+    """
+    LAYOUTS = ["open", "maze"]
+    WIND_PROFILES = ["none", "columns", "rows"]
+    MAX_ATTEMPTS = 100
+    GENERATED_PATH = Path(__file__).resolve().parent.parent / "worlds" / "generated"
+    CLIFF_COLOR = Tile.BORDER_COLORS[2]  # Red
+
+    def __init__(self, H, W, seed=None, layout="open", wallDensity=0.2, loopDensity=0., nCliffRows=0, windProfile="none", maxWindStrength=1,
+                 iceFloor=False, hTorus=False, wTorus=False, nTeleporters=0):
+        """Creates a ``WorldGenerator`` object.
+
+        :param int H: Height of the world in cells
+        :param int W: Width  of the world in cells
+        :param int | None seed: Seed of the generation. If None, fresh entropy is drawn from the OS.
+        :param str layout: One of ``WorldGenerator.LAYOUTS``
+        :param float wallDensity: Open layouts only. Probability of each cell to be a wall.
+        :param float loopDensity: Maze layouts only. Probability of each inner maze wall to be removed, 0 gives a perfect maze.
+        :param int nCliffRows: Number of rows containing a cliff segment
+        :param str windProfile: One of ``WorldGenerator.WIND_PROFILES``. Wind blows in a band of columns (vertical wind) or rows (horizontal wind).
+        :param int maxWindStrength: Strongest wind in the band
+        :param bool iceFloor: "Ice Floor" setting of the world
+        :param bool hTorus: "H-Torus" setting of the world
+        :param bool wTorus: "W-Torus" setting of the world
+        :param int nTeleporters: Number of teleporter pairs, at most one per ``Tile.TELEPORTERS`` name
+        """
+        if layout not in self.LAYOUTS:
+            raise ValueError(f"layout must be one of {self.LAYOUTS}, not {layout}")
+        if windProfile not in self.WIND_PROFILES:
+            raise ValueError(f"windProfile must be one of {self.WIND_PROFILES}, not {windProfile}")
+        if nTeleporters > len(Tile.TELEPORTERS):
+            raise ValueError(f"At most {len(Tile.TELEPORTERS)} teleporters are available")
+        self.H = H
+        self.W = W
+        self.seed = seed
+        self.layout = layout
+        self.wallDensity = wallDensity
+        self.loopDensity = loopDensity
+        self.nCliffRows = nCliffRows
+        self.windProfile = windProfile
+        self.maxWindStrength = maxWindStrength
+        self.iceFloor = iceFloor
+        self.hTorus = hTorus
+        self.wTorus = wTorus
+        self.nTeleporters = nTeleporters
+        self.rng = RandomStream(seed)
+        self.generator = self.rng.get_generator()
+        self.nAttempts = 0
+
+    def generate(self):
+        """Draws drafts until one has a reachable goal.
+
+        :return dict: World file content, like ``GridworldSandbox._save`` writes it, but only with the world settings
+        """
+        for self.nAttempts in range(1, self.MAX_ATTEMPTS + 1):
+            yamlDict = self._draft()
+            if self._is_goal_reachable(yamlDict):
+                return yamlDict
+        raise RuntimeError(f"No world with reachable goal found in {self.MAX_ATTEMPTS} attempts, try fewer walls, cliffs or less wind")
+
+    def save(self, filepath=None):
+        """Generates a world and writes it to a yaml file.
+
+        :param Path | str | None filepath: Path of the file, the size is appended to its name. If None, a name derived from the layout and seed in ``worlds/generated/`` is used.
+        :return Path: Path of the written file
+        """
+        if filepath is None:
+            filepath = self.GENERATED_PATH / f"{self.layout}_seed{self.seed}"
+        filepath = Path(filepath)
+        filepath = filepath.with_stem(f"{filepath.stem}_{self.H}x{self.W}").with_suffix(".yaml")  # embedded here, so overwriting never asks
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        myFuncs.create_yaml_file_from_dict(self.generate(), filepath)
+        return filepath
+
+    def _draft(self):
+        isWall = self._draw_maze() if self.layout == "maze" else self.generator.random((self.H, self.W)) < self.wallDensity
+        start = (0, 0)
+        goal = (self.H - 1, self.W - 1) if self.layout == "open" else (self.H - 1 - (self.H - 1) % 2, self.W - 1 - (self.W - 1) % 2)  # mazes only have passages at even coordinates
+        isWall[start] = isWall[goal] = False
+        # All blank and all wall tiles share one dict each, which yaml writes as anchor and aliases. This shrinks
+        # large world files by a factor of about 6 and loads them two orders of magnitude faster. Special tiles get their own dict.
+        blankTile = Tile.get_default_yaml_dict()
+        wallTile = blankTile | {"bg": Tile.WALL_COLOR}
+        tiles = [[wallTile if isWallCell else blankTile for isWallCell in row] for row in isWall.tolist()]
+        tiles[start[0]][start[1]] = blankTile | {"text": Tile.START_CHAR}
+        tiles[goal[0]][goal[1]] = blankTile | {"text": Tile.GOAL_CHAR}
+        isOccupied = isWall.copy()
+        isOccupied[start] = isOccupied[goal] = True
+
+        cliffRowCandidates = [h for h in range(1, self.H - 1) if h not in (start[0], goal[0])]
+        for h in self.generator.choice(cliffRowCandidates, size=min(self.nCliffRows, len(cliffRowCandidates)), replace=False):
+            length = self.generator.integers(1, max(2, self.W // 2))
+            w0 = self.generator.integers(0, self.W - length + 1)
+            for w in range(w0, w0 + length):
+                if not isOccupied[h, w]:
+                    tiles[h][w] = blankTile | {"text": Tile.GOAL_CHAR, "borderColor": self.CLIFF_COLOR}
+                    isOccupied[h, w] = True
+
+        for name in Tile.TELEPORTERS[:self.nTeleporters]:
+            freeCells = np.flatnonzero(~isOccupied)
+            if len(freeCells) < 2:
+                break
+            for iCell in self.generator.choice(freeCells, size=2, replace=False):
+                h, w = divmod(int(iCell), self.W)
+                tiles[h][w] = blankTile | {"text": name + Tile.TELEPORTER_DEFAULT_SUFFIX}
+                isOccupied[h, w] = True
+
+        hWind, wWind = [0] * self.W, [0] * self.H
+        if self.windProfile != "none":
+            wind = hWind if self.windProfile == "columns" else wWind
+            bandStart = int(self.generator.integers(0, len(wind)))
+            bandStop = int(self.generator.integers(bandStart + 1, len(wind) + 1))
+            direction = self.generator.choice([-1, 1])
+            for i in range(bandStart, bandStop):
+                wind[i] = int(direction * self.generator.integers(1, self.maxWindStrength + 1))
+        return {"Ice Floor": self.iceFloor, "H-Torus": self.hTorus, "W-Torus": self.wTorus, "world": tiles, "hWind": hWind, "wWind": wWind}
+
+    def _draw_maze(self):
+        """Randomized depth-first search on the cells with even coordinates, which become the passages.
+        Walls between two passages are removed with ``loopDensity`` afterwards.
+        """
+        isWall = np.ones((self.H, self.W), dtype=bool)
+        isWall[0, 0] = False
+        stack = [(0, 0)]
+        while stack:
+            h, w = stack[-1]
+            neighbours = [(h + dh, w + dw) for dh, dw in [(-2, 0), (2, 0), (0, -2), (0, 2)] if 0 <= h + dh < self.H and 0 <= w + dw < self.W and isWall[h + dh, w + dw]]
+            if not neighbours:
+                stack.pop()
+                continue
+            hNext, wNext = self.rng.choice(neighbours)
+            isWall[(h + hNext) // 2, (w + wNext) // 2] = isWall[hNext, wNext] = False
+            stack.append((hNext, wNext))
+        if self.loopDensity:
+            isInnerWall = np.zeros_like(isWall)
+            isInnerWall[1::2, ::2] = True  # between two passages above each other
+            isInnerWall[::2, 1::2] = True  # between two passages next to each other
+            isInnerWall[1::2, ::2][self.H // 2 * 2 - 1:] = False  # no passage below the last row of passages
+            isInnerWall &= isWall
+            isWall &= ~(isInnerWall & (self.generator.random(isWall.shape) < self.loopDensity))
+        return isWall
+
+    def _is_goal_reachable(self, yamlDict):
+        """Breadth-first search over the states of an ``Environment`` built from the draft, straight actions only."""
+        rewardVar = PlainVar(0)
+        environment = Environment(self.H, self.W, PlainVar(yamlDict["Ice Floor"]), PlainVar(yamlDict["H-Torus"]), PlainVar(yamlDict["W-Torus"]),
+                                  [PlainVar(value) for value in yamlDict["hWind"]], [PlainVar(value) for value in yamlDict["wWind"]])
+        environment.update([[{"position": (h, w), "arrivalRewardVar": rewardVar, **Tile.get_cell_kwargs(tile)} for w, tile in enumerate(row)] for h, row in enumerate(yamlDict["world"])])
+        destinations = [np.ravel_multi_index(np.moveaxis(environment.get_move_destinations(action), 2, 0), (self.H, self.W)).ravel().tolist()
+                        for action in Agent.STRAIGHT_ACTIONSPACE]
+        isTerminal = environment.isGoal.ravel().tolist()
+        isTeleportEntry = (environment.teleportSinks != 0).ravel().tolist()
+        teleportDestinations = {}
+        start, = environment.get_initial_position_candidates()
+        goal = next(h * self.W + w for h, row in enumerate(yamlDict["world"]) for w, tile in enumerate(row) if tile["text"] == Tile.GOAL_CHAR and tile["borderColor"] != self.CLIFF_COLOR)
+        isVisited = [False] * (self.H * self.W)
+        isVisited[start[0] * self.W + start[1]] = True
+        queue = [start[0] * self.W + start[1]]
+        for state in queue:  # the list grows while iterating, which makes it a FIFO queue
+            if isTerminal[state]:
+                continue
+            for actionDestinations in destinations:
+                destination = actionDestinations[state]
+                if isTeleportEntry[destination]:
+                    if destination not in teleportDestinations:
+                        teleportDestinations[destination] = [h * self.W + w for h, w in environment.get_teleport_destination_candidates(divmod(destination, self.W))]
+                    successors = teleportDestinations[destination]
+                else:
+                    successors = [destination]
+                for successor in successors:
+                    if not isVisited[successor]:
+                        isVisited[successor] = True
+                        queue.append(successor)
+        return isVisited[goal]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Generates a random world file for the gridworld sandbox.")
+    parser.add_argument("H", type=int)
+    parser.add_argument("W", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layout", choices=WorldGenerator.LAYOUTS, default="open")
+    parser.add_argument("--wallDensity", type=float, default=0.2)
+    parser.add_argument("--loopDensity", type=float, default=0.)
+    parser.add_argument("--nCliffRows", type=int, default=0)
+    parser.add_argument("--windProfile", choices=WorldGenerator.WIND_PROFILES, default="none")
+    parser.add_argument("--maxWindStrength", type=int, default=1)
+    parser.add_argument("--iceFloor", action="store_true")
+    parser.add_argument("--hTorus", action="store_true")
+    parser.add_argument("--wTorus", action="store_true")
+    parser.add_argument("--nTeleporters", type=int, default=0)
+    parser.add_argument("--filepath", type=Path, default=None)
+    arguments = vars(parser.parse_args())
+    filepath = arguments.pop("filepath")
+    start = time.perf_counter()
+    worldGenerator = WorldGenerator(**arguments)
+    filepath = worldGenerator.save(filepath)
+    print(f"Saved {filepath} after {worldGenerator.nAttempts} attempt(s) in {time.perf_counter() - start:.1f} s")
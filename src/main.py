@@ -1,11 +1,17 @@
+import argparse
 import tkinter as tk
 
 from GridworldSandbox import GridworldSandbox
+from MemoryReport import MemoryReport
 
 
 def main():
     """Sets up a ``tkinter`` root process, a ``GridworldSandbox``, and connects them.
     """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace-memory", action="store_true", help="Traces allocations from the start, so memory reports can break them down by file. Slows everything down.")
+    if parser.parse_args().trace_memory:
+        MemoryReport.start_tracing()
     root = tk.Tk()
     root.withdraw()  # dont wanna use the root process like a toplevel
     GridworldSandbox(guiProcess=root)
@@ -3,6 +3,7 @@ from collections import OrderedDict
 import colorsys
 import webcolors
 import numpy as np
+import matplotlib
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import messagebox
@@ -12,6 +13,11 @@ import yaml
 import traceback
 import sys
 import inspect
+import re
+
+
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # libyaml bindings, if available, load large world files many times faster
+YAML_DUMPER = getattr(yaml, "CDumper", yaml.Dumper)
 
 
 def custom_warning(condition, importance, message, hideNadditionalStackLines=0, stream=sys.stdout):
@@ -110,6 +116,42 @@ def direction_to_hsvHexString(direction, colorwheelAngleOffset=0, hsvValue=0.75)
     return hsv_to_rgbHexString(angle / 360, 1, hsvValue)
 
 
+def color_to_rgbTriple(color: str):
+    """Converts a tkinter color given as hex string or as html name to an integer rgb triple."""
+    if color.startswith("#"):
+        return tuple(webcolors.hex_to_rgb(color))
+    return tuple(webcolors.name_to_rgb(color.lower()))
+
+
+@cache
+def get_colormap_lut(name, size=256):
+    """Returns a matplotlib colormap as lookup table of shape (size, 3) and dtype uint8."""
+    return (matplotlib.colormaps[name](np.linspace(0, 1, size))[:, :3] * 255).astype(np.uint8)
+
+
+def values_to_rgb(values, vmin, vmax, colormap):
+    """Maps a numpy array of values to rgb colors in a single vectorized lookup.
+
+    :param np.ndarray values: Values of any shape
+    :param float vmin: Value mapped to the lowest color. Smaller values are clipped.
+    :param float vmax: Value mapped to the highest color. Bigger values are clipped.
+    :param str colormap: Name of a matplotlib colormap
+    :return np.ndarray: Array of shape (*values.shape, 3) and dtype uint8
+    """
+    lut = get_colormap_lut(colormap)
+    if vmax > vmin:
+        indices = np.clip((values - vmin) * ((len(lut) - 1) / (vmax - vmin)), 0, len(lut) - 1).astype(np.intp)
+    else:  # all values equal
+        indices = np.full(np.shape(values), len(lut) // 2, dtype=np.intp)
+    return lut[indices]
+
+
+def rgb_to_ppm(rgb):
+    """Encodes an rgb array of shape (H, W, 3) as binary PPM, which ``tk.PhotoImage`` reads without any further dependency."""
+    H, W, _ = rgb.shape
+    return f"P6 {W} {H} 255 ".encode() + np.ascontiguousarray(rgb, dtype=np.uint8).tobytes()
+
+
 def get_light_color(color: str, lightness: str):
     """color must be in hex format, f.e. '#012DEF' """
     return color.replace("0", lightness)
@@ -165,7 +207,7 @@ def get_dict_from_yaml_file(filepath=None, initialdir=None):
             return {}
     filepath = filepath.with_suffix(".yaml")
     with filepath.open(mode="r") as file:
-        return yaml.safe_load(file)
+        return yaml.load(file, Loader=YAML_LOADER)
 
 
 def create_yaml_file_from_dict(inputDict, filepath=None, nameEmbedding="", initialdir=None):
@@ -197,7 +239,7 @@ def create_yaml_file_from_dict(inputDict, filepath=None, nameEmbedding="", initi
         if messagebox.askquestion("Confirm Overwrite", f"{filepath.name} already exists.\nDo you want to overwrite it?") == "no":
             return False
     with filepath.open(mode="w") as file:
-        yaml.dump(inputDict, file)
+        yaml.dump(inputDict, file, Dumper=YAML_DUMPER)
     return True
 
 
@@ -205,6 +247,15 @@ def create_font(size, family="calibri", weight="bold"):
     return f"{family} {size} {weight}"
 
 
+def scale_font(font, factor):
+    """Scales the size of a tkinter font string like "calibri 14 bold" by a factor. Sizes are rounded and at least 1."""
+    return re.sub(r"\d+", lambda match: str(max(1, round(int(match.group()) * factor))), font, count=1)
+
+
+def sign(number):
+    return (number > 0) - (number < 0)
+
+
 def get_default_kwargs(clss=None, func=None, hierarchy=False):
     """Returns the default values of all keyword arguments of a given function/method,
     even those which are hidden in a *kwargs argument to get passed through to (nested)